@@ -0,0 +1,69 @@
+import os
+import bisect
+import fnmatch
+import tarfile
+import scanner
+import hashing
+from throttle import ThrottledReader
+
+# Member entries are [data offset, size, mode, mtime, linkname, checksum]
+OFFSET, SIZE, MODE, MTIME, LINKNAME, CHECKSUM = range(6)
+# Same algorithm as the manifest digests, so an unchanged file's checksum equals its digest
+CHECKSUM_ALGORITHM = "sha256"
+
+def add_indexed(tar, members, tarinfo, fileobj=None):
+    # tar.offset is the position in the uncompressed stream; the data follows the header(s).
+    # The checksum covers the bytes that actually went into the archive.
+    reader = hashing.HashingReader(fileobj, CHECKSUM_ALGORITHM) if fileobj is not None else None
+    tar.addfile(tarinfo, reader)
+    padded_size = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE if tarinfo.isreg() else 0
+    data_offset = tar.offset - padded_size
+    members[tarinfo.name] = [data_offset, tarinfo.size if tarinfo.isreg() else 0, tarinfo.mode,
+                             tarinfo.mtime, tarinfo.linkname if tarinfo.issym() else None,
+                             reader.hexdigest() if reader is not None else None]
+
+def add_path_indexed(tar, members, path, arcname, st=None, throttle=None):
+    tarinfo = scanner.tarinfo_from_stat(path, arcname, st)
+    if tarinfo is None:
+        return
+    if tarinfo.isreg():
+        with open(path, "rb") as f:
+            add_indexed(tar, members, tarinfo, f if throttle is None else ThrottledReader(f, throttle))
+    else:
+        add_indexed(tar, members, tarinfo)
+
+def path_selected(path, patterns):
+    return any(fnmatch.fnmatch(path, pattern) or path.startswith(pattern.rstrip("/") + "/")
+               for pattern in patterns)
+
+def iter_range(f, codec, blocks, offset, size):
+    # Decompress only the blocks overlapping [offset, offset + size)
+    starts = [block[0] for block in blocks]
+    i = bisect.bisect_right(starts, offset) - 1
+    remaining = size
+    while remaining > 0 and i < len(blocks):
+        block_offset, compressed_offset, compressed_size = blocks[i]
+        f.seek(compressed_offset)
+        data = codec.decompress(f.read(compressed_size))
+        piece = data[max(offset - block_offset, 0):][:remaining]
+        remaining -= len(piece)
+        yield piece
+        i += 1
+    if remaining:
+        raise EOFError("Archive is shorter than its index")
+
+def extract_member(f, codec, blocks, name, entry, restore_dir):
+    target_path = os.path.join(restore_dir, name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if entry[LINKNAME] is not None or os.path.islink(target_path):
+        # Never write through a symlink that is in the way
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+    if entry[LINKNAME] is not None:
+        os.symlink(entry[LINKNAME], target_path)
+        return
+    with open(target_path, "wb") as out:
+        for piece in iter_range(f, codec, blocks, entry[OFFSET], entry[SIZE]):
+            out.write(piece)
+    os.chmod(target_path, entry[MODE])
+    os.utime(target_path, (entry[MTIME], entry[MTIME]))
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import scanner
+from engine import BackupEngine, DUPLICATE
+from settings import load_settings
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILES = ("tiny", "huge", "deep", "incompressible", "logs")
+PHASES = ("snapshot", "duplicate", "incremental", "restore")
+WORDS = b"backup snapshot archive restore manifest chunk digest catalog error warning info debug".split()
+MB = 1024 * 1024
+
+def text(rng, size):
+    # Log-like lines: compress about as well as real text does
+    lines = bytearray()
+    while len(lines) < size:
+        lines += b"%d %s %s\n" % (rng.getrandbits(32), rng.choice(WORDS),
+                                  b" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))))
+    return bytes(lines[:size])
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def make_tree(root, profile, scale=1.0, seed=0):
+    # The same profile, scale and seed always produce the same tree
+    rng = random.Random(f"{profile}:{seed}")
+    os.makedirs(root, exist_ok=True)
+    if profile == "tiny":
+        for i in range(int(20000 * scale)):
+            write_file(os.path.join(root, f"d{i // 100}", f"f{i}.txt"), text(rng, rng.randint(0, 1024)))
+    elif profile == "huge":
+        block = text(rng, MB)
+        for i in range(2):
+            with open(os.path.join(root, f"huge{i}.bin"), "wb") as f:
+                for n in range(int(128 * scale)):
+                    # Vary every block so nothing downstream can shortcut repeated data
+                    f.write(b"%08d" % n + block[8:])
+    elif profile == "deep":
+        for branch in range(int(20 * scale)):
+            directory = os.path.join(root, f"b{branch}")
+            for depth in range(40):
+                directory = os.path.join(directory, f"level{depth}")
+                for i in range(2):
+                    write_file(os.path.join(directory, f"f{i}.txt"), text(rng, 4096))
+    elif profile == "incompressible":
+        for i in range(int(64 * scale)):
+            write_file(os.path.join(root, f"r{i // 16}", f"random{i}.bin"), rng.randbytes(MB))
+    elif profile == "logs":
+        for i in range(int(20 * scale)):
+            write_file(os.path.join(root, f"service{i % 4}", f"app{i}.log"), text(rng, 4 * MB))
+    else:
+        raise ValueError(f"Unknown profile '{profile}'")
+
+def mutate_tree(root, profile, seed=0):
+    # What changes between two snapshots: logs grow at the end, other trees see a few edits
+    rng = random.Random(f"{profile}:{seed}:mutate")
+    paths = sorted(path for rel_path, path, st in scanner.iter_files(root))
+    step = 1 if profile == "logs" else 100
+    for path in paths[::step]:
+        with open(path, "ab") as f:
+            f.write(text(rng, 256 * 1024 if profile == "logs" else 128))
+
+def io_counters():
+    # Linux keeps per-process counts of read and write family syscalls
+    counters = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                counters[name] = int(value)
+    except OSError:
+        pass
+    return counters
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+def wait_next_second():
+    # Snapshot names carry the time to the second; never let two phases share one
+    time.sleep(1 - time.time() % 1 + 0.01)
+
+def run_phase(phase, source_dir, backup_dir, restore_dir, settings):
+    # Runs in a fresh process so the peak RSS and I/O counters belong to this phase alone
+    engine = BackupEngine(source_dir, backup_dir, settings)
+    engine.running = True
+    messages = []
+    engine.log_message = messages.append
+    if phase == "restore":
+        newest = engine.list_snapshots()[-1]["name"]
+    before = io_counters()
+    start = time.perf_counter()
+    if phase == "restore":
+        ok = engine.perform_restore(os.path.join(backup_dir, newest), restore_dir)
+    else:
+        ok = engine.create_snapshot()
+        if phase == "duplicate":
+            ok = ok == DUPLICATE
+    seconds = time.perf_counter() - start
+    after = io_counters()
+    if phase == "restore":
+        sizes = [st.st_size for rel_path, path, st in scanner.iter_files(restore_dir)]
+        files, nbytes = len(sizes), sum(sizes)
+    else:
+        files, nbytes = engine.last_stats["files"], engine.last_stats["bytes"]
+    return {
+        "ok": bool(ok),
+        "seconds": seconds,
+        "files": files,
+        "bytes": nbytes,
+        "files_per_s": files / max(seconds, 1e-9),
+        "mb_per_s": nbytes / MB / max(seconds, 1e-9),
+        "peak_rss_mb": peak_rss_mb(),
+        "read_syscalls": after.get("syscr", 0) - before.get("syscr", 0) if after else None,
+        "write_syscalls": after.get("syscw", 0) - before.get("syscw", 0) if after else None,
+        "log": messages[-3:],
+    }
+
+def forget_fingerprint(source_dir, backup_dir):
+    # Makes the next snapshot write a full archive of the unchanged tree, which the
+    # catalog must then recognise as a duplicate
+    path = os.path.join(backup_dir, f"{os.path.basename(source_dir)}.manifest.json")
+    with open(path) as f:
+        state = json.load(f)
+    state["fingerprint"] = None
+    with open(path, "w") as f:
+        json.dump(state, f)
+
+def bench_profile(profile, work_dir, settings, scale, seed):
+    source_dir = os.path.join(work_dir, profile)
+    backup_dir = os.path.join(work_dir, f"{profile}-backup")
+    restore_dir = os.path.join(work_dir, f"{profile}-restore")
+    for directory in (source_dir, backup_dir, restore_dir):
+        shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(backup_dir)
+    make_tree(source_dir, profile, scale, seed)
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for phase in PHASES:
+        if phase == "duplicate":
+            forget_fingerprint(source_dir, backup_dir)
+        elif phase == "incremental":
+            mutate_tree(source_dir, profile, seed)
+        wait_next_second()
+        phase_settings = dict(settings, snapshot_mode="full" if phase != "incremental" else "incremental")
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            results[phase] = pool.submit(run_phase, phase, source_dir, backup_dir, restore_dir,
+                                         phase_settings).result()
+        if not results[phase]["ok"]:
+            raise RuntimeError(f"{profile} {phase} failed: {results[phase]['log']}")
+    for directory in (source_dir, backup_dir, restore_dir):
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+def run_suite(profiles, scale=1.0, seed=0, repeat=1, codec=None, work_dir=None):
+    settings = load_settings()
+    # Measure the engine alone, not the local throttle, retention or storage configuration
+    settings.update(storage=None, retention=None, throttle_read_mb=None, throttle_nice=None,
+                    throttle_ioprio=None, throttle_max_load=None, synthetic_full_every=0)
+    if codec:
+        settings["compression_codec"] = codec
+    root = tempfile.mkdtemp(prefix="enginebench_", dir=work_dir)
+    rows = []
+    try:
+        for profile in profiles:
+            best = {}
+            for _ in range(repeat):
+                for phase, result in bench_profile(profile, root, settings, scale, seed).items():
+                    # Keep the fastest run of each phase; slower ones are mostly noise
+                    if phase not in best or result["seconds"] < best[phase]["seconds"]:
+                        best[phase] = result
+            for phase in PHASES:
+                row = {"profile": profile, "phase": phase, **best[phase]}
+                del row["ok"], row["log"]
+                rows.append(row)
+                print_row(row)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "codec": settings["compression_codec"],
+        "scale": scale,
+        "seed": seed,
+        "repeat": repeat,
+        "results": rows,
+    }
+
+def print_row(row):
+    syscalls = (f", {row['read_syscalls']:,} reads/{row['write_syscalls']:,} writes"
+                if row["read_syscalls"] is not None else "")
+    rss = f", peak {row['peak_rss_mb']:.0f} MB" if row["peak_rss_mb"] is not None else ""
+    print(f"{row['profile']:>14} {row['phase']:<11} {row['seconds']:7.2f}s "
+          f"{row['files_per_s']:>10,.0f} files/s {row['mb_per_s']:8.1f} MB/s{rss}{syscalls}")
+
+def find_regressions(baseline, current, threshold=0.1, min_seconds=0.05):
+    # Time or peak memory more than threshold above the baseline; phases shorter than
+    # min_seconds in both runs are too noisy to judge on time
+    previous = {(row["profile"], row["phase"]): row for row in baseline["results"]}
+    regressions = []
+    for row in current["results"]:
+        old = previous.get((row["profile"], row["phase"]))
+        if old is None:
+            continue
+        if max(old["seconds"], row["seconds"]) >= min_seconds and row["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append((row["profile"], row["phase"], "seconds", old["seconds"], row["seconds"]))
+        if old["peak_rss_mb"] and row["peak_rss_mb"] and row["peak_rss_mb"] > old["peak_rss_mb"] * (1 + threshold):
+            regressions.append((row["profile"], row["phase"], "peak_rss_mb", old["peak_rss_mb"], row["peak_rss_mb"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time snapshot, duplicate check and restore on synthetic trees")
+    parser.add_argument("--profile", action="append", choices=PROFILES, help="tree to run, repeatable (default all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the file counts and sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per profile, the fastest counts")
+    parser.add_argument("--codec", help="compression codec to use instead of the configured one")
+    parser.add_argument("--work-dir", help="where to create the trees (default the system temp dir)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 for 10%%")
+    args = parser.parse_args()
+
+    results = run_suite(args.profile or PROFILES, args.scale, args.seed, args.repeat, args.codec, args.work_dir)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, results, args.threshold)
+        for profile, phase, metric, old, new in regressions:
+            print(f"REGRESSION {profile} {phase}: {metric} {old:.2f} -> {new:.2f} (+{(new / old - 1) * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold * 100:.0f}% against {args.compare}")
@@ -0,0 +1,63 @@
+import io
+import os
+import time
+import shutil
+import argparse
+import tarfile
+import tempfile
+import scanner
+
+def make_tree(root, file_count, files_per_dir=1000):
+    for i in range(file_count):
+        directory = os.path.join(root, f"d{i // files_per_dir // 100}", f"d{i // files_per_dir}")
+        if i % files_per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{i}"), "wb") as f:
+            f.write(b"x" * (i % 64))
+
+def double_walk(root):
+    # What create_snapshot used to do: one walk to count, one to archive, plus tar's own lstat
+    total = sum([len(files) for r, d, files in os.walk(root)])
+    seen = 0
+    tar = tarfile.TarFile(fileobj=io.BytesIO(), mode="w")
+    for dirpath, dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            tar.gettarinfo(path, os.path.relpath(path, root))
+            seen += 1
+    return total, seen
+
+def single_pass(root):
+    seen = 0
+    for rel_path, path, st in scanner.iter_files(root):
+        scanner.tarinfo_from_stat(path, rel_path, st)
+        seen += 1
+    return seen, seen
+
+def timed(function, root):
+    start = time.perf_counter()
+    result = function(root)
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the old double os.walk with the scandir scanner")
+    parser.add_argument("--files", type=int, default=1000000)
+    parser.add_argument("--dir", help="existing tree to scan instead of a synthetic one")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="scanbench_")
+    try:
+        if not args.dir:
+            print(f"Creating {args.files} files under {root}...")
+            make_tree(root, args.files)
+        # Warm the dentry cache so both runs see the same metadata caching
+        scanner.count_files(root)
+        old_time, (total, _) = timed(double_walk, root)
+        new_time, _ = timed(single_pass, root)
+        print(f"files:          {total}")
+        print(f"double os.walk: {old_time:.2f}s ({total / old_time:,.0f} files/s)")
+        print(f"scandir pass:   {new_time:.2f}s ({total / new_time:,.0f} files/s)")
+        print(f"speedup:        {old_time / new_time:.2f}x")
+    finally:
+        if not args.dir:
+            shutil.rmtree(root)
@@ -0,0 +1,160 @@
+import os
+import time
+import sqlite3
+import datetime
+import contextlib
+import compression
+import hashing
+import storage
+from chunkstore import INDEX_SUFFIX
+
+CATALOG_FILE = "catalog.db"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H-%M-%S"
+SCHEMA_VERSION = 1
+
+def split_snapshot_name(name):
+    # "<source>_<timestamp><suffix>" -> (source, timestamp)
+    source, _, rest = name.rpartition("_")
+    return source, rest[:19]
+
+def is_snapshot_name(name):
+    return name.endswith(INDEX_SUFFIX) or compression.archive_codec(name) is not None
+
+class Catalog:
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.path = os.path.join(backup_dir, CATALOG_FILE)
+        # A new catalog next to existing archives needs a rebuild before lookups can be trusted
+        self.created = not os.path.exists(self.path)
+        with self.connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    name TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    created TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT,
+                    fingerprint TEXT,
+                    parent TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS snapshots_digest ON snapshots (source, digest)')
+            conn.execute('CREATE INDEX IF NOT EXISTS snapshots_created ON snapshots (source, created)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scrubs (
+                    name TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    detail TEXT,
+                    checked REAL NOT NULL,
+                    size INTEGER,
+                    mtime_ns INTEGER
+                )
+            ''')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    @contextlib.contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, name, kind, size, digest=None, fingerprint=None, parent=None):
+        source, created = split_snapshot_name(name)
+        with self.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (name, source, kind, created, size, digest, fingerprint, parent))
+
+    def find_duplicate(self, source, digest, exclude=None):
+        with self.connect() as conn:
+            row = conn.execute('SELECT name FROM snapshots WHERE source = ? AND digest = ? AND kind = ? AND name != ?',
+                               (source, digest, "full", exclude or "")).fetchone()
+        return row[0] if row else None
+
+    def snapshots(self, source=None):
+        query = 'SELECT name, source, kind, created, size, digest, fingerprint, parent FROM snapshots'
+        params = ()
+        if source is not None:
+            query += ' WHERE source = ?'
+            params = (source,)
+        with self.connect() as conn:
+            rows = conn.execute(query + ' ORDER BY created, name', params).fetchall()
+        keys = ("name", "source", "kind", "created", "size", "digest", "fingerprint", "parent")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def rebuild(self, algorithm=None, backend=None):
+        # With an algorithm given, archive digests are recomputed on a thread pool. Remote
+        # archives would have to be downloaded for that, so they keep no digest.
+        backend = backend or storage.LocalStorage(self.backup_dir)
+        sizes = {name: size for name, size, mtime_ns in storage.LocalStorage(self.backup_dir).list()
+                 if name.endswith(INDEX_SUFFIX)}
+        sizes.update((name, size) for name, size, mtime_ns in backend.list() if is_snapshot_name(name))
+        rows = []
+        for name in sorted(sizes):
+            source, created = split_snapshot_name(name)
+            if name.endswith(INDEX_SUFFIX):
+                rows.append((name, source, "chunked", created, sizes[name], None, None, None))
+                continue
+            # Remote sidecars are fetched into the backup directory on the way
+            meta = backend.load_meta(name) or {}
+            rows.append((name, source, meta.get("kind", "full"), created, sizes[name],
+                         None, meta.get("fingerprint"), meta.get("parent")))
+        if algorithm and not backend.remote:
+            archives = [index for index, row in enumerate(rows) if row[2] != "chunked"]
+            digests = hashing.hash_files([(os.path.join(self.backup_dir, rows[index][0]), None)
+                                          for index in archives], algorithm)
+            for index, digest in zip(archives, digests):
+                rows[index] = rows[index][:5] + (digest,) + rows[index][6:]
+        with self.connect() as conn:
+            conn.execute('DELETE FROM snapshots')
+            conn.executemany('INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def remove(self, names):
+        with self.connect() as conn:
+            conn.executemany('DELETE FROM snapshots WHERE name = ?', [(name,) for name in names])
+            conn.executemany('DELETE FROM scrubs WHERE name = ?', [(name,) for name in names])
+
+    def record_scrub(self, name, status, detail, size=None, mtime_ns=None):
+        with self.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO scrubs VALUES (?, ?, ?, ?, ?, ?)',
+                         (name, status, detail, time.time(), size, mtime_ns))
+
+    def scrub_results(self):
+        with self.connect() as conn:
+            rows = conn.execute('SELECT name, status, detail, checked, size, mtime_ns FROM scrubs').fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+def retention_keep(snapshots, policy):
+    # Keep the newest snapshot in each of the last N hours/days/weeks/months, plus the newest
+    # overall and every chain parent a kept incremental needs.
+    buckets = {
+        "hourly": lambda t: t.strftime("%Y-%m-%d %H"),
+        "daily": lambda t: t.strftime("%Y-%m-%d"),
+        "weekly": lambda t: t.strftime("%G-%V"),
+        "monthly": lambda t: t.strftime("%Y-%m"),
+    }
+    newest_first = sorted(snapshots, key=lambda snapshot: (snapshot["created"], snapshot["name"]), reverse=True)
+    keep = set()
+    if newest_first:
+        keep.add(newest_first[0]["name"])
+    for period, bucket_of in buckets.items():
+        limit = policy.get(period, 0)
+        seen = set()
+        for snapshot in newest_first:
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(datetime.datetime.strptime(snapshot["created"], TIMESTAMP_FORMAT))
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(snapshot["name"])
+    parents = {snapshot["name"]: snapshot["parent"] for snapshot in snapshots}
+    for name in list(keep):
+        parent = parents.get(name)
+        while parent and parent not in keep:
+            keep.add(parent)
+            parent = parents.get(parent)
+    return keep
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import zlib
+import random
+import hashlib
+from throttle import ThrottledReader
+
+CHUNK_DIR = "chunks"
+INDEX_SUFFIX = ".chunks.json"
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+READ_SIZE = 8 * 1024 * 1024
+# Cut when the top 20 bits of the gear hash are zero, roughly 1 MiB past MIN_CHUNK on average
+BOUNDARY_MASK = ((1 << 20) - 1) << 44
+MASK64 = (1 << 64) - 1
+# Chunks touched this recently may belong to a snapshot whose index is not written yet
+GC_GRACE_SECONDS = 6 * 3600
+
+_rng = random.Random(0x636F7272)
+GEAR = [_rng.getrandbits(64) for _ in range(256)]
+
+# NumPy finds cuts about ten times faster; the pure Python loop manages only a few MB/s,
+# which makes chunked mode slow on large trees
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Bytes the vectorized search hashes per step; most cuts land within the first few steps
+SEARCH_BLOCK = 256 * 1024
+# Bits 44-63 of the gear hash depend on the last 64 bytes only (older bytes are shifted out)
+GEAR_WINDOW = 64
+if numpy is not None:
+    GEAR_ARRAY = numpy.array(GEAR, dtype=numpy.uint64)
+
+def find_cut_python(buf):
+    # Gear rolling hash (as in FastCDC), so boundaries follow content rather than offsets
+    end = min(len(buf), MAX_CHUNK)
+    if end <= MIN_CHUNK:
+        return end
+    gear = GEAR
+    h = 0
+    for i in range(MIN_CHUNK, end):
+        h = ((h << 1) + gear[buf[i]]) & MASK64
+        if not h & BOUNDARY_MASK:
+            return i + 1
+    return end
+
+def find_cut_numpy(buf):
+    # Same cuts as find_cut_python. The hash at byte i is the sum of GEAR[buf[i - k]] << k for
+    # k < 64 (mod 2**64), counting only bytes from MIN_CHUNK on, which doubling the summed
+    # window six times computes for a whole block at once.
+    end = min(len(buf), MAX_CHUNK)
+    if end <= MIN_CHUNK:
+        return end
+    data = numpy.frombuffer(buf, dtype=numpy.uint8, count=end)
+    mask = numpy.uint64(BOUNDARY_MASK)
+    for start in range(MIN_CHUNK, end, SEARCH_BLOCK):
+        stop = min(start + SEARCH_BLOCK, end)
+        # Carry the previous 63 bytes in, but none from before MIN_CHUNK where the hash starts at 0
+        lead = min(GEAR_WINDOW - 1, start - MIN_CHUNK)
+        h = GEAR_ARRAY[data[start - lead:stop]]
+        width = 1
+        while width < GEAR_WINDOW:
+            shifted = h[:-width] << numpy.uint64(width)
+            h[width:] += shifted
+            width *= 2
+        hits = numpy.flatnonzero((h[lead:] & mask) == 0)
+        if len(hits):
+            return start + int(hits[0]) + 1
+    return end
+
+find_cut = find_cut_numpy if numpy is not None else find_cut_python
+
+def iter_chunks(f):
+    buf = b""
+    eof = False
+    while not eof:
+        data = f.read(READ_SIZE)
+        eof = not data
+        buf += data
+        while len(buf) >= MAX_CHUNK or (eof and buf):
+            cut = find_cut(buf)
+            yield buf[:cut]
+            buf = buf[cut:]
+
+class ChunkStore:
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.root = os.path.join(backup_dir, CHUNK_DIR)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put_chunk(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return digest, len(compressed)
+
+    def get_chunk(self, digest):
+        with open(self.chunk_path(digest), "rb") as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} is corrupt")
+        return data
+
+    def store_file(self, path, throttle=None):
+        if os.path.islink(path):
+            return {"link": os.readlink(path)}, 0
+        chunks = []
+        written = 0
+        with open(path, "rb") as f:
+            for chunk in iter_chunks(f if throttle is None else ThrottledReader(f, throttle)):
+                digest, size = self.put_chunk(chunk)
+                chunks.append(digest)
+                written += size
+        return {"chunks": chunks}, written
+
+    def restore_file(self, entry, target_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        if "link" in entry:
+            os.symlink(entry["link"], target_path)
+            return
+        with open(target_path, "wb") as f:
+            for digest in entry["chunks"]:
+                f.write(self.get_chunk(digest))
+        os.chmod(target_path, entry["mode"])
+        os.utime(target_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    def load_index(self, name):
+        with open(os.path.join(self.backup_dir, name), "r") as f:
+            return json.load(f)
+
+    def save_index(self, name, index):
+        path = os.path.join(self.backup_dir, name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+
+    def referenced_chunks(self):
+        referenced = set()
+        for name in os.listdir(self.backup_dir):
+            if name.endswith(INDEX_SUFFIX):
+                for entry in self.load_index(name)["files"].values():
+                    referenced.update(entry.get("chunks", ()))
+        return referenced
+
+    def collect_garbage(self):
+        # Mark chunks reachable from any snapshot index, then sweep the rest
+        if not os.path.isdir(self.root):
+            return 0, 0
+        referenced = self.referenced_chunks()
+        cutoff = time.time() - GC_GRACE_SECONDS
+        removed = 0
+        freed = 0
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name not in referenced and not name.endswith(".tmp") and os.path.getmtime(path) < cutoff:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+        return removed, freed
@@ -0,0 +1,202 @@
+import os
+import bz2
+import gzip
+import lzma
+import time
+import random
+import tarfile
+import contextlib
+import collections
+import scanner
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+BLOCK_SIZE = 1024 * 1024
+
+class Codec:
+    def __init__(self, name, extension, default_level, levels, compress, decompress, open_reader, tar_mode=None):
+        self.name = name
+        self.extension = extension
+        self.default_level = default_level
+        self.levels = levels
+        self.compress = compress
+        self.decompress = decompress
+        self.open_reader = open_reader
+        # Compression tarfile understands itself, which allows random access reads
+        self.tar_mode = tar_mode
+
+def _zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def _zstd_reader(f):
+    return zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+
+CODECS = {
+    "gzip": Codec("gzip", ".gz", 9, [1, 6, 9],
+                  lambda data, level: gzip.compress(data, compresslevel=level, mtime=0), gzip.decompress,
+                  lambda f: gzip.GzipFile(fileobj=f, mode="rb"), "gz"),
+    "bz2": Codec("bz2", ".bz2", 9, [1, 9],
+                 lambda data, level: bz2.compress(data, level), bz2.decompress,
+                 lambda f: bz2.BZ2File(f, "rb"), "bz2"),
+    "xz": Codec("xz", ".xz", 6, [0, 6],
+                lambda data, level: lzma.compress(data, preset=level), lzma.decompress,
+                lambda f: lzma.LZMAFile(f, "rb"), "xz"),
+    "store": Codec("store", "", 0, [0],
+                   lambda data, level: data, lambda data: data,
+                   lambda f: f, ""),
+}
+
+if zstandard is not None:
+    CODECS["zstd"] = Codec("zstd", ".zst", 3, [1, 3, 19], _zstd_compress, _zstd_decompress, _zstd_reader)
+
+if lz4 is not None:
+    CODECS["lz4"] = Codec("lz4", ".lz4", 0, [0, 9],
+                          lambda data, level: lz4.frame.compress(data, compression_level=level),
+                          lz4.frame.decompress,
+                          lambda f: lz4.frame.LZ4FrameFile(f, "rb"))
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Compression codec '{name}' is not available")
+    return CODECS[name]
+
+def archive_codec(filename):
+    # Codec of a snapshot archive judging by its name, None if it is not one
+    for codec in CODECS.values():
+        if filename.endswith(".tar" + codec.extension):
+            return codec
+    return None
+
+def archive_patterns():
+    return " ".join(f"*.tar{codec.extension}" for codec in CODECS.values())
+
+def worker_count(setting):
+    return setting if setting and setting > 0 else (os.cpu_count() or 1)
+
+class ParallelCompressor:
+    # Compresses fixed-size blocks on a thread pool (the codecs release the GIL) and writes
+    # them in order as independent members/frames, which every decompressor here reads back
+    # as one stream.
+    def __init__(self, fileobj, codec, level=None, workers=0, block_size=BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.codec = codec
+        self.level = codec.default_level if level is None else level
+        self.block_size = block_size
+        self.workers = worker_count(workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.position = 0
+        self.compressed_position = 0
+        # [uncompressed offset, compressed offset, compressed size] of every block written
+        self.blocks = []
+        self.closed = False
+
+    def compress_block(self, block):
+        return self.codec.compress(block, self.level)
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def submit(self, block):
+        self.pending.append((self.position, self.executor.submit(self.compress_block, block)))
+        self.position += len(block)
+        # Bound memory to a couple of blocks per worker
+        while len(self.pending) > self.workers * 2:
+            self.write_next()
+
+    def write_next(self):
+        offset, future = self.pending.popleft()
+        data = future.result()
+        self.blocks.append([offset, self.compressed_position, len(data)])
+        self.compressed_position += len(data)
+        self.fileobj.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.buffer:
+            self.submit(bytes(self.buffer))
+            self.buffer.clear()
+        while self.pending:
+            self.write_next()
+        self.executor.shutdown()
+        self.fileobj.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # The archive is being thrown away, so the buffered blocks need not be written
+            self.closed = True
+            self.executor.shutdown(cancel_futures=True)
+
+@contextlib.contextmanager
+def open_archive(path):
+    codec = archive_codec(path) or CODECS["gzip"]
+    if codec.tar_mode is not None:
+        with tarfile.open(path, "r:" + codec.tar_mode) as tar:
+            yield tar
+    else:
+        with open(path, "rb") as f, tarfile.open(fileobj=codec.open_reader(f), mode="r|") as tar:
+            yield tar
+
+def sample_tree(source_dir, sample_bytes=64 * 1024 * 1024, per_file=1024 * 1024, seed=0):
+    paths = [path for rel_path, path, st in scanner.iter_files(source_dir)]
+    random.Random(seed).shuffle(paths)
+    sample = bytearray()
+    for path in paths:
+        if len(sample) >= sample_bytes:
+            break
+        try:
+            with open(path, "rb") as f:
+                sample += f.read(min(per_file, sample_bytes - len(sample)))
+        except OSError:
+            continue
+    return bytes(sample)
+
+def benchmark_codecs(source_dir, sample_bytes=64 * 1024 * 1024):
+    # Compress a sample of the tree with every available codec and level
+    sample = sample_tree(source_dir, sample_bytes)
+    blocks = [sample[i:i + BLOCK_SIZE] for i in range(0, len(sample), BLOCK_SIZE)]
+    results = []
+    if not sample:
+        return results
+    for codec in CODECS.values():
+        for level in codec.levels:
+            start = time.perf_counter()
+            compressed = sum(len(codec.compress(block, level)) for block in blocks)
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            results.append({
+                "codec": codec.name,
+                "level": level,
+                "ratio": len(sample) / max(compressed, 1),
+                "mb_per_s": len(sample) / 1024 / 1024 / elapsed,
+            })
+    return results
+
+if __name__ == "__main__":
+    import sys
+    for result in benchmark_codecs(sys.argv[1]):
+        print(f"{result['codec']:>6} level {result['level']:>2}: "
+              f"ratio {result['ratio']:.2f}, {result['mb_per_s']:.1f} MB/s")
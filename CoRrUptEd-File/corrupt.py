@@ -1,22 +1,27 @@
-import os
-import tarfile
-import time
-import hashlib
 import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
+from tkinter import filedialog, ttk, messagebox, simpledialog
 import threading
-import datetime
+import compression
+from chunkstore import INDEX_SUFFIX
+from engine import BackupEngine
+from jobs import JobScheduler
+from progress import ProgressChannel, format_progress
+from settings import load_settings
 
 class CoRrUptEdFile:
     def __init__(self, master):
         self.master = master
         master.title("CoRrUptEd File")
-        master.geometry("500x500")
+        master.geometry("500x610")
         master.configure(bg="#2c2c2c")
 
         self.backup_thread = None
-        self.paused = False
-        self.running = False
+        self.settings = load_settings()
+        self.progress = ProgressChannel()
+        self.engine = BackupEngine(settings=self.settings, progress=self.progress)
+        self.scheduler = JobScheduler(self.settings, log=self.log_message)
+        self.scheduler_thread = None
+        self.jobs_window = None
 
         self.setup_custom_style()
 
@@ -24,8 +29,15 @@ class CoRrUptEdFile:
         self.backup_directory = tk.StringVar()
         self.status = tk.StringVar()
         self.status.set("Stopped")
+        self.snapshot_mode = tk.StringVar()
+        self.snapshot_mode.set(self.settings["snapshot_mode"])
+        self.codec = tk.StringVar()
+        self.codec.set(self.settings["compression_codec"])
+
+        self.progress_text = tk.StringVar()
 
         self.create_widgets()
+        self.poll_progress()
 
     def setup_custom_style(self):
         style = ttk.Style()
@@ -37,7 +49,9 @@ class CoRrUptEdFile:
             },
             "TLabel": {"configure": {"font": ("Arial", 10), "background": "#2c2c2c", "foreground": "white"}},
             "TEntry": {"configure": {"font": ("Arial", 10), "fieldbackground": "#3c3c3c", "foreground": "white"}},
+            "TCombobox": {"configure": {"fieldbackground": "#3c3c3c", "foreground": "white"}},
             "Horizontal.TProgressbar": {"configure": {"background": "#4CAF50"}},
+            "Treeview": {"configure": {"background": "#3c3c3c", "fieldbackground": "#3c3c3c", "foreground": "white"}},
         })
         style.theme_use("darktheme")
 
@@ -55,8 +69,18 @@ class CoRrUptEdFile:
         ttk.Entry(frame, textvariable=self.backup_directory, width=30).grid(row=1, column=1, padx=5, pady=5)
         ttk.Button(frame, text="Browse", command=self.browse_backup_directory).grid(row=1, column=2, padx=5, pady=5)
 
+        ttk.Label(frame, text="Snapshot Mode:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        ttk.Combobox(frame, textvariable=self.snapshot_mode, values=["full", "incremental", "chunked"],
+                     state="readonly", width=27).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        ttk.Button(frame, text="Jobs", command=self.open_jobs_window).grid(row=2, column=2, padx=5, pady=5)
+
+        ttk.Label(frame, text="Compression:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        ttk.Combobox(frame, textvariable=self.codec, values=list(compression.CODECS),
+                     state="readonly", width=27).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        ttk.Button(frame, text="Benchmark", command=self.benchmark_codecs).grid(row=3, column=2, padx=5, pady=5)
+
         button_frame = ttk.Frame(frame)
-        button_frame.grid(row=2, column=0, columnspan=3, pady=10)
+        button_frame.grid(row=4, column=0, columnspan=3, pady=10)
 
         self.start_button = ttk.Button(button_frame, text="Start Backup", command=self.start_backup)
         self.start_button.pack(side=tk.LEFT, padx=5)
@@ -70,15 +94,17 @@ class CoRrUptEdFile:
         self.restore_button = ttk.Button(button_frame, text="Restore Backup", command=self.restore_backup)
         self.restore_button.pack(side=tk.LEFT, padx=5)
 
-        ttk.Label(frame, text="Status:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        ttk.Label(frame, text="Status:").grid(row=5, column=0, padx=5, pady=5, sticky="w")
         self.status_label = ttk.Label(frame, textvariable=self.status)
-        self.status_label.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        self.status_label.grid(row=5, column=1, padx=5, pady=5, sticky="w")
 
         self.progress_bar = ttk.Progressbar(frame, orient="horizontal", length=300, mode="determinate")
-        self.progress_bar.grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky="we")
+        self.progress_bar.grid(row=6, column=0, columnspan=3, padx=5, pady=5, sticky="we")
+
+        ttk.Label(frame, textvariable=self.progress_text).grid(row=7, column=0, columnspan=3, padx=5, sticky="w")
 
         self.log = tk.Text(frame, height=10, width=55, bg="#3c3c3c", fg="white", font=("Arial", 10))
-        self.log.grid(row=5, column=0, columnspan=3, padx=5, pady=5)
+        self.log.grid(row=8, column=0, columnspan=3, padx=5, pady=5)
 
     def browse_source_directory(self):
         directory = filedialog.askdirectory()
@@ -93,20 +119,28 @@ class CoRrUptEdFile:
             self.log_message("Please select both source and backup directories.")
             return
 
-        self.running = True
-        self.paused = False
+        self.configure_engine()
+        self.engine.running = True
+        self.engine.paused = False
         self.status.set("Running")
         self.status_label.config(foreground="#4CAF50")
         self.start_button.config(state=tk.DISABLED)
         self.pause_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.NORMAL)
-        self.backup_thread = threading.Thread(target=self.backup_loop, daemon=True)
+        self.backup_thread = threading.Thread(target=self.engine.backup_loop, daemon=True)
         self.backup_thread.start()
 
+    def configure_engine(self):
+        # Copy the Tk variables over so the worker thread never reads widgets
+        self.engine.source_dir = self.source_directory.get()
+        self.engine.backup_dir = self.backup_directory.get()
+        self.engine.snapshot_mode = self.snapshot_mode.get()
+        self.engine.codec = self.codec.get()
+
     def pause_backup(self):
-        if self.running:
-            self.paused = not self.paused
-            if self.paused:
+        if self.engine.running:
+            self.engine.paused = not self.engine.paused
+            if self.engine.paused:
                 self.status.set("Paused")
                 self.status_label.config(foreground="#FFC107")
                 self.pause_button.config(text="Resume Backup")
@@ -116,88 +150,137 @@ class CoRrUptEdFile:
                 self.pause_button.config(text="Pause Backup")
 
     def stop_backup(self):
-        self.running = False
-        self.paused = False
+        self.engine.running = False
+        self.engine.paused = False
         self.status.set("Stopped")
         self.status_label.config(foreground="#F44336")
         self.start_button.config(state=tk.NORMAL)
         self.pause_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.DISABLED)
-        self.progress_bar["value"] = 0
+        self.progress.reset()
 
-    def backup_loop(self):
-        while self.running:
-            if not self.paused:
-                self.create_snapshot()
-            time.sleep(3600)  # Wait for 1 hour
+    def benchmark_codecs(self):
+        if not self.source_directory.get():
+            self.log_message("Please select a source directory to benchmark.")
+            return
+        threading.Thread(target=self.run_codec_benchmark, args=(self.source_directory.get(),), daemon=True).start()
 
-    def create_snapshot(self):
+    def run_codec_benchmark(self, source_dir):
+        self.log_message("Benchmarking compression codecs on a sample of the source...")
         try:
-            source_dir = self.source_directory.get()
-            backup_dir = self.backup_directory.get()
-            source_dir_name = os.path.basename(source_dir)
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-            snapshot_name = f"{source_dir_name}_{timestamp}.tar.gz"
-            snapshot_path = os.path.join(backup_dir, snapshot_name)
-            
-            total_files = sum([len(files) for r, d, files in os.walk(source_dir)])
-            self.progress_bar["maximum"] = total_files
-            self.progress_bar["value"] = 0
-            
-            with tarfile.open(snapshot_path, "w:gz") as tar:
-                for root, dirs, files in os.walk(source_dir):
-                    for file in files:
-                        if self.paused:
-                            while self.paused and self.running:
-                                time.sleep(0.1)
-                        if not self.running:
-                            return
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, source_dir)
-                        tar.add(file_path, arcname=arcname)
-                        self.progress_bar["value"] += 1
-                        self.master.update_idletasks()
-
-            # Check for duplicates
-            if self.is_duplicate(snapshot_path):
-                os.remove(snapshot_path)
-                self.log_message(f"Duplicate snapshot detected. Deleted {snapshot_name}")
-            else:
-                self.log_message(f"Snapshot created: {snapshot_name}")
-
+            for result in compression.benchmark_codecs(source_dir):
+                self.log_message(f"{result['codec']} level {result['level']}: "
+                                 f"ratio {result['ratio']:.2f}, {result['mb_per_s']:.1f} MB/s")
         except Exception as e:
-            self.log_message(f"Error creating snapshot: {str(e)}")
-        finally:
-            self.progress_bar["value"] = 0
-
-    def is_duplicate(self, new_snapshot):
-        backup_dir = self.backup_directory.get()
-        source_dir_name = os.path.basename(self.source_directory.get())
-        for file in os.listdir(backup_dir):
-            if file.startswith(f"{source_dir_name}_") and file.endswith(".tar.gz") and file != os.path.basename(new_snapshot):
-                if self.get_file_hash(os.path.join(backup_dir, file)) == self.get_file_hash(new_snapshot):
-                    return True
-        return False
-
-    def get_file_hash(self, filename):
-        hasher = hashlib.md5()
-        with open(filename, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
-        return hasher.hexdigest()
+            self.log_message(f"Error benchmarking codecs: {str(e)}")
+
+    def open_jobs_window(self):
+        if self.jobs_window is not None and self.jobs_window.winfo_exists():
+            self.jobs_window.lift()
+            return
+        self.jobs_window = tk.Toplevel(self.master)
+        self.jobs_window.title("Backup Jobs")
+        self.jobs_window.configure(bg="#2c2c2c")
+
+        frame = ttk.Frame(self.jobs_window, padding="10")
+        frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        columns = ("status", "last_run", "duration", "throughput", "next_run")
+        self.jobs_table = ttk.Treeview(frame, columns=columns, height=10)
+        self.jobs_table.heading("#0", text="Job")
+        self.jobs_table.column("#0", width=100)
+        for column, title, width in zip(columns, ("Status", "Last Run", "Duration", "Throughput", "Next Run"),
+                                        (120, 140, 70, 90, 140)):
+            self.jobs_table.heading(column, text=title)
+            self.jobs_table.column(column, width=width)
+        self.jobs_table.grid(row=0, column=0, padx=5, pady=5)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=1, column=0, pady=10)
+        ttk.Button(button_frame, text="Add Current", command=self.add_current_job).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Remove", command=self.remove_selected_jobs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Run Scheduler", command=self.start_scheduler).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Stop Scheduler", command=self.scheduler.stop).pack(side=tk.LEFT, padx=5)
+
+        self.refresh_jobs_table()
+
+    def refresh_jobs_table(self):
+        if self.jobs_window is None or not self.jobs_window.winfo_exists():
+            return
+        selected = self.jobs_table.selection()
+        self.jobs_table.delete(*self.jobs_table.get_children())
+        for row in self.scheduler.job_rows():
+            self.jobs_table.insert("", tk.END, iid=row["name"], text=row["name"], values=(
+                row.get("progress") or row["status"],
+                row["last_run"] or "",
+                f"{row['duration']:.1f}s" if row["duration"] is not None else "",
+                f"{row['mb_per_s']:.1f} MB/s" if row["mb_per_s"] is not None else "",
+                row["next_run"],
+            ))
+        self.jobs_table.selection_set([iid for iid in selected if self.jobs_table.exists(iid)])
+        self.master.after(1000, self.refresh_jobs_table)
+
+    def add_current_job(self):
+        if not self.source_directory.get() or not self.backup_directory.get():
+            self.log_message("Please select both source and backup directories.")
+            return
+        name = simpledialog.askstring("Job Name", "Name for a job backing up the selected directories:",
+                                      parent=self.jobs_window)
+        if not name:
+            return
+        try:
+            self.scheduler.add_job(name, self.source_directory.get(), self.backup_directory.get(),
+                                   interval_seconds=self.settings["interval_seconds"],
+                                   settings={"snapshot_mode": self.snapshot_mode.get(),
+                                             "compression_codec": self.codec.get()})
+        except ValueError as e:
+            messagebox.showerror("Add Job", str(e), parent=self.jobs_window)
+
+    def remove_selected_jobs(self):
+        for name in self.jobs_table.selection():
+            if not self.scheduler.remove_job(name):
+                self.log_message(f"Job {name} is running and cannot be removed")
+
+    def start_scheduler(self):
+        if self.scheduler_thread is not None and self.scheduler_thread.is_alive():
+            return
+        self.log_message("Job scheduler started")
+        self.scheduler_thread = threading.Thread(target=self.scheduler.run, daemon=True)
+        self.scheduler_thread.start()
 
     def log_message(self, message):
-        self.log.insert(tk.END, f"{datetime.datetime.now()}: {message}\n")
-        self.log.see(tk.END)
+        # Safe from any thread; the text widget is only touched in poll_progress
+        self.progress.log(message)
+
+    def poll_progress(self):
+        for kind, payload in self.progress.drain():
+            if kind == "log":
+                self.log.insert(tk.END, f"{payload['time']}: {payload['message']}\n")
+                self.log.see(tk.END)
+            else:
+                function, args = payload
+                function(*args)
+        state = self.progress.read()
+        # Files added since the previous run can take the count past its estimate; the bar
+        # then stays full rather than jumping back to half way
+        self.progress_bar["maximum"] = max(state["total_files"], state["files"], 1)
+        self.progress_bar["value"] = state["files"]
+        self.progress_text.set(format_progress(state))
+        self.master.after(self.settings["ui_refresh_ms"], self.poll_progress)
 
     def restore_backup(self):
+        filetypes = [("Snapshot archives", compression.archive_patterns()), ("Chunk indexes", f"*{INDEX_SUFFIX}")]
+        if self.settings["storage"]:
+            # Remote archives are picked through their local metadata copies
+            filetypes.insert(0, ("Remote snapshots", "*.meta.json"))
         backup_file = filedialog.askopenfilename(
             initialdir=self.backup_directory.get(),
             title="Select backup file to restore",
-            filetypes=[("Tar GZ files", "*.tar.gz")]
+            filetypes=filetypes
         )
         if not backup_file:
             return
+        backup_file = backup_file.removesuffix(".meta.json")
 
         restore_dir = filedialog.askdirectory(
             title="Select directory to restore backup",
@@ -206,40 +289,75 @@ class CoRrUptEdFile:
         if not restore_dir:
             return
 
+        patterns = simpledialog.askstring(
+            "Restore Paths",
+            "Paths or patterns to restore (comma separated).\nLeave empty to restore everything.",
+            parent=self.master
+        )
+        if patterns is None:
+            return
+        patterns = [pattern.strip() for pattern in patterns.split(",") if pattern.strip()]
+
+        differential = messagebox.askyesnocancel(
+            "Restore Mode",
+            "Only write files that differ from the snapshot?\n\nChoose No to restore every selected file."
+        )
+        if differential is None:
+            return
+        if differential:
+            # Compare on a worker thread; the preview comes back through the progress channel
+            self.configure_engine()
+            self.status.set("Comparing")
+            threading.Thread(target=self.run_restore_plan, args=(backup_file, restore_dir, patterns), daemon=True).start()
+            return
+
         warning_message = f"Warning: Restoring the backup will overwrite files in the restore directory.\n\nRestore Directory: {restore_dir}\n\nAre you sure you want to proceed?"
         if messagebox.askyesno("Confirm Restore", warning_message):
-            self.running = True
-            self.paused = False
-            self.status.set("Restoring")
-            self.status_label.config(foreground="#4CAF50")
-            self.start_button.config(state=tk.DISABLED)
-            self.pause_button.config(state=tk.NORMAL)
-            self.stop_button.config(state=tk.NORMAL)
-            
-            restore_thread = threading.Thread(target=self.perform_restore, args=(backup_file, restore_dir), daemon=True)
-            restore_thread.start()
-
-    def perform_restore(self, backup_file, restore_dir):
+            self.begin_restore(self.engine.perform_restore, backup_file, restore_dir, patterns)
+
+    def begin_restore(self, function, *args):
+        self.configure_engine()
+        self.engine.running = True
+        self.engine.paused = False
+        self.status.set("Restoring")
+        self.status_label.config(foreground="#4CAF50")
+        self.start_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.NORMAL)
+
+        restore_thread = threading.Thread(target=self.run_restore, args=(function, *args), daemon=True)
+        restore_thread.start()
+
+    def run_restore(self, function, *args):
         try:
-            with tarfile.open(backup_file, "r:gz") as tar:
-                members = tar.getmembers()
-                self.progress_bar["maximum"] = len(members)
-                self.progress_bar["value"] = 0
-                for member in members:
-                    if self.paused:
-                        while self.paused and self.running:
-                            time.sleep(0.1)
-                    if not self.running:
-                        return
-                    tar.extract(member, path=restore_dir)
-                    self.progress_bar["value"] += 1
-                    self.master.update_idletasks()
-            self.log_message(f"Backup restored to: {restore_dir}")
-        except Exception as e:
-            self.log_message(f"Error restoring backup: {str(e)}")
+            function(*args)
         finally:
-            self.progress_bar["value"] = 0
-            self.stop_backup()  # Reset the UI state
+            self.progress.call(self.stop_backup)  # Reset the UI state
+
+    def run_restore_plan(self, backup_file, restore_dir, patterns):
+        try:
+            plan = self.engine.plan_restore(backup_file, restore_dir, patterns, self.settings["restore_delete_extras"])
+        except Exception as e:
+            self.log_message(f"Error comparing with snapshot: {str(e)}")
+            self.progress.call(self.status.set, "Stopped")
+            return
+        self.progress.call(self.confirm_restore_plan, backup_file, restore_dir, plan)
+
+    def confirm_restore_plan(self, backup_file, restore_dir, plan):
+        self.status.set("Stopped")
+        changes = ([f"write {path}" for path in plan["write"]]
+                   + [f"touch {path}" for path, mtime_ns in plan["touch"]]
+                   + [f"delete {path}" for path in plan["delete"]])
+        if not changes:
+            self.log_message(f"{restore_dir} already matches the snapshot")
+            return
+        preview = "\n".join(changes[:15])
+        if len(changes) > 15:
+            preview += f"\n... and {len(changes) - 15} more"
+        message = (f"{len(plan['write'])} files to write, {len(plan['touch'])} timestamps to fix, "
+                   f"{len(plan['delete'])} files to delete, {plan['unchanged']} unchanged.\n\n{preview}\n\nProceed?")
+        if messagebox.askyesno("Confirm Differential Restore", message):
+            self.begin_restore(self.engine.apply_restore_plan, backup_file, restore_dir, plan)
 
 if __name__ == "__main__":
     root = tk.Tk()
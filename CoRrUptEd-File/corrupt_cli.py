@@ -0,0 +1,259 @@
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from engine import BackupEngine
+from chunkstore import ChunkStore
+from jobs import JobScheduler, JOBS_FILE
+from settings import load_settings, SETTINGS_FILE
+
+def emit(event, **fields):
+    sys.stdout.write(json.dumps({"event": event, **fields}) + "\n")
+    sys.stdout.flush()
+
+class JsonReporter:
+    # Prints the engine's log lines and a progress sample every interval as JSON lines
+    def __init__(self, progress, interval):
+        self.progress = progress
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush(True)
+
+    def flush(self, with_progress):
+        for kind, payload in self.progress.drain():
+            if kind == "log":
+                emit("log", **payload)
+        state = self.progress.read()
+        if with_progress and state["phase"]:
+            emit("progress", **state)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.flush(False)
+
+def build_engine(args):
+    settings = load_settings(args.settings)
+    if getattr(args, "mode", None):
+        settings["snapshot_mode"] = args.mode
+    if getattr(args, "codec", None):
+        settings["compression_codec"] = args.codec
+    if getattr(args, "trigger", None):
+        settings["trigger"] = args.trigger
+    if getattr(args, "interval", None):
+        settings["interval_seconds"] = args.interval
+    return BackupEngine(getattr(args, "source", ""), getattr(args, "dest", ""), settings)
+
+def cmd_snapshot(engine, args):
+    return 0 if engine.create_snapshot() else 1
+
+def cmd_restore(engine, args):
+    if not (args.diff or args.preview):
+        return 0 if engine.perform_restore(args.archive, args.target, args.path) else 1
+    plan = engine.plan_restore(args.archive, args.target, args.path,
+                               args.delete or engine.settings["restore_delete_extras"], args.checksum)
+    if args.preview:
+        for rel_path in plan["write"]:
+            emit("plan", action="write", path=rel_path)
+        for rel_path, mtime_ns in plan["touch"]:
+            emit("plan", action="touch", path=rel_path)
+        for rel_path in plan["delete"]:
+            emit("plan", action="delete", path=rel_path)
+        emit("plan_summary", write=len(plan["write"]), touch=len(plan["touch"]),
+             delete=len(plan["delete"]), unchanged=plan["unchanged"])
+        return 0
+    return 0 if engine.apply_restore_plan(args.archive, args.target, plan) else 1
+
+def cmd_list(engine, args):
+    for snapshot in engine.list_snapshots(args.source_name):
+        emit("snapshot", **snapshot)
+    return 0
+
+def cmd_prune(engine, args):
+    policy = dict(engine.settings["retention"] or {})
+    for period in ("hourly", "daily", "weekly", "monthly"):
+        if getattr(args, period) is not None:
+            policy[period] = getattr(args, period)
+    if not policy:
+        emit("error", message="no retention policy in settings or on the command line")
+        return 1
+    for snapshot in engine.prune_snapshots(policy, args.source_name, args.dry_run):
+        emit("pruned", dry_run=args.dry_run, **{key: snapshot[key] for key in ("name", "source", "kind", "size")})
+    return 0
+
+def cmd_rebuild_catalog(engine, args):
+    emit("catalog", snapshots=engine.rebuild_catalog())
+    return 0
+
+def cmd_daemon(engine, args):
+    def stop(signum, frame):
+        engine.running = False
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    engine.backup_loop()
+    return 0
+
+def cmd_excludes(engine, args):
+    report, kept = engine.exclusion_report()
+    for entry in report:
+        emit("excluded", **entry)
+    emit("kept", **kept)
+    return 0
+
+def cmd_scrub(engine, args):
+    counts = engine.scrub_snapshots(args.force)
+    emit("scrub", **counts)
+    return 0 if not counts["corrupt"] and not counts["missing"] else 1
+
+def cmd_jobs_list(engine, args):
+    scheduler = JobScheduler(engine.settings, args.jobs_file, engine.log_message)
+    for row in scheduler.job_rows():
+        emit("job", **row)
+    return 0
+
+def cmd_jobs_add(engine, args):
+    settings = {}
+    if args.mode:
+        settings["snapshot_mode"] = args.mode
+    if args.codec:
+        settings["compression_codec"] = args.codec
+    scheduler = JobScheduler(engine.settings, args.jobs_file, engine.log_message)
+    try:
+        scheduler.add_job(args.name, args.source, args.dest, priority=args.priority,
+                          interval_seconds=args.interval, settings=settings)
+    except ValueError as e:
+        emit("error", message=str(e))
+        return 1
+    return 0
+
+def cmd_jobs_remove(engine, args):
+    scheduler = JobScheduler(engine.settings, args.jobs_file, engine.log_message)
+    return 0 if scheduler.remove_job(args.name) else 1
+
+def cmd_jobs_run(engine, args):
+    scheduler = JobScheduler(engine.settings, args.jobs_file, engine.log_message)
+    def stop(signum, frame):
+        scheduler.stop()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    scheduler.run(args.once)
+    for row in scheduler.job_rows():
+        emit("job", **row)
+    return 0 if all(row["status"] != "failed" for row in scheduler.job_rows()) else 1
+
+def cmd_gc(engine, args):
+    removed, freed = ChunkStore(args.dest).collect_garbage()
+    emit("gc", removed=removed, freed=freed)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless CoRrUptEd File backups")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="settings JSON file")
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="seconds between progress lines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = subparsers.add_parser("snapshot", help="take one snapshot now")
+    snapshot.add_argument("--source", required=True)
+    snapshot.add_argument("--dest", required=True)
+    snapshot.add_argument("--mode", choices=["full", "incremental", "chunked"])
+    snapshot.add_argument("--codec")
+    snapshot.set_defaults(handler=cmd_snapshot)
+
+    restore = subparsers.add_parser("restore", help="restore a snapshot")
+    restore.add_argument("archive", help="archive path, or a snapshot name when storage is remote")
+    restore.add_argument("target")
+    restore.add_argument("--dest", default="", help="backup directory holding the metadata of remote snapshots")
+    restore.add_argument("--path", action="append", help="path or pattern to restore, repeatable")
+    restore.add_argument("--diff", action="store_true", help="only write files that differ from the snapshot")
+    restore.add_argument("--delete", action="store_true", help="with --diff, delete files the snapshot lacks")
+    restore.add_argument("--checksum", action="store_true", help="hash files even when size and mtime (to the second) match")
+    restore.add_argument("--preview", action="store_true", help="list what a differential restore would change")
+    restore.set_defaults(handler=cmd_restore)
+
+    listing = subparsers.add_parser("list", help="list snapshots in a backup directory")
+    listing.add_argument("--dest", required=True)
+    listing.add_argument("--source-name", help="only snapshots of this source directory name")
+    listing.set_defaults(handler=cmd_list)
+
+    daemon = subparsers.add_parser("daemon", help="keep taking snapshots until stopped")
+    daemon.add_argument("--source", required=True)
+    daemon.add_argument("--dest", required=True)
+    daemon.add_argument("--mode", choices=["full", "incremental", "chunked"])
+    daemon.add_argument("--codec")
+    daemon.add_argument("--trigger", choices=["hourly", "watch"])
+    daemon.add_argument("--interval", type=int, help="seconds between snapshots")
+    daemon.set_defaults(handler=cmd_daemon)
+
+    prune = subparsers.add_parser("prune", help="thin out snapshots by retention policy")
+    prune.add_argument("--dest", required=True)
+    prune.add_argument("--source-name", help="only snapshots of this source directory name")
+    for period in ("hourly", "daily", "weekly", "monthly"):
+        prune.add_argument(f"--{period}", type=int, help=f"{period} snapshots to keep")
+    prune.add_argument("--dry-run", action="store_true", help="list what would be removed")
+    prune.set_defaults(handler=cmd_prune)
+
+    rebuild = subparsers.add_parser("rebuild-catalog", help="rebuild the snapshot catalog from the archives")
+    rebuild.add_argument("--dest", required=True)
+    rebuild.set_defaults(handler=cmd_rebuild_catalog)
+
+    excludes = subparsers.add_parser("excludes", help="dry run: files and bytes each exclude rule saves")
+    excludes.add_argument("--source", required=True)
+    excludes.set_defaults(handler=cmd_excludes)
+
+    scrubbing = subparsers.add_parser("scrub", help="verify archives against their recorded checksums")
+    scrubbing.add_argument("--dest", required=True)
+    scrubbing.add_argument("--force", action="store_true", help="re-check archives that are still fresh")
+    scrubbing.set_defaults(handler=cmd_scrub)
+
+    jobs = subparsers.add_parser("jobs", help="manage and run scheduled backup jobs")
+    jobs.add_argument("--jobs-file", default=JOBS_FILE)
+    job_commands = jobs.add_subparsers(dest="jobs_command", required=True)
+    job_commands.add_parser("list", help="table of jobs with last run, duration and throughput") \
+        .set_defaults(handler=cmd_jobs_list)
+    add_job = job_commands.add_parser("add", help="add a job")
+    add_job.add_argument("name")
+    add_job.add_argument("--source", required=True)
+    add_job.add_argument("--dest", required=True)
+    add_job.add_argument("--mode", choices=["full", "incremental", "chunked"])
+    add_job.add_argument("--codec")
+    add_job.add_argument("--interval", type=int, default=3600, help="seconds between runs")
+    add_job.add_argument("--priority", type=int, default=0, help="higher runs first")
+    add_job.set_defaults(handler=cmd_jobs_add)
+    remove_job = job_commands.add_parser("remove", help="remove a job")
+    remove_job.add_argument("name")
+    remove_job.set_defaults(handler=cmd_jobs_remove)
+    run_jobs = job_commands.add_parser("run", help="run the scheduler until stopped")
+    run_jobs.add_argument("--once", action="store_true", help="run the jobs that are due, then exit")
+    run_jobs.set_defaults(handler=cmd_jobs_run)
+
+    gc = subparsers.add_parser("gc", help="remove chunks no snapshot references")
+    gc.add_argument("--dest", required=True)
+    gc.set_defaults(handler=cmd_gc)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engine = build_engine(args)
+    engine.running = True
+    reporter = JsonReporter(engine.progress, args.progress_interval)
+    reporter.start()
+    started = time.monotonic()
+    try:
+        status = args.handler(engine, args)
+    finally:
+        reporter.stop()
+    emit("done", command=args.command, status=status, seconds=round(time.monotonic() - started, 3))
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,611 @@
+import os
+import stat
+import time
+import tarfile
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import manifest
+import hashing
+import compression
+import archive_index
+import watcher
+import scanner
+import scrub
+import rules as scan_rules
+import storage
+from catalog import Catalog, retention_keep
+from chunkstore import ChunkStore, INDEX_SUFFIX
+from progress import ProgressChannel
+from throttle import Throttle, lower_priority, save_priority, restore_priority
+from settings import load_settings
+
+# create_snapshot returns True when a snapshot was written or the source is unchanged,
+# DUPLICATE when the new archive matched an existing one and was dropped, and None on failure
+DUPLICATE = "duplicate"
+
+class SnapshotStopped(Exception):
+    pass
+
+class BackupEngine:
+    # Snapshot, duplicate check and restore without any UI; the Tk window and the
+    # command line both drive this and watch self.progress.
+    def __init__(self, source_dir="", backup_dir="", settings=None, progress=None):
+        self.source_dir = source_dir
+        self.backup_dir = backup_dir
+        self.settings = settings or load_settings()
+        self.snapshot_mode = self.settings["snapshot_mode"]
+        self.codec = self.settings["compression_codec"]
+        self.progress = progress or ProgressChannel()
+        self.paused = False
+        self.running = False
+        self.last_stats = None
+
+    def log_message(self, message):
+        self.progress.log(message)
+
+    def wait_if_paused(self):
+        while self.paused and self.running:
+            time.sleep(0.1)
+        return self.running
+
+    def sleep(self, seconds):
+        # Like time.sleep, but returns early once the engine is stopped
+        deadline = time.monotonic() + seconds
+        while self.running and time.monotonic() < deadline:
+            time.sleep(max(0, min(0.5, deadline - time.monotonic())))
+
+    def open_catalog(self, backup_dir=None):
+        catalog = Catalog(backup_dir or self.backup_dir)
+        if catalog.created:
+            count = catalog.rebuild(self.settings["hash_algorithm"], self.open_storage(backup_dir))
+            if count:
+                self.log_message(f"Catalog rebuilt from {count} existing snapshots")
+        return catalog
+
+    def open_storage(self, backup_dir=None):
+        return storage.open_storage(self.settings, backup_dir or self.backup_dir)
+
+    def locate_snapshot(self, backup_file):
+        # A local archive can be restored from any directory; otherwise backup_file names a
+        # snapshot in the configured storage
+        if os.path.exists(backup_file) or not self.settings["storage"]:
+            return storage.LocalStorage(os.path.dirname(backup_file)), os.path.basename(backup_file)
+        return self.open_storage(), os.path.basename(backup_file)
+
+    def backup_loop(self):
+        if self.settings["trigger"] == "watch":
+            self.watch_loop()
+            return
+        while self.running:
+            if not self.paused:
+                self.create_snapshot()
+            self.sleep(self.settings["interval_seconds"])
+
+    def watch_loop(self):
+        source_dir = self.source_dir
+        rules = scan_rules.load_rules(source_dir, self.settings)
+        tree_watcher = watcher.create_watcher(source_dir, self.settings["watch_poll_seconds"], rules)
+        self.log_message(f"Watching {source_dir} for changes ({type(tree_watcher).__name__})")
+        try:
+            # Anything that changed while nobody was watching is caught by one full scan
+            pending = set() if self.create_snapshot() else None
+            while self.running:
+                dirty = watcher.collect_changes(tree_watcher, self.settings["watch_quiet_seconds"],
+                                                self.settings["watch_max_changes"],
+                                                lambda: not self.running or self.paused, pending)
+                if pending is None:
+                    dirty = None
+                if self.paused:
+                    pending = dirty
+                    self.wait_if_paused()
+                    continue
+                if not self.running:
+                    break
+                if dirty is not None:
+                    if scan_rules.IGNORE_FILE in dirty:
+                        rules = scan_rules.load_rules(source_dir, self.settings)
+                        tree_watcher.set_rules(rules)
+                    dirty = {path for path in dirty if not rules.path_rule(path)}
+                    if not dirty:
+                        # Only excluded paths changed
+                        pending = set()
+                        continue
+                # Keep the dirty set around if the snapshot did not go through
+                pending = set() if self.create_snapshot(dirty) else dirty
+        finally:
+            tree_watcher.close()
+
+    def start_throttle(self):
+        # None when no throttling is configured; priorities stick to the calling thread until
+        # create_snapshot restores them
+        settings = self.settings
+        priorities = lower_priority(settings["throttle_nice"], settings["throttle_ioprio"])
+        rate = settings["throttle_read_mb"]
+        if not (priorities or rate or settings["throttle_max_load"]):
+            return None
+        throttle = Throttle(rate * 1024 * 1024 if rate else None, settings["throttle_max_load"],
+                            settings["throttle_backoff_seconds"], lambda: not self.running)
+        throttle.priorities = priorities
+        return throttle
+
+    def create_snapshot(self, dirty=None):
+        throttle = None
+        # The thread may be a pool worker that runs other jobs next
+        saved_priority = save_priority()
+        try:
+            throttle = self.start_throttle()
+            source_dir = self.source_dir
+            backup_dir = self.backup_dir
+            source_dir_name = os.path.basename(source_dir)
+            backend = self.open_storage()
+            # Opened before anything is written: a catalog created now rebuilds from the
+            # archives already there, not from the one this run is about to add
+            catalog = self.open_catalog()
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+
+            manifest_file = manifest.manifest_path(backup_dir, source_dir_name)
+            state = manifest.load_manifest(manifest_file)
+            # Single scandir pass; the previous run's total stands in for the file count
+            self.progress.reset(state.get("totals", {}).get("files", 0), phase="Scanning")
+            rules = scan_rules.load_rules(source_dir, self.settings)
+            if dirty is not None and scan_rules.IGNORE_FILE in dirty:
+                # Changed rules can affect any path, so rescan everything
+                dirty = None
+            stats = {}
+            skipped = []
+            files = manifest.scan_tree(source_dir, state["files"], dirty, stats, self.scan_progress, rules,
+                                       throttle, skipped)
+            if skipped:
+                self.log_message(f"Skipped {len(skipped)} special files (FIFOs, sockets or devices): "
+                                 + ", ".join(skipped[:5]) + (", ..." if len(skipped) > 5 else ""))
+            fingerprint = manifest.tree_fingerprint(files)
+            parent = state["last_snapshot"]
+            # Chunked snapshots always live in the local backup directory
+            parent_exists = parent and (os.path.exists(os.path.join(backup_dir, parent))
+                                        if parent.endswith(INDEX_SUFFIX) else backend.exists(parent))
+
+            # Fingerprint the tree before writing anything so unchanged hours cost a metadata walk
+            if parent_exists and fingerprint == state.get("fingerprint"):
+                state["files"] = files
+                state["totals"] = manifest.tree_totals(files)
+                manifest.save_manifest(manifest_file, state)
+                self.log_message("Source unchanged since last snapshot, skipping")
+                return True
+
+            if self.snapshot_mode == "chunked":
+                snapshot_name = f"{source_dir_name}_{timestamp}{INDEX_SUFFIX}"
+                previous = parent if parent_exists and parent.endswith(INDEX_SUFFIX) else None
+                if not self.create_chunked_snapshot(source_dir, backup_dir, snapshot_name, files, previous, stats,
+                                                    throttle):
+                    return
+                catalog.add(snapshot_name, "chunked", os.path.getsize(os.path.join(backup_dir, snapshot_name)),
+                            fingerprint=fingerprint)
+                state["files"] = files
+                state["totals"] = manifest.tree_totals(files)
+                state["fingerprint"] = fingerprint
+                state["last_snapshot"] = snapshot_name
+                state["since_full"] = 0
+                manifest.save_manifest(manifest_file, state)
+                self.apply_retention()
+                return True
+
+            changed, deleted = manifest.diff_files(state["files"], files)
+            kind = "full"
+            if (self.snapshot_mode == "incremental" and parent_exists
+                    and not parent.endswith(INDEX_SUFFIX)):
+                every = self.settings["synthetic_full_every"]
+                if every and state["since_full"] + 1 >= every:
+                    kind = "synthetic"
+                else:
+                    kind = "incremental"
+
+            codec = compression.get_codec(self.codec)
+            suffix = f".incr.tar{codec.extension}" if kind == "incremental" else f".tar{codec.extension}"
+            snapshot_name = f"{source_dir_name}_{timestamp}{suffix}"
+
+            to_add = sorted(files) if kind == "full" else changed
+            archive_files = files if kind == "synthetic" else to_add
+            self.progress.reset(len(archive_files), sum(files[path][manifest.SIZE] for path in archive_files),
+                                "Archiving")
+
+            members = {}
+            with backend.create(snapshot_name) as f:
+                # Digest the compressed bytes on their way to storage for the duplicate check
+                writer = hashing.HashingWriter(f, self.settings["hash_algorithm"])
+                with compression.ParallelCompressor(writer, codec, self.settings["compression_level"],
+                                                    self.settings["compression_workers"]) as compressor, \
+                        tarfile.open(fileobj=compressor, mode="w|") as tar:
+                    if kind == "synthetic":
+                        unchanged = set(files) - set(changed)
+                        self.copy_from_chain(tar, members, backend, parent, unchanged)
+                    for rel_path in to_add:
+                        if not self.wait_if_paused():
+                            # Raising aborts the upload instead of completing a truncated archive
+                            raise SnapshotStopped()
+                        archive_index.add_path_indexed(tar, members, os.path.join(source_dir, rel_path),
+                                                       rel_path, stats.get(rel_path), throttle)
+                        self.progress.advance(1, files[rel_path][manifest.SIZE])
+
+            # Check for duplicates with an indexed catalog lookup
+            digest = writer.hexdigest()
+            if kind == "full" and catalog.find_duplicate(source_dir_name, digest, snapshot_name):
+                backend.remove(snapshot_name)
+                self.log_message(f"Duplicate snapshot detected. Deleted {snapshot_name}")
+                return DUPLICATE
+
+            backend.save_meta(snapshot_name, {
+                "kind": "incremental" if kind == "incremental" else "full",
+                "codec": codec.name,
+                "synthetic": kind == "synthetic",
+                "parent": parent if kind == "incremental" else None,
+                "fingerprint": fingerprint,
+                "files": files,
+                "archived": sorted(files) if kind != "incremental" else changed,
+                "deleted": deleted if kind == "incremental" else [],
+                "index": {"blocks": compressor.blocks, "members": members},
+            })
+            state["files"] = files
+            state["totals"] = manifest.tree_totals(files)
+            state["fingerprint"] = fingerprint
+            state["last_snapshot"] = snapshot_name
+            state["since_full"] = state["since_full"] + 1 if kind == "incremental" else 0
+            manifest.save_manifest(manifest_file, state)
+            catalog.add(snapshot_name, "incremental" if kind == "incremental" else "full",
+                        backend.stat(snapshot_name).st_size, digest, fingerprint,
+                        parent if kind == "incremental" else None)
+            if kind == "incremental":
+                self.log_message(f"Incremental snapshot created: {snapshot_name} "
+                                 f"({len(changed)} changed, {len(deleted)} deleted)")
+            elif kind == "synthetic":
+                self.log_message(f"Synthetic full snapshot created: {snapshot_name}")
+            else:
+                self.log_message(f"Snapshot created: {snapshot_name}")
+            self.apply_retention()
+            return True
+
+        except SnapshotStopped:
+            self.log_message(f"Snapshot stopped, discarded the partial {snapshot_name}")
+        except Exception as e:
+            self.log_message(f"Error creating snapshot: {str(e)}")
+        finally:
+            # Counters of the last phase (archiving or chunking) for the job table
+            self.last_stats = self.progress.read()
+            self.progress.reset()
+            if throttle is not None:
+                self.log_message(f"Throttle: {throttle.summary()}"
+                                 + (f" ({', '.join(throttle.priorities)})" if throttle.priorities else ""))
+            if not restore_priority(saved_priority):
+                self.log_message(f"Could not raise the nice value back to {saved_priority[0]}")
+
+    def scan_progress(self, count):
+        self.progress.set_count(count)
+
+    def create_chunked_snapshot(self, source_dir, backup_dir, snapshot_name, files, previous, stats, throttle=None):
+        store = ChunkStore(backup_dir)
+        previous_files = store.load_index(previous)["files"] if previous else {}
+        index_files = {}
+        written = 0
+        reused = 0
+        self.progress.reset(len(files), manifest.tree_totals(files)["bytes"], "Chunking")
+        for rel_path, record in sorted(files.items()):
+            if not self.wait_if_paused():
+                return False
+            file_path = os.path.join(source_dir, rel_path)
+            old_entry = previous_files.get(rel_path)
+            if old_entry and old_entry["digest"] == record[manifest.DIGEST]:
+                # Same content as last time, the chunk list can be reused without reading the file
+                entry = {key: value for key, value in old_entry.items() if key in ("chunks", "link")}
+                reused += 1
+            else:
+                entry, size = store.store_file(file_path, throttle)
+                written += size
+            st = stats.get(rel_path) or os.lstat(file_path)
+            entry.update(size=record[manifest.SIZE], mtime_ns=record[manifest.MTIME],
+                         mode=st.st_mode & 0o7777, digest=record[manifest.DIGEST])
+            index_files[rel_path] = entry
+            self.progress.advance(1, record[manifest.SIZE])
+
+        store.save_index(snapshot_name, {"kind": "chunked", "files": index_files})
+        self.log_message(f"Chunked snapshot created: {snapshot_name} "
+                         f"({written / 1024 / 1024:.1f} MB new chunk data, {reused} files unchanged)")
+        if self.settings["chunk_gc"]:
+            removed, freed = store.collect_garbage()
+            if removed:
+                self.log_message(f"Removed {removed} unreferenced chunks ({freed / 1024 / 1024:.1f} MB)")
+        return True
+
+    def copy_from_chain(self, tar, members, backend, snapshot_name, paths):
+        # Build a synthetic full by copying unchanged members out of the existing chain
+        remaining = set(paths)
+        for name, meta in backend.load_chain(snapshot_name):
+            wanted = remaining.intersection(meta["archived"])
+            if not wanted:
+                continue
+            with backend.open_archive(name) as old_tar:
+                for member in old_tar:
+                    if member.name in wanted:
+                        archive_index.add_indexed(tar, members, member,
+                                                  old_tar.extractfile(member) if member.isreg() else None)
+                        remaining.discard(member.name)
+                        self.progress.advance(1, member.size)
+        if remaining:
+            raise FileNotFoundError(f"{len(remaining)} files missing from snapshot chain")
+
+    def apply_retention(self):
+        if self.settings["retention"]:
+            self.prune_snapshots(self.settings["retention"], os.path.basename(self.source_dir))
+
+    def prune_snapshots(self, policy, source=None, dry_run=False):
+        backup_dir = self.backup_dir
+        catalog = self.open_catalog()
+        by_source = {}
+        for snapshot in catalog.snapshots(source):
+            by_source.setdefault(snapshot["source"], []).append(snapshot)
+        doomed = []
+        for snapshots in by_source.values():
+            keep = retention_keep(snapshots, policy)
+            doomed.extend(snapshot for snapshot in snapshots if snapshot["name"] not in keep)
+        if dry_run or not doomed:
+            return doomed
+
+        backend = self.open_storage()
+        for snapshot in doomed:
+            if snapshot["kind"] == "chunked":
+                storage.LocalStorage(backup_dir).remove(snapshot["name"])
+            else:
+                backend.remove(snapshot["name"])
+        catalog.remove([snapshot["name"] for snapshot in doomed])
+        freed = sum(snapshot["size"] for snapshot in doomed)
+        self.log_message(f"Retention pruned {len(doomed)} snapshots ({freed / 1024 / 1024:.1f} MB)")
+        if self.settings["chunk_gc"] and any(snapshot["kind"] == "chunked" for snapshot in doomed):
+            removed, freed = ChunkStore(backup_dir).collect_garbage()
+            if removed:
+                self.log_message(f"Removed {removed} unreferenced chunks ({freed / 1024 / 1024:.1f} MB)")
+        return doomed
+
+    def perform_restore(self, backup_file, restore_dir, patterns=None, only=None):
+        # only, when given, is the set of paths to write (see plan_restore)
+        try:
+            if backup_file.endswith(INDEX_SUFFIX):
+                return self.restore_chunked(backup_file, restore_dir, patterns, only)
+            backend, snapshot_name = self.locate_snapshot(backup_file)
+            meta = backend.load_meta(snapshot_name)
+            if meta is None:
+                chain = [(snapshot_name, None)]
+                remaining = None
+            else:
+                # Point-in-time restore: newest archive in the chain wins for each path
+                chain = backend.load_chain(snapshot_name)
+                remaining = set(meta["files"]) if only is None else set(meta["files"]).intersection(only)
+                if patterns:
+                    remaining = {path for path in remaining if archive_index.path_selected(path, patterns)}
+                self.progress.reset(len(remaining),
+                                    sum(meta["files"][path][manifest.SIZE] for path in remaining), "Restoring")
+            for name, archive_meta in chain:
+                if (patterns or only is not None) and archive_meta and "index" in archive_meta:
+                    # Seek straight to the selected members instead of decompressing everything
+                    if not self.restore_indexed(backend, name, archive_meta["index"], remaining, restore_dir):
+                        return False
+                    continue
+                with backend.open_archive(name) as tar:
+                    # Iterate lazily: stream-only codecs and remote archives cannot seek back
+                    # for a second pass over the members
+                    if remaining is None:
+                        # No sidecar, so no totals to show until the single pass is done
+                        self.progress.reset(phase="Restoring")
+                        members = (member for member in tar
+                                   if (not patterns or archive_index.path_selected(member.name, patterns))
+                                   and (only is None or member.name in only))
+                    else:
+                        members = (member for member in tar if member.name in remaining)
+                    for member in members:
+                        if not self.wait_if_paused():
+                            return False
+                        tar.extract(member, path=restore_dir)
+                        if remaining is not None:
+                            remaining.discard(member.name)
+                        self.progress.advance(1, member.size)
+            self.log_message(f"Backup restored to: {restore_dir}")
+            return True
+        except Exception as e:
+            self.log_message(f"Error restoring backup: {str(e)}")
+            return False
+        finally:
+            self.progress.reset()
+
+    def run_batches(self, items, function):
+        # Splits items into one contiguous batch per restore worker, so each worker keeps
+        # reading forward through the archive; function returns False once stopped
+        if not items:
+            return True
+        workers = max(min(compression.worker_count(self.settings["restore_workers"]), len(items)), 1)
+        size = -(-len(items) // workers)
+        with ThreadPoolExecutor(workers) as pool:
+            return all(pool.map(function, [items[i:i + size] for i in range(0, len(items), size)]))
+
+    def restore_indexed(self, backend, archive_name, index, remaining, restore_dir):
+        codec = compression.archive_codec(archive_name)
+        members = index["members"]
+
+        def restore_batch(names):
+            # Remote archives answer every block read with a ranged GET, so the workers
+            # download in parallel
+            with backend.open_ranges(archive_name) as f:
+                for name in names:
+                    if not self.wait_if_paused():
+                        return False
+                    archive_index.extract_member(f, codec, index["blocks"], name, members[name], restore_dir)
+                    remaining.discard(name)
+                    self.progress.advance(1, members[name][archive_index.SIZE])
+            return True
+
+        return self.run_batches(sorted(remaining.intersection(members)), restore_batch)
+
+    def restore_chunked(self, backup_file, restore_dir, patterns=None, only=None):
+        store = ChunkStore(os.path.dirname(backup_file))
+        index = store.load_index(os.path.basename(backup_file))
+        files = index["files"]
+        if patterns:
+            files = {path: entry for path, entry in files.items() if archive_index.path_selected(path, patterns)}
+        if only is not None:
+            files = {path: entry for path, entry in files.items() if path in only}
+        self.progress.reset(len(files), sum(entry["size"] for entry in files.values()), "Restoring")
+
+        def restore_batch(rel_paths):
+            for rel_path in rel_paths:
+                if not self.wait_if_paused():
+                    return False
+                store.restore_file(files[rel_path], os.path.join(restore_dir, rel_path))
+                self.progress.advance(1, files[rel_path]["size"])
+            return True
+
+        if not self.run_batches(sorted(files), restore_batch):
+            return False
+        self.log_message(f"Backup restored to: {restore_dir}")
+        return True
+
+    def snapshot_files(self, backup_file):
+        # rel_path -> (size, mtime_ns, digest) as of the snapshot; digest is None when unknown
+        if backup_file.endswith(INDEX_SUFFIX):
+            index = ChunkStore(os.path.dirname(backup_file)).load_index(os.path.basename(backup_file))
+            return {path: (entry["size"], entry["mtime_ns"], entry["digest"])
+                    for path, entry in index["files"].items()}
+        backend, snapshot_name = self.locate_snapshot(backup_file)
+        meta = backend.load_meta(snapshot_name)
+        if meta is not None:
+            return {path: (record[manifest.SIZE], record[manifest.MTIME], record[manifest.DIGEST])
+                    for path, record in meta["files"].items()}
+        with backend.open_archive(snapshot_name) as tar:
+            return {member.name: (member.size, int(member.mtime * 10**9), None)
+                    for member in tar if not member.isdir()}
+
+    def plan_restore(self, backup_file, restore_dir, patterns=None, delete_extras=False, checksum=False):
+        # Compare the snapshot with restore_dir without writing anything. Size decides first,
+        # then mtime (to the second, as tar keeps it), then the recorded hash; checksum=True
+        # hashes even when size and mtime agree. Without it, an edit that keeps the size and
+        # lands in the same second as the snapshotted mtime is taken as unchanged.
+        expected = self.snapshot_files(backup_file)
+        if patterns:
+            expected = {path: record for path, record in expected.items()
+                        if archive_index.path_selected(path, patterns)}
+        plan = {"write": [], "touch": [], "delete": [], "unchanged": 0}
+        to_hash = []
+        for rel_path, (size, mtime_ns, digest) in sorted(expected.items()):
+            path = os.path.join(restore_dir, rel_path)
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                plan["write"].append(rel_path)
+                continue
+            same_mtime = st.st_mtime_ns // 10**9 == mtime_ns // 10**9
+            if stat.S_ISDIR(st.st_mode) or st.st_size != size:
+                plan["write"].append(rel_path)
+            elif stat.S_ISLNK(st.st_mode) and digest is not None:
+                # Restores do not set symlink times, so only the target counts
+                to_hash.append((rel_path, path, st, None, digest))
+            elif same_mtime and not checksum:
+                plan["unchanged"] += 1
+            elif digest is None:
+                plan["write"].append(rel_path)
+            else:
+                to_hash.append((rel_path, path, st, mtime_ns, digest))
+
+        self.progress.reset(len(to_hash), sum(item[2].st_size for item in to_hash), "Comparing")
+        digests = hashing.hash_files([(path, st) for rel_path, path, st, mtime_ns, digest in to_hash],
+                                     manifest.DIGEST_ALGORITHM)
+        for (rel_path, path, st, mtime_ns, digest), actual in zip(to_hash, digests):
+            if actual != digest:
+                plan["write"].append(rel_path)
+            elif mtime_ns is not None and st.st_mtime_ns // 10**9 != mtime_ns // 10**9:
+                # Same content, only the timestamp is off
+                plan["touch"].append([rel_path, mtime_ns])
+            else:
+                plan["unchanged"] += 1
+        self.progress.reset()
+
+        if delete_extras:
+            # Files the backup rules exclude were never in the snapshot, so they are left alone
+            rules = scan_rules.load_rules(restore_dir, self.settings)
+            plan["delete"] = sorted(rel_path for rel_path, path, st in scanner.iter_files(restore_dir, rules=rules)
+                                    if rel_path not in expected
+                                    and (not patterns or archive_index.path_selected(rel_path, patterns)))
+        plan["write"].sort()
+        return plan
+
+    def apply_restore_plan(self, backup_file, restore_dir, plan):
+        try:
+            for rel_path in plan["delete"]:
+                os.remove(os.path.join(restore_dir, rel_path))
+            for rel_path, mtime_ns in plan["touch"]:
+                os.utime(os.path.join(restore_dir, rel_path), ns=(mtime_ns, mtime_ns), follow_symlinks=False)
+        except OSError as e:
+            self.log_message(f"Error restoring backup: {str(e)}")
+            return False
+        self.log_message(f"Differential restore: {len(plan['write'])} to write, {len(plan['touch'])} timestamps, "
+                         f"{len(plan['delete'])} deleted, {plan['unchanged']} unchanged")
+        if not plan["write"]:
+            self.log_message(f"Backup restored to: {restore_dir}")
+            return True
+        return self.perform_restore(backup_file, restore_dir, only=set(plan["write"]))
+
+    def scrub_snapshots(self, force=False):
+        # Fully re-read every snapshot that is new, changed or not checked for a while, across
+        # a process pool that shares one read rate limit
+        backup_dir = self.backup_dir
+        catalog = self.open_catalog()
+        backend = self.open_storage()
+        workers = compression.worker_count(self.settings["scrub_workers"])
+        rate = self.settings["scrub_rate_mb"]
+        rate = rate * 1024 * 1024 / workers if rate else None
+        max_age = self.settings["scrub_max_age_days"] * 86400
+        previous = catalog.scrub_results()
+        counts = {scrub.OK: 0, scrub.CORRUPT: 0, scrub.MISSING: 0}
+        due = []
+        fresh = 0
+        for snapshot in catalog.snapshots():
+            name = snapshot["name"]
+            try:
+                st = (os.stat(os.path.join(backup_dir, name)) if name.endswith(INDEX_SUFFIX)
+                      else backend.stat(name))
+            except FileNotFoundError:
+                catalog.record_scrub(name, scrub.MISSING, "archive not found")
+                self.log_message(f"Scrub: {name} is missing")
+                counts[scrub.MISSING] += 1
+                continue
+            if force or scrub.is_stale(previous.get(name), st, max_age):
+                due.append((name, st))
+            else:
+                fresh += 1
+
+        self.progress.reset(len(due), sum(st.st_size for name, st in due), "Scrubbing")
+        # spawn rather than fork: the GUI and the CLI reporter both have threads running
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(scrub.verify_snapshot, self.settings, backup_dir, name, rate): (name, st)
+                       for name, st in due}
+            for future in as_completed(futures):
+                name, st = futures[future]
+                status, detail = future.result()
+                catalog.record_scrub(name, status, detail, st.st_size, st.st_mtime_ns)
+                counts[status] += 1
+                if status != scrub.OK:
+                    self.log_message(f"Scrub: {name} is {status}: {detail}")
+                self.progress.advance(1, st.st_size)
+                if not self.running:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        self.progress.reset()
+        self.log_message(f"Scrub finished: {counts[scrub.OK]} ok, {counts[scrub.CORRUPT]} corrupt, "
+                         f"{counts[scrub.MISSING]} missing, {fresh} checked recently")
+        return counts
+
+    def exclusion_report(self):
+        return scan_rules.exclusion_report(self.source_dir, scan_rules.load_rules(self.source_dir, self.settings))
+
+    def list_snapshots(self, source=None):
+        return [{key: snapshot[key] for key in ("name", "source", "kind", "created", "size")}
+                for snapshot in self.open_catalog().snapshots(source)]
+
+    def rebuild_catalog(self):
+        return Catalog(self.backup_dir).rebuild(self.settings["hash_algorithm"], self.open_storage())
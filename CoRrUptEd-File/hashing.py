@@ -0,0 +1,98 @@
+import os
+import stat
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+BUFFER_SIZE = 1024 * 1024
+local = threading.local()
+
+ALGORITHMS = {
+    "blake2b": hashlib.blake2b,
+    "sha256": hashlib.sha256,
+}
+if xxhash is not None:
+    ALGORITHMS["xxh64"] = xxhash.xxh64
+    ALGORITHMS["xxh3_128"] = xxhash.xxh3_128
+
+def new_hasher(algorithm):
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Hash algorithm {algorithm} is not available")
+    return ALGORITHMS[algorithm]()
+
+def thread_buffer():
+    # One read buffer per thread, reused for every file that thread hashes
+    if not hasattr(local, "buffer"):
+        local.buffer = bytearray(BUFFER_SIZE)
+    return local.buffer
+
+def hash_file(path, algorithm="sha256", st=None, buffer=None, throttle=None):
+    # Reads through one reused buffer, so memory stays flat whatever the file size.
+    # throttle, when given, has consume(nbytes) called for every read.
+    hasher = new_hasher(algorithm)
+    if st is None:
+        st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode):
+        hasher.update(os.readlink(path).encode())
+        return hasher.hexdigest()
+    if not stat.S_ISREG(st.st_mode):
+        # Opening a FIFO would block forever, and sockets and devices have no content to hash
+        raise ValueError(f"Cannot hash {path}: not a regular file or symlink")
+    if buffer is None:
+        buffer = thread_buffer()
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            if throttle is not None:
+                throttle.consume(count)
+            hasher.update(view[:count])
+    return hasher.hexdigest()
+
+def hash_files(items, algorithm="sha256", workers=0, throttle=None):
+    # items are (path, st) pairs; hashlib drops the GIL on large updates, so threads overlap
+    # both the reads and the digest work. Returns the digests in the same order.
+    items = list(items)
+    workers = min(workers or os.cpu_count() or 1, len(items))
+    if workers <= 1:
+        return [hash_file(path, algorithm, st, throttle=throttle) for path, st in items]
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(lambda item: hash_file(item[0], algorithm, item[1], throttle=throttle), items))
+
+class HashingReader:
+    # Digests whatever is read through it, e.g. a member's data as tarfile copies it in
+    def __init__(self, fileobj, algorithm="sha256"):
+        self.fileobj = fileobj
+        self.hasher = new_hasher(algorithm)
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+class HashingWriter:
+    # File wrapper that digests everything written through it, so a finished archive
+    # never has to be read back just to hash it
+    def __init__(self, fileobj, algorithm="sha256"):
+        self.fileobj = fileobj
+        self.hasher = new_hasher(algorithm)
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import manifest
+from engine import BackupEngine, DUPLICATE
+
+JOBS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.json")
+
+JOB_DEFAULTS = {
+    "priority": 0,  # higher runs first when several jobs are due
+    "interval_seconds": 3600,
+    "enabled": True,
+    "settings": {},  # per-job overrides, e.g. snapshot_mode, compression_codec, retention
+}
+EMPTY_STATE = {"status": "never run", "last_run": None, "duration": None, "bytes": 0,
+               "throughput": None, "next_run": 0}
+
+def load_jobs(path=JOBS_FILE):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    jobs = []
+    for job in data["jobs"]:
+        job = {**JOB_DEFAULTS, **job}
+        job["state"] = {**EMPTY_STATE, **job.get("state", {})}
+        if job["state"]["status"] == "running":
+            # The app went away mid-run; run it again on the first pass
+            job["state"]["status"] = "interrupted"
+            job["state"]["next_run"] = 0
+        jobs.append(job)
+    return jobs
+
+def save_jobs(jobs, path=JOBS_FILE):
+    manifest.save_json(path, {"jobs": jobs})
+
+def disk_of(path):
+    # Whole-disk name for path on Linux (sda for sda1, nvme0n1 for nvme0n1p2), else the device number
+    try:
+        dev = os.stat(path).st_dev
+    except OSError:
+        return None
+    sys_path = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+    if os.path.exists(sys_path):
+        real_path = os.path.realpath(sys_path)
+        if os.path.exists(os.path.join(real_path, "partition")):
+            real_path = os.path.dirname(real_path)
+        return os.path.basename(real_path)
+    return dev
+
+class JobScheduler:
+    # Runs due jobs on a bounded pool, highest priority first, never two on the same disk
+    def __init__(self, settings, jobs_file=JOBS_FILE, log=None):
+        self.settings = settings
+        self.jobs_file = jobs_file
+        self.jobs = load_jobs(jobs_file)
+        self.log = log or print
+        self.workers = max(settings["job_workers"], 1)
+        self.lock = threading.Lock()
+        self.active = {}  # job name -> (engine, disks)
+        self.running = False
+        self.wake = threading.Event()
+
+    def save(self):
+        with self.lock:
+            save_jobs(self.jobs, self.jobs_file)
+
+    def find(self, name):
+        for job in self.jobs:
+            if job["name"] == name:
+                return job
+        return None
+
+    def add_job(self, name, source, dest, **options):
+        if self.find(name):
+            raise ValueError(f"Job {name} already exists")
+        job = {**JOB_DEFAULTS, "name": name, "source": source, "dest": dest, **options,
+               "state": dict(EMPTY_STATE)}
+        with self.lock:
+            self.jobs.append(job)
+        self.save()
+        return job
+
+    def remove_job(self, name):
+        job = self.find(name)
+        if job is None or name in self.active:
+            return False
+        with self.lock:
+            self.jobs.remove(job)
+        self.save()
+        return True
+
+    def job_rows(self):
+        # One row per job for the GUI and CLI tables, with live progress for running jobs
+        rows = []
+        for job in self.jobs:
+            state = job["state"]
+            row = {
+                "name": job["name"],
+                "source": job["source"],
+                "dest": job["dest"],
+                "priority": job["priority"],
+                "enabled": job["enabled"],
+                "status": state["status"],
+                "last_run": state["last_run"],
+                "duration": state["duration"],
+                "mb_per_s": round(state["throughput"] / 1024 / 1024, 2) if state["throughput"] else None,
+                "next_run": datetime.datetime.fromtimestamp(state["next_run"]).isoformat(timespec="seconds")
+                if state["next_run"] else "now",
+            }
+            active = self.active.get(job["name"])
+            if active:
+                progress = active[0].progress.read()
+                row["progress"] = f"{progress['phase']} {progress['files']}/{progress['total_files']}"
+            rows.append(row)
+        return rows
+
+    def job_disks(self, job):
+        return {disk for disk in (disk_of(job["source"]), disk_of(job["dest"])) if disk is not None}
+
+    def due_jobs(self, now):
+        due = [job for job in self.jobs
+               if job["enabled"] and job["name"] not in self.active and job["state"]["next_run"] <= now]
+        due.sort(key=lambda job: (-job["priority"], job["state"]["next_run"]))
+        return due
+
+    def start_due_jobs(self, pool):
+        with self.lock:
+            busy = set().union(*(disks for engine, disks in self.active.values()))
+            for job in self.due_jobs(time.time()):
+                if len(self.active) >= self.workers:
+                    break
+                disks = self.job_disks(job)
+                if disks & busy:
+                    # Another job is using that disk; this one waits for the next pass
+                    continue
+                engine = BackupEngine(job["source"], job["dest"], {**self.settings, **job["settings"]})
+                engine.log_message = lambda message, name=job["name"]: self.log(f"[{name}] {message}")
+                engine.running = True
+                self.active[job["name"]] = (engine, disks)
+                busy |= disks
+                job["state"]["status"] = "running"
+                pool.submit(self.run_job, job, engine)
+
+    def run_job(self, job, engine):
+        state = job["state"]
+        started = time.time()
+        self.save()
+        try:
+            if engine.settings["throttle_nice"] is not None:
+                # Without CAP_SYS_NICE a lowered nice value cannot be raised back, so such a job
+                # runs on a thread of its own and the pool worker keeps its priority for the next
+                result = []
+                thread = threading.Thread(target=lambda: result.append(engine.create_snapshot()))
+                thread.start()
+                thread.join()
+                ok = result[0] if result else False
+            else:
+                ok = engine.create_snapshot()
+        except Exception as e:
+            self.log(f"[{job['name']}] Error running job: {str(e)}")
+            ok = False
+        duration = max(time.time() - started, 1e-6)
+        nbytes = engine.last_stats["bytes"] if engine.last_stats else 0
+        with self.lock:
+            # A duplicate is a successful run that had nothing new to keep
+            state.update(status=DUPLICATE if ok == DUPLICATE else "ok" if ok else "failed",
+                         last_run=datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+                         duration=round(duration, 3), bytes=nbytes, throughput=nbytes / duration,
+                         next_run=started + job["interval_seconds"])
+            del self.active[job["name"]]
+        self.save()
+        # A finished job may free a disk another due job is waiting for
+        self.wake.set()
+
+    def run(self, once=False):
+        # once: run everything that is due now, wait for it, then return
+        self.running = True
+        with ThreadPoolExecutor(self.workers) as pool:
+            while self.running:
+                self.start_due_jobs(pool)
+                if once and not self.active and not self.due_jobs(time.time()):
+                    break
+                self.wake.wait(1)
+                self.wake.clear()
+        self.running = False
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        with self.lock:
+            for engine, disks in self.active.values():
+                engine.running = False
@@ -0,0 +1,185 @@
+import os
+import json
+import stat
+import hashlib
+import scanner
+import hashing
+
+# Manifest records are [size, mtime_ns, inode, digest]
+SIZE, MTIME, INODE, DIGEST = range(4)
+
+def manifest_path(backup_dir, source_name):
+    return os.path.join(backup_dir, f"{source_name}.manifest.json")
+
+def meta_path(snapshot_path):
+    return snapshot_path + ".meta.json"
+
+def empty_manifest():
+    return {"files": {}, "fingerprint": None, "last_snapshot": None, "since_full": 0,
+            "totals": {"files": 0, "bytes": 0}}
+
+def load_manifest(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return empty_manifest()
+
+def save_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def save_manifest(path, manifest):
+    save_json(path, manifest)
+
+def load_snapshot_meta(snapshot_path):
+    try:
+        with open(meta_path(snapshot_path), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_snapshot_meta(snapshot_path, meta):
+    save_json(meta_path(snapshot_path), meta)
+
+# Manifest digests stay SHA-256 so existing manifests and chunk indexes keep matching
+DIGEST_ALGORITHM = "sha256"
+
+def hash_file(path, st=None):
+    return hashing.hash_file(path, DIGEST_ALGORITHM, st)
+
+def is_archivable(st):
+    # Regular files and symlinks. Reading a FIFO blocks until something writes to it, and
+    # sockets and device nodes cannot be backed up as data, so those are left out.
+    return stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode)
+
+def scan_file(source_dir, rel_path, previous_files, st=None, path=None, pending=None):
+    # With pending given, files that need hashing are queued there instead of hashed inline
+    file_path = path or os.path.join(source_dir, rel_path)
+    if st is None:
+        st = os.lstat(file_path)
+    record = [st.st_size, st.st_mtime_ns, st.st_ino, None]
+    previous = previous_files.get(rel_path)
+    if previous and previous[:DIGEST] == record[:DIGEST]:
+        record[DIGEST] = previous[DIGEST]
+    elif pending is not None:
+        pending.append((record, file_path, st))
+    else:
+        record[DIGEST] = hash_file(file_path, st)
+    return record
+
+def hash_pending(pending, throttle=None):
+    digests = hashing.hash_files([(path, st) for record, path, st in pending], DIGEST_ALGORITHM,
+                                 throttle=throttle)
+    for (record, path, st), digest in zip(pending, digests):
+        record[DIGEST] = digest
+
+def scan_dir(source_dir, top, previous_files, files, stats=None, progress=None, pending=None, rules=None,
+             skipped=None):
+    for rel_path, path, st in scanner.iter_files(top, source_dir, rules):
+        if not is_archivable(st):
+            if skipped is not None:
+                skipped.append(rel_path)
+            continue
+        files[rel_path] = scan_file(source_dir, rel_path, previous_files, st, path, pending)
+        if stats is not None:
+            stats[rel_path] = st
+        if progress and len(files) % 1000 == 0:
+            progress(len(files))
+
+def scan_tree(source_dir, previous_files, dirty=None, stats=None, progress=None, rules=None, throttle=None,
+              skipped=None):
+    # stats, when given, collects the lstat of every file visited so archiving can reuse it,
+    # rules leave excluded files out and skipped collects the special files left out. Changed
+    # files are hashed together on a thread pool once the walk is done.
+    files = {}
+    pending = []
+    if dirty is None:
+        scan_dir(source_dir, source_dir, previous_files, files, stats, progress, pending, rules, skipped)
+        hash_pending(pending, throttle)
+        return files
+
+    # Only revisit the paths a watcher reported; everything else keeps its manifest record
+    files.update(previous_files)
+    dirty_dirs = set()
+    for rel_path in dirty:
+        path = os.path.join(source_dir, rel_path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            dirty_dirs.add(rel_path)
+        elif os.path.lexists(path):
+            st = os.lstat(path)
+            if rules and rules.path_rule(rel_path, st):
+                files.pop(rel_path, None)
+                continue
+            if not is_archivable(st):
+                files.pop(rel_path, None)
+                if skipped is not None:
+                    skipped.append(rel_path)
+                continue
+            files[rel_path] = scan_file(source_dir, rel_path, previous_files, st, path, pending)
+            if stats is not None:
+                stats[rel_path] = st
+        else:
+            # Gone, and possibly a directory that had files under it
+            files.pop(rel_path, None)
+            dirty_dirs.add(rel_path)
+    if dirty_dirs:
+        for rel_path in list(files):
+            parent = os.path.dirname(rel_path)
+            while parent:
+                if parent in dirty_dirs:
+                    del files[rel_path]
+                    break
+                parent = os.path.dirname(parent)
+        for rel_path in dirty_dirs:
+            path = os.path.join(source_dir, rel_path)
+            if os.path.isdir(path) and not (rules and rules.path_rule(rel_path, os.lstat(path))):
+                scan_dir(source_dir, path, previous_files, files, stats, pending=pending, rules=rules,
+                         skipped=skipped)
+    hash_pending(pending, throttle)
+    return files
+
+def tree_totals(files):
+    return {"files": len(files), "bytes": sum(record[SIZE] for record in files.values())}
+
+def tree_fingerprint(files):
+    # Merkle hash: every directory hashes the sorted names and digests of its children
+    tree = {}
+    for rel_path, record in files.items():
+        parts = rel_path.split(os.sep)
+        node = tree
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = record[DIGEST]
+
+    def node_digest(node):
+        hasher = hashlib.sha256()
+        for name in sorted(node):
+            child = node[name]
+            child_digest = node_digest(child) if isinstance(child, dict) else child
+            hasher.update(f"{name}\0{child_digest}\n".encode())
+        return hasher.hexdigest()
+
+    return node_digest(tree)
+
+def diff_files(old_files, new_files):
+    changed = sorted(path for path, record in new_files.items()
+                     if path not in old_files or old_files[path][DIGEST] != record[DIGEST])
+    deleted = sorted(path for path in old_files if path not in new_files)
+    return changed, deleted
+
+def load_chain(backup_dir, snapshot_name):
+    # Walk parents back to the last full (or synthetic full) snapshot, newest first
+    chain = []
+    name = snapshot_name
+    while name:
+        meta = load_snapshot_meta(os.path.join(backup_dir, name))
+        if meta is None:
+            raise FileNotFoundError(f"Missing snapshot metadata for {name}")
+        chain.append((name, meta))
+        if meta["kind"] != "incremental":
+            break
+        name = meta["parent"]
+    return chain
@@ -0,0 +1,82 @@
+import time
+import queue
+import datetime
+import threading
+
+class ProgressChannel:
+    # Workers bump counters and queue log lines; the UI samples both at its own frame rate,
+    # so the hot loop never waits on the display.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = queue.SimpleQueue()
+        self.reset()
+
+    def reset(self, total_files=0, total_bytes=0, phase=""):
+        with self.lock:
+            self.files = 0
+            self.bytes = 0
+            self.total_files = total_files
+            self.total_bytes = total_bytes
+            self.phase = phase
+            self.started = time.monotonic()
+
+    def set_totals(self, total_files, total_bytes=0):
+        with self.lock:
+            self.total_files = total_files
+            self.total_bytes = total_bytes
+
+    def advance(self, files=1, nbytes=0):
+        with self.lock:
+            self.files += files
+            self.bytes += nbytes
+
+    def set_count(self, files, nbytes=0):
+        with self.lock:
+            self.files = files
+            self.bytes = nbytes
+
+    def log(self, message):
+        self.messages.put(("log", {"time": str(datetime.datetime.now()), "message": message}))
+
+    def call(self, function, *args):
+        # Run function on the UI thread at the next drain
+        self.messages.put(("call", (function, args)))
+
+    def drain(self):
+        while True:
+            try:
+                yield self.messages.get_nowait()
+            except queue.Empty:
+                return
+
+    def read(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            state = {
+                "phase": self.phase,
+                "files": self.files,
+                "total_files": self.total_files,
+                "bytes": self.bytes,
+                "total_bytes": self.total_bytes,
+                "elapsed": elapsed,
+                "files_per_s": self.files / elapsed,
+                "mb_per_s": self.bytes / 1024 / 1024 / elapsed,
+            }
+        if self.total_bytes and self.bytes:
+            state["eta"] = max(self.total_bytes - self.bytes, 0) / (self.bytes / elapsed)
+        elif self.total_files and self.files:
+            state["eta"] = max(self.total_files - self.files, 0) / (self.files / elapsed)
+        else:
+            state["eta"] = None
+        return state
+
+def format_progress(state):
+    if not state["phase"]:
+        return ""
+    # The total is an estimate during a scan and the count can pass it
+    text = f"{state['phase']}: {state['files']}/{max(state['files'], state['total_files'])} files"
+    if state["bytes"]:
+        text += f", {state['mb_per_s']:.1f} MB/s"
+    if state["eta"] is not None:
+        text += f", ETA {datetime.timedelta(seconds=int(state['eta']))}"
+    return text
@@ -0,0 +1,174 @@
+import os
+import re
+import stat
+import mimetypes
+import scanner
+
+IGNORE_FILE = ".backupignore"
+
+def translate(pattern):
+    # gitignore glob -> regex: * and ? stop at "/", ** crosses directories
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+def parse_rule(line):
+    # Returns (text, negate, dir_only, regex) or None for blanks and comments
+    text = line.rstrip("\n").rstrip()
+    if not text or text.startswith("#"):
+        return None
+    pattern = text
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    if "/" in pattern:
+        # A slash anywhere but the end ties the pattern to the source root
+        regex = translate(pattern.lstrip("/"))
+    else:
+        regex = "(?:.*/)?" + translate(pattern)
+    return text, negate, dir_only, regex
+
+class ScanRules:
+    # gitignore semantics: the last matching rule wins and "!" re-includes. Every rule is also
+    # folded into one alternation so the common no-match case costs a single regex call.
+    def __init__(self, lines=(), max_file_size=None, exclude_types=()):
+        self.rules = [rule for rule in map(parse_rule, lines) if rule]
+        self.max_file_size = max_file_size
+        self.exclude_types = set(exclude_types)
+        self.dir_rules = [(text, negate, re.compile(regex)) for text, negate, dir_only, regex in self.rules]
+        self.file_rules = [(text, negate, re.compile(regex)) for text, negate, dir_only, regex in self.rules
+                           if not dir_only]
+        self.dir_filter = self.combine(self.rules)
+        self.file_filter = self.combine(rule for rule in self.rules if not rule[2])
+
+    def combine(self, rules):
+        regexes = [regex for text, negate, dir_only, regex in rules]
+        return re.compile("|".join(f"(?:{regex})" for regex in regexes)) if regexes else None
+
+    def __bool__(self):
+        return bool(self.rules or self.max_file_size or self.exclude_types)
+
+    def match(self, rel_path, rules, combined):
+        if combined is None or not combined.fullmatch(rel_path):
+            return None
+        for text, negate, regex in reversed(rules):
+            if regex.fullmatch(rel_path):
+                return None if negate else text
+        return None
+
+    def dir_rule(self, rel_path):
+        return self.match(rel_path.replace(os.sep, "/"), self.dir_rules, self.dir_filter)
+
+    def file_rule(self, rel_path, st=None):
+        # Name of the rule that drops this file, or None to keep it
+        rule = self.match(rel_path.replace(os.sep, "/"), self.file_rules, self.file_filter)
+        if rule or st is None:
+            return rule
+        if self.max_file_size and stat.S_ISREG(st.st_mode) and st.st_size > self.max_file_size:
+            return f"larger than {self.max_file_size} bytes"
+        if self.exclude_types:
+            file_type = self.file_type(rel_path, st)
+            if file_type in self.exclude_types:
+                return f"type {file_type}"
+        return None
+
+    def file_type(self, rel_path, st):
+        if stat.S_ISLNK(st.st_mode):
+            return "symlink"
+        if stat.S_ISFIFO(st.st_mode):
+            return "fifo"
+        mime_type, _ = mimetypes.guess_type(rel_path, strict=False)
+        return mime_type.split("/")[0] if mime_type else None
+
+    def path_rule(self, rel_path, st=None):
+        # For single paths from a watcher: a file inside an excluded directory is excluded too
+        parent = os.path.dirname(rel_path)
+        parents = []
+        while parent:
+            parents.append(parent)
+            parent = os.path.dirname(parent)
+        for parent in reversed(parents):
+            rule = self.dir_rule(parent)
+            if rule:
+                return rule
+        if st is not None and stat.S_ISDIR(st.st_mode):
+            return self.dir_rule(rel_path)
+        return self.file_rule(rel_path, st)
+
+def load_rules(source_dir, settings):
+    # Settings rules come first so the source's own .backupignore can override them
+    lines = list(settings["exclude_rules"])
+    try:
+        with open(os.path.join(source_dir, IGNORE_FILE), "r") as f:
+            lines.extend(f)
+    except FileNotFoundError:
+        pass
+    return ScanRules(lines, settings["max_file_size"], settings["exclude_types"])
+
+def exclusion_report(source_dir, rules):
+    # Dry run: walks everything, including excluded directories, and charges each skipped
+    # file to the rule that skipped it
+    saved = {}
+    kept = {"files": 0, "bytes": 0}
+    stack = [os.path.normpath(source_dir)]
+    prefix_len = len(os.path.join(os.path.normpath(source_dir), ""))
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = entry.path[prefix_len:]
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    rule = rules.dir_rule(rel_path)
+                    if rule is None:
+                        stack.append(entry.path)
+                        continue
+                    totals = saved.setdefault(rule, {"files": 0, "bytes": 0})
+                    for _, _, st in scanner.iter_files(entry.path):
+                        totals["files"] += 1
+                        totals["bytes"] += st.st_size
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            rule = rules.file_rule(rel_path, st)
+            totals = kept if rule is None else saved.setdefault(rule, {"files": 0, "bytes": 0})
+            totals["files"] += 1
+            totals["bytes"] += st.st_size
+    report = [{"rule": rule, **totals} for rule, totals in saved.items()]
+    report.sort(key=lambda entry: entry["bytes"], reverse=True)
+    return report, kept
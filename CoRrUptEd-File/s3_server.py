@@ -0,0 +1,181 @@
+import os
+import uuid
+import shutil
+import hashlib
+import argparse
+import datetime
+import email.utils
+import urllib.parse
+from xml.sax.saxutils import escape
+from xml.etree import ElementTree
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Minimal S3-compatible object store for trying the s3 storage backend without a cloud
+# account: path-style PUT/GET (with Range)/HEAD/DELETE, ListObjectsV2 and multipart uploads,
+# kept as plain files under one directory. Signatures are not checked.
+#
+#   python s3_server.py /tmp/objects --port 9000
+#   settings.json: "storage": {"type": "s3", "endpoint": "http://127.0.0.1:9000", "bucket": "backups"}
+
+UPLOAD_DIR = ".uploads"
+
+class ObjectStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def parse(self):
+        url = urllib.parse.urlsplit(self.path)
+        bucket, _, key = urllib.parse.unquote(url.path).lstrip("/").partition("/")
+        self.query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        self.bucket_dir = os.path.join(self.server.root, bucket)
+        self.key = key
+        self.object_path = os.path.join(self.bucket_dir, key)
+        if ".." in key.split("/"):
+            self.reply(400)
+            return False
+        return True
+
+    def body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def reply(self, status, data=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def object_headers(self, st):
+        return {"Last-Modified": email.utils.formatdate(st.st_mtime, usegmt=True),
+                "ETag": f'"{st.st_size:x}-{st.st_mtime_ns:x}"'}
+
+    def do_HEAD(self):
+        if not self.parse():
+            return
+        try:
+            st = os.stat(self.object_path)
+        except FileNotFoundError:
+            self.reply(404)
+            return
+        self.send_response(200)
+        for name, value in self.object_headers(st).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(st.st_size))
+        self.end_headers()
+
+    def do_GET(self):
+        if not self.parse():
+            return
+        if not self.key:
+            self.list_objects()
+            return
+        try:
+            f = open(self.object_path, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            self.reply(404)
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            headers = self.object_headers(st)
+            status = 200
+            start, end = 0, st.st_size - 1
+            if "Range" in self.headers:
+                first, _, last = self.headers["Range"].removeprefix("bytes=").partition("-")
+                start, end = int(first), min(int(last), st.st_size - 1) if last else st.st_size - 1
+                headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+                status = 206
+            f.seek(start)
+            self.reply(status, f.read(max(end - start + 1, 0)), headers)
+
+    def list_objects(self):
+        prefix = self.query.get("prefix", "")
+        contents = []
+        for dirpath, dirnames, filenames in os.walk(self.bucket_dir):
+            dirnames[:] = [name for name in dirnames if name != UPLOAD_DIR]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, self.bucket_dir).replace(os.sep, "/")
+                if not key.startswith(prefix):
+                    continue
+                st = os.stat(path)
+                modified = datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc)
+                contents.append(f"<Contents><Key>{escape(key)}</Key><Size>{st.st_size}</Size>"
+                                f"<LastModified>{modified.isoformat(timespec='milliseconds')}</LastModified>"
+                                f"</Contents>")
+        self.reply(200, (f'<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                         f"<IsTruncated>false</IsTruncated>{''.join(sorted(contents))}"
+                         f"</ListBucketResult>").encode())
+
+    def do_PUT(self):
+        if not self.parse():
+            return
+        data = self.body()
+        if "uploadId" in self.query:
+            path = os.path.join(self.bucket_dir, UPLOAD_DIR, self.query["uploadId"], self.query["partNumber"])
+            if not os.path.isdir(os.path.dirname(path)):
+                self.reply(404)
+                return
+        else:
+            path = self.object_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.reply(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+    def do_POST(self):
+        if not self.parse():
+            return
+        data = self.body()
+        if "uploads" in self.query:
+            upload_id = uuid.uuid4().hex
+            os.makedirs(os.path.join(self.bucket_dir, UPLOAD_DIR, upload_id))
+            self.reply(200, f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId>"
+                            f"</InitiateMultipartUploadResult>".encode())
+            return
+        upload_dir = os.path.join(self.bucket_dir, UPLOAD_DIR, self.query.get("uploadId", ""))
+        if "uploadId" not in self.query or not os.path.isdir(upload_dir):
+            self.reply(404)
+            return
+        numbers = [element.text for element in ElementTree.fromstring(data).iter()
+                   if element.tag.rpartition("}")[2] == "PartNumber"]
+        os.makedirs(os.path.dirname(self.object_path), exist_ok=True)
+        with open(self.object_path + ".tmp", "wb") as out:
+            for number in numbers:
+                with open(os.path.join(upload_dir, number), "rb") as part:
+                    shutil.copyfileobj(part, out)
+        os.replace(self.object_path + ".tmp", self.object_path)
+        shutil.rmtree(upload_dir)
+        self.reply(200, f"<CompleteMultipartUploadResult><Key>{escape(self.key)}</Key>"
+                        f"</CompleteMultipartUploadResult>".encode())
+
+    def do_DELETE(self):
+        if not self.parse():
+            return
+        if "uploadId" in self.query:
+            shutil.rmtree(os.path.join(self.bucket_dir, UPLOAD_DIR, self.query["uploadId"]), ignore_errors=True)
+        else:
+            try:
+                os.remove(self.object_path)
+            except FileNotFoundError:
+                pass
+        self.reply(204)
+
+def serve(root, host="127.0.0.1", port=9000):
+    server = ThreadingHTTPServer((host, port), ObjectStoreHandler)
+    server.root = root
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for an S3-compatible object store")
+    parser.add_argument("root")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    os.makedirs(args.root, exist_ok=True)
+    print(f"Serving {args.root} on http://{args.host}:{args.port}")
+    serve(args.root, args.host, args.port).serve_forever()
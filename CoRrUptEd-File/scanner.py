@@ -0,0 +1,84 @@
+import os
+import stat
+import tarfile
+
+try:
+    import pwd
+    import grp
+except ImportError:
+    pwd = grp = None
+
+_user_names = {}
+_group_names = {}
+
+def iter_files(top, base=None, rules=None):
+    # One pass over the tree with os.scandir. Yields (rel_path, path, lstat result) for every
+    # non-directory; the DirEntry caches its stat, so nothing downstream has to stat again.
+    # Directories the rules exclude are never opened.
+    top = os.path.normpath(top)
+    base = top if base is None else os.path.normpath(base)
+    prefix_len = len(os.path.join(base, ""))
+    stack = [top]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not rules or not rules.dir_rule(entry.path[prefix_len:]):
+                        stack.append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            rel_path = entry.path[prefix_len:]
+            if rules and rules.file_rule(rel_path, st):
+                continue
+            yield rel_path, entry.path, st
+
+def count_files(top):
+    return sum(1 for _ in iter_files(top))
+
+def user_name(uid):
+    if uid not in _user_names:
+        try:
+            _user_names[uid] = pwd.getpwuid(uid).pw_name if pwd else ""
+        except KeyError:
+            _user_names[uid] = ""
+    return _user_names[uid]
+
+def group_name(gid):
+    if gid not in _group_names:
+        try:
+            _group_names[gid] = grp.getgrgid(gid).gr_name if grp else ""
+        except KeyError:
+            _group_names[gid] = ""
+    return _group_names[gid]
+
+def tarinfo_from_stat(path, arcname, st=None):
+    # Same fields tar.gettarinfo fills in, from a stat we already have. Hard links are
+    # stored as regular files so every member of an incremental archive stands alone.
+    if st is None:
+        st = os.lstat(path)
+    tarinfo = tarfile.TarInfo(arcname.replace(os.sep, "/").lstrip("/"))
+    tarinfo.mode = stat.S_IMODE(st.st_mode)
+    tarinfo.uid = st.st_uid
+    tarinfo.gid = st.st_gid
+    tarinfo.uname = user_name(st.st_uid)
+    tarinfo.gname = group_name(st.st_gid)
+    tarinfo.mtime = st.st_mtime
+    if stat.S_ISREG(st.st_mode):
+        tarinfo.type = tarfile.REGTYPE
+        tarinfo.size = st.st_size
+    elif stat.S_ISLNK(st.st_mode):
+        tarinfo.type = tarfile.SYMTYPE
+        tarinfo.linkname = os.readlink(path)
+    elif stat.S_ISFIFO(st.st_mode):
+        tarinfo.type = tarfile.FIFOTYPE
+    else:
+        return None
+    return tarinfo
@@ -0,0 +1,84 @@
+import os
+import time
+import tarfile
+import hashing
+import compression
+import archive_index
+import storage
+from throttle import TokenBucket, ThrottledReader
+from chunkstore import ChunkStore, INDEX_SUFFIX
+
+OK, CORRUPT, MISSING = "ok", "corrupt", "missing"
+READ_SIZE = 1024 * 1024
+
+def is_stale(previous, st, max_age):
+    # previous is the stored (status, detail, checked, size, mtime_ns) row, if any
+    if previous is None:
+        return True
+    status, detail, checked, size, mtime_ns = previous
+    # A damaged archive stays due until it verifies, so every scrub reports it
+    if status != OK:
+        return True
+    return size != st.st_size or mtime_ns != st.st_mtime_ns or time.time() - checked > max_age
+
+def verify_snapshot(settings, backup_dir, name, rate=None):
+    # Entry point for the worker processes; returns (status, detail)
+    bucket = TokenBucket(rate)
+    try:
+        if name.endswith(INDEX_SUFFIX):
+            path = os.path.join(backup_dir, name)
+            if not os.path.exists(path):
+                return MISSING, "archive not found"
+            return verify_chunked(path, bucket)
+        backend = storage.open_storage(settings, backup_dir)
+        if not backend.exists(name):
+            return MISSING, "archive not found"
+        return verify_archive(backend, name, bucket)
+    except Exception as e:
+        # Damaged archives fail in codec-specific ways; all of them mean the same here
+        return CORRUPT, f"{type(e).__name__}: {e}"
+
+def verify_archive(backend, name, bucket):
+    # Decompress the whole stream and check every member against the checksum recorded
+    # when it was written
+    meta = backend.load_meta(name)
+    expected = meta["index"]["members"] if meta and "index" in meta else {}
+    codec = compression.archive_codec(name)
+    seen = 0
+    with backend.open_read(name) as f:
+        reader = codec.open_reader(ThrottledReader(f, bucket))
+        tar = tarfile.open(fileobj=reader, mode="r|")
+        for member in tar:
+            seen += 1
+            entry = expected.pop(member.name, None)
+            if not member.isreg():
+                continue
+            hasher = hashing.new_hasher(archive_index.CHECKSUM_ALGORITHM)
+            data = tar.extractfile(member)
+            for piece in iter(lambda: data.read(READ_SIZE), b""):
+                hasher.update(piece)
+            checksum = entry[archive_index.CHECKSUM] if entry and len(entry) > archive_index.CHECKSUM else None
+            if checksum and hasher.hexdigest() != checksum:
+                return CORRUPT, f"checksum mismatch for {member.name}"
+        # tarfile stops at the first bad header; read on so the codec checks the rest of the stream
+        while reader.read(READ_SIZE):
+            pass
+    if expected:
+        return CORRUPT, f"{len(expected)} indexed members missing from the archive"
+    return OK, f"{seen} members verified"
+
+def verify_chunked(path, bucket):
+    store = ChunkStore(os.path.dirname(path))
+    index = store.load_index(os.path.basename(path))
+    checked = set()
+    for rel_path, entry in index["files"].items():
+        for digest in entry.get("chunks", ()):
+            if digest in checked:
+                continue
+            if not os.path.exists(store.chunk_path(digest)):
+                return CORRUPT, f"chunk {digest} of {rel_path} is missing"
+            bucket.consume(os.path.getsize(store.chunk_path(digest)))
+            # get_chunk raises if the content no longer hashes to its name
+            store.get_chunk(digest)
+            checked.add(digest)
+    return OK, f"{len(checked)} chunks verified"
@@ -0,0 +1,47 @@
+import os
+import json
+
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")
+
+DEFAULT_SETTINGS = {
+    "snapshot_mode": "full",  # full, incremental or chunked
+    "synthetic_full_every": 24,  # incrementals between synthetic fulls, 0 to disable
+    "trigger": "hourly",  # hourly, or watch to snapshot shortly after changes
+    "interval_seconds": 3600,  # time between snapshots for the hourly trigger
+    "watch_quiet_seconds": 30,  # snapshot once writes have been quiet this long
+    "watch_max_changes": 1000,  # ...or as soon as this many paths are dirty
+    "watch_poll_seconds": 60,  # polling interval when inotify is unavailable
+    "exclude_rules": [],  # gitignore-style lines, applied before the source's .backupignore
+    "max_file_size": None,  # skip files larger than this many bytes
+    "exclude_types": [],  # symlink, fifo, or a MIME major type such as video or image
+    "throttle_read_mb": None,  # cap snapshot reads at this many MB/s
+    "throttle_nice": None,  # e.g. 10 to run snapshots at a lower CPU priority
+    "throttle_ioprio": None,  # "idle", or "best-effort:<0-7>" with 7 the lowest (Linux)
+    "throttle_max_load": None,  # pause reading while the 1-minute load per core is above this
+    "throttle_backoff_seconds": 5,  # how long each load backoff pause lasts
+    "compression_codec": "gzip",  # gzip, bz2, xz, store, zstd or lz4
+    "compression_level": None,  # None uses the codec's default level
+    "compression_workers": 0,  # 0 uses every core
+    "hash_algorithm": "sha256",  # archive digests: sha256, blake2b (faster without SHA CPU extensions), xxh64/xxh3_128
+    "storage": None,  # None keeps archives in the backup directory; {"type": "s3", "endpoint", "bucket", "prefix"}
+    "storage_part_mb": 8,  # multipart upload and ranged download part size for remote storage
+    "storage_workers": 4,  # parts uploaded or downloaded at once per archive
+    "job_workers": 2,  # backup jobs the scheduler runs at once
+    "restore_workers": 4,  # threads extracting files during a restore, 0 uses every core
+    "restore_delete_extras": False,  # differential restores delete files the snapshot does not have
+    "scrub_workers": 2,  # processes verifying archives at once, 0 uses every core
+    "scrub_rate_mb": 50,  # total read rate for scrubs in MB/s, None for no limit
+    "scrub_max_age_days": 30,  # re-verify archives last checked longer ago than this
+    "chunk_gc": True,  # sweep unreferenced chunks after each chunked snapshot
+    "ui_refresh_ms": 100,  # how often the window picks up progress and log lines
+    "retention": None,  # e.g. {"hourly": 24, "daily": 7, "weekly": 4, "monthly": 12}; None keeps everything
+}
+
+def load_settings(path=SETTINGS_FILE):
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(path, "r") as f:
+            settings.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    return settings
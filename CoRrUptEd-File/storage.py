@@ -0,0 +1,440 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import tarfile
+import datetime
+import threading
+import contextlib
+import collections
+import http.client
+import urllib.parse
+import email.utils
+from xml.etree import ElementTree
+from concurrent.futures import ThreadPoolExecutor
+import manifest
+import compression
+
+# Metadata sidecars, the manifest and the catalog always stay in the local backup directory;
+# a storage backend only decides where the archives (and a copy of their sidecars) live.
+# Chunked snapshots are always kept locally.
+
+ObjectStat = collections.namedtuple("ObjectStat", "st_size st_mtime_ns")
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 rejects smaller parts, except the last one
+
+class Storage:
+    remote = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def exists(self, name):
+        try:
+            self.stat(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @contextlib.contextmanager
+    def open_archive(self, name):
+        # Stream read, which every codec supports
+        codec = compression.archive_codec(name) or compression.CODECS["gzip"]
+        with self.open_read(name) as f, tarfile.open(fileobj=codec.open_reader(f), mode="r|") as tar:
+            yield tar
+
+    def load_meta(self, name):
+        return manifest.load_snapshot_meta(os.path.join(self.root, name))
+
+    def load_chain(self, name):
+        # load_meta caches remote sidecars locally, after which the chain reads as usual
+        start = name
+        while name:
+            meta = self.load_meta(name)
+            if meta is None or meta["kind"] != "incremental":
+                break
+            name = meta["parent"]
+        return manifest.load_chain(self.root, start)
+
+class LocalStorage(Storage):
+    # Archives as plain files in the backup directory
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def create(self, name):
+        return LocalUpload(self.path(name))
+
+    def open_read(self, name):
+        return open(self.path(name), "rb")
+
+    def open_ranges(self, name):
+        return open(self.path(name), "rb")
+
+    def open_archive(self, name):
+        # Codecs tarfile understands can seek, so stay on the random access path
+        return compression.open_archive(self.path(name))
+
+    def stat(self, name):
+        return os.stat(self.path(name))
+
+    def list(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_file():
+                st = entry.stat()
+                entries.append((entry.name, st.st_size, st.st_mtime_ns))
+        return entries
+
+    def save_meta(self, name, meta):
+        manifest.save_snapshot_meta(self.path(name), meta)
+
+    def remove(self, name):
+        for path in (self.path(name), manifest.meta_path(self.path(name))):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class LocalUpload:
+    # The archive file being written; aborting removes it, so a stopped or failed snapshot
+    # never leaves a truncated archive behind that looks like a finished one
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def quote(value):
+    return urllib.parse.quote(str(value), safe="-_.~")
+
+def strip_namespaces(root):
+    for element in root.iter():
+        element.tag = element.tag.rpartition("}")[2]
+    return root
+
+class S3Storage(Storage):
+    # Any S3-compatible object store, addressed path-style (http://host/bucket/key), so a
+    # local stand-in such as s3_server.py or MinIO works as well as a cloud bucket
+    remote = True
+
+    def __init__(self, root, endpoint, bucket, prefix="", region="us-east-1", access_key=None, secret_key=None,
+                 part_size=8 * 1024 * 1024, workers=4):
+        super().__init__(root)
+        url = urllib.parse.urlsplit(endpoint)
+        self.host = url.netloc
+        self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.workers = max(workers, 1)
+        # One keep-alive connection per thread
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, "conn", None) is None:
+            self.local.conn = self.connection_class(self.host, timeout=60)
+        return self.local.conn
+
+    def sign(self, method, path, query_string, headers, payload_hash):
+        # AWS Signature Version 4
+        amz_date = headers["x-amz-date"]
+        day = amz_date[:8]
+        signed_headers = ";".join(sorted(headers))
+        canonical_request = "\n".join([method, path, query_string,
+                                       "".join(f"{key}:{headers[key]}\n" for key in sorted(headers)),
+                                       signed_headers, payload_hash])
+        scope = f"{day}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode()).hexdigest()])
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (day, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                f"SignedHeaders={signed_headers}, Signature={signature}")
+
+    def request(self, method, key="", query=None, headers=None, body=b""):
+        path = "/" + self.bucket + ("/" + urllib.parse.quote(key, safe="/-_.~") if key else "")
+        query_string = "&".join(f"{quote(name)}={quote(value)}" for name, value in sorted((query or {}).items()))
+        payload_hash = hashlib.sha256(body).hexdigest()
+        headers = {name.lower(): str(value) for name, value in (headers or {}).items()}
+        headers.update({"host": self.host, "x-amz-content-sha256": payload_hash,
+                        "x-amz-date": datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")})
+        if self.access_key and self.secret_key:
+            headers["authorization"] = self.sign(method, path, query_string, headers, payload_hash)
+        url = path + ("?" + query_string if query_string else "")
+        for attempt in range(3):
+            conn = self.connection()
+            try:
+                conn.request(method, url, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+            if response.status < 500 or attempt == 2:
+                break
+            time.sleep(2 ** attempt)
+        if response.status == 404:
+            raise FileNotFoundError(f"{key or self.bucket} not found in bucket {self.bucket}")
+        if response.status >= 300:
+            raise OSError(f"{method} {key or self.bucket} failed: {response.status} {response.reason} "
+                          f"{data[:200].decode(errors='replace')}")
+        return response, data
+
+    def key(self, name):
+        return self.prefix + name
+
+    def stat(self, name):
+        response, data = self.request("HEAD", self.key(name))
+        modified = email.utils.parsedate_to_datetime(response.getheader("Last-Modified"))
+        return ObjectStat(int(response.getheader("Content-Length")), int(modified.timestamp()) * 10**9)
+
+    def list(self):
+        entries = []
+        token = None
+        while True:
+            query = {"list-type": 2, "prefix": self.prefix}
+            if token:
+                query["continuation-token"] = token
+            response, data = self.request("GET", query=query)
+            root = strip_namespaces(ElementTree.fromstring(data))
+            for item in root.findall("Contents"):
+                modified = datetime.datetime.fromisoformat(item.findtext("LastModified"))
+                entries.append((item.findtext("Key")[len(self.prefix):], int(item.findtext("Size")),
+                                int(modified.timestamp()) * 10**9))
+            token = root.findtext("NextContinuationToken")
+            if root.findtext("IsTruncated") != "true" or not token:
+                return entries
+
+    def put_bytes(self, name, data):
+        self.request("PUT", self.key(name), body=data)
+
+    def get_range(self, key, offset, size):
+        response, data = self.request("GET", key, headers={"Range": f"bytes={offset}-{offset + size - 1}"})
+        return data
+
+    def create(self, name):
+        return MultipartUpload(self, self.key(name))
+
+    def open_read(self, name):
+        return RangePrefetcher(self, self.key(name), self.stat(name).st_size)
+
+    def open_ranges(self, name):
+        return RangeReader(self, self.key(name))
+
+    def save_meta(self, name, meta):
+        # Local copy for this machine, remote copy so the bucket can be restored from on its own
+        manifest.save_snapshot_meta(os.path.join(self.root, name), meta)
+        self.put_bytes(os.path.basename(manifest.meta_path(name)), json.dumps(meta).encode())
+
+    def load_meta(self, name):
+        meta = super().load_meta(name)
+        if meta is None:
+            try:
+                response, data = self.request("GET", self.key(os.path.basename(manifest.meta_path(name))))
+            except FileNotFoundError:
+                return None
+            meta = json.loads(data)
+            manifest.save_snapshot_meta(os.path.join(self.root, name), meta)
+        return meta
+
+    def remove(self, name):
+        for key in (self.key(name), self.key(os.path.basename(manifest.meta_path(name)))):
+            self.request("DELETE", key)
+        try:
+            os.remove(manifest.meta_path(os.path.join(self.root, name)))
+        except FileNotFoundError:
+            pass
+
+class MultipartUpload:
+    # Uploads each part on a thread pool as soon as it fills, so the archive streams to the
+    # bucket while it is still being written; an archive smaller than one part is a single PUT
+    def __init__(self, storage, key):
+        self.storage = storage
+        self.key = key
+        self.executor = ThreadPoolExecutor(max_workers=storage.workers)
+        self.buffer = bytearray()
+        self.pending = collections.deque()
+        self.parts = []
+        self.upload_id = None
+        self.closed = False
+
+    def upload_part(self, number, data):
+        response, body = self.storage.request("PUT", self.key, {"partNumber": number, "uploadId": self.upload_id},
+                                              body=data)
+        return response.getheader("ETag")
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.storage.part_size:
+            self.submit(bytes(self.buffer[:self.storage.part_size]))
+            del self.buffer[:self.storage.part_size]
+        return len(data)
+
+    def submit(self, data):
+        if self.upload_id is None:
+            response, body = self.storage.request("POST", self.key, {"uploads": ""})
+            self.upload_id = strip_namespaces(ElementTree.fromstring(body)).findtext("UploadId")
+        number = len(self.parts) + len(self.pending) + 1
+        self.pending.append((number, self.executor.submit(self.upload_part, number, data)))
+        # Bound memory to a couple of parts per worker
+        while len(self.pending) > self.storage.workers * 2:
+            self.finish_next()
+
+    def finish_next(self):
+        number, future = self.pending.popleft()
+        self.parts.append((number, future.result()))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.upload_id is None:
+                self.storage.request("PUT", self.key, body=bytes(self.buffer))
+                return
+            if self.buffer:
+                self.submit(bytes(self.buffer))
+            while self.pending:
+                self.finish_next()
+            parts = "".join(f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                            for number, etag in self.parts)
+            body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode()
+            response, data = self.storage.request("POST", self.key, {"uploadId": self.upload_id}, body=body)
+            # Completion can fail after the 200 status has been sent
+            if b"<Error>" in data:
+                raise OSError(f"Completing the upload of {self.key} failed: {data[:200].decode(errors='replace')}")
+        finally:
+            self.buffer.clear()
+            self.executor.shutdown()
+
+    def abort(self):
+        self.closed = True
+        self.executor.shutdown(cancel_futures=True)
+        if self.upload_id is not None:
+            self.storage.request("DELETE", self.key, {"uploadId": self.upload_id})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class RangePrefetcher:
+    # Sequential reader that keeps the next few parts downloading in parallel with ranged GETs
+    def __init__(self, storage, key, size):
+        self.storage = storage
+        self.key = key
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=storage.workers)
+        self.pending = collections.deque()
+        self.next_offset = 0
+        self.current = b""
+        self.offset = 0
+        self.fill()
+
+    def fill(self):
+        while len(self.pending) < self.storage.workers * 2 and self.next_offset < self.size:
+            length = min(self.storage.part_size, self.size - self.next_offset)
+            self.pending.append(self.executor.submit(self.storage.get_range, self.key, self.next_offset, length))
+            self.next_offset += length
+
+    def read(self, size=-1):
+        out = bytearray()
+        while size < 0 or len(out) < size:
+            if self.offset == len(self.current):
+                if not self.pending:
+                    break
+                self.current = self.pending.popleft().result()
+                self.offset = 0
+                self.fill()
+            end = len(self.current) if size < 0 else min(len(self.current), self.offset + size - len(out))
+            out += self.current[self.offset:end]
+            self.offset = end
+        return bytes(out)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class RangeReader:
+    # Seekable reader for indexed restores: every read is one ranged GET
+    def __init__(self, storage, key):
+        self.storage = storage
+        self.key = key
+        self.position = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = offset if whence == os.SEEK_SET else self.position + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size):
+        data = self.storage.get_range(self.key, self.position, size) if size else b""
+        self.position += len(data)
+        return data
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def open_storage(settings, backup_dir):
+    config = settings["storage"]
+    if not config:
+        return LocalStorage(backup_dir)
+    if config.get("type", "s3") != "s3":
+        raise ValueError(f"Storage type '{config['type']}' is not available")
+    return S3Storage(backup_dir, config["endpoint"], config["bucket"], config.get("prefix", ""),
+                     config.get("region", "us-east-1"),
+                     config.get("access_key") or os.environ.get("AWS_ACCESS_KEY_ID"),
+                     config.get("secret_key") or os.environ.get("AWS_SECRET_ACCESS_KEY"),
+                     settings["storage_part_mb"] * 1024 * 1024, settings["storage_workers"])
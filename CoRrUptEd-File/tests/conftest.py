@@ -0,0 +1,53 @@
+import os
+import sys
+import datetime
+import pytest
+
+# The modules import each other by bare name, as they do when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from settings import DEFAULT_SETTINGS
+
+class Clock(datetime.datetime):
+    # Snapshot names carry the time to the second; every now() is one second later
+    current = datetime.datetime(2024, 1, 1, 12, 0, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.current += datetime.timedelta(seconds=1)
+        return cls.current
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine.datetime, "datetime", Clock)
+    source_dir = tmp_path / "source"
+    backup_dir = tmp_path / "backup"
+    source_dir.mkdir()
+    backup_dir.mkdir()
+
+    def make(**settings):
+        backup = engine.BackupEngine(str(source_dir), str(backup_dir),
+                                     dict(DEFAULT_SETTINGS, compression_workers=1, **settings))
+        backup.running = True
+        backup.messages = []
+        backup.log_message = backup.messages.append
+        return backup
+
+    return make
+
+def write_tree(root, files):
+    for rel_path, data in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+def read_tree(root):
+    tree = {}
+    for directory, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
@@ -0,0 +1,34 @@
+import bench_engine
+from conftest import read_tree
+
+def results(*rows):
+    return {"results": [{"profile": profile, "phase": phase, "seconds": seconds, "peak_rss_mb": rss}
+                        for profile, phase, seconds, rss in rows]}
+
+def test_find_regressions():
+    baseline = results(("tiny", "snapshot", 1.0, 100), ("tiny", "restore", 2.0, 100),
+                       ("tiny", "duplicate", 0.01, 50), ("logs", "snapshot", 1.0, None))
+    current = results(("tiny", "snapshot", 1.05, 100), ("tiny", "restore", 2.5, 130),
+                      ("tiny", "duplicate", 0.04, 50), ("logs", "snapshot", 1.0, 900),
+                      ("huge", "snapshot", 9.0, 900))
+    # Within the threshold, under min_seconds in both runs, no baseline RSS or no baseline row
+    # at all: none of those count
+    assert bench_engine.find_regressions(baseline, current) == [
+        ("tiny", "restore", "seconds", 2.0, 2.5),
+        ("tiny", "restore", "peak_rss_mb", 100, 130),
+    ]
+    assert bench_engine.find_regressions(baseline, current, threshold=0.3) == []
+    assert bench_engine.find_regressions(baseline, current, threshold=0.01, min_seconds=0.01) == [
+        ("tiny", "snapshot", "seconds", 1.0, 1.05),
+        ("tiny", "restore", "seconds", 2.0, 2.5),
+        ("tiny", "restore", "peak_rss_mb", 100, 130),
+        ("tiny", "duplicate", "seconds", 0.01, 0.04),
+    ]
+
+def test_make_tree_is_reproducible(tmp_path):
+    bench_engine.make_tree(tmp_path / "a", "deep", scale=0.05, seed=3)
+    bench_engine.make_tree(tmp_path / "b", "deep", scale=0.05, seed=3)
+    bench_engine.make_tree(tmp_path / "c", "deep", scale=0.05, seed=4)
+    assert len(read_tree(tmp_path / "a")) == 80
+    assert read_tree(tmp_path / "a") == read_tree(tmp_path / "b")
+    assert read_tree(tmp_path / "a") != read_tree(tmp_path / "c")
@@ -0,0 +1,65 @@
+import io
+import os
+import random
+import pytest
+import chunkstore
+from chunkstore import ChunkStore, MIN_CHUNK, MAX_CHUNK, find_cut_python, iter_chunks
+from conftest import write_tree, read_tree
+
+def random_bytes(size, seed=0):
+    return random.Random(seed).randbytes(size)
+
+@pytest.mark.skipif(chunkstore.numpy is None, reason="needs NumPy")
+@pytest.mark.parametrize("size", [0, 100, MIN_CHUNK, MIN_CHUNK + 1, MIN_CHUNK + 70, 3 * 1024 * 1024, 6 * 1024 * 1024])
+def test_numpy_cuts_match_python(size):
+    buf = random_bytes(size, size)
+    assert chunkstore.find_cut_numpy(buf) == find_cut_python(buf)
+
+@pytest.mark.skipif(chunkstore.numpy is None, reason="needs NumPy")
+def test_numpy_cuts_match_python_without_boundary():
+    buf = b"\0" * (MAX_CHUNK + 10)
+    assert chunkstore.find_cut_numpy(buf) == find_cut_python(buf) == MAX_CHUNK
+
+def test_chunks_respect_size_limits_and_rejoin():
+    data = random_bytes(12 * 1024 * 1024)
+    chunks = list(iter_chunks(io.BytesIO(data)))
+    assert b"".join(chunks) == data
+    assert all(MIN_CHUNK < len(chunk) <= MAX_CHUNK for chunk in chunks[:-1])
+
+def test_boundaries_follow_content_after_an_insert():
+    data = random_bytes(12 * 1024 * 1024)
+    before = set(iter_chunks(io.BytesIO(data)))
+    after = list(iter_chunks(io.BytesIO(b"inserted at the front" + data)))
+    # Only the chunks up to the first content-defined cut change
+    assert sum(chunk in before for chunk in after) >= len(after) - 2
+
+def test_store_deduplicates_and_restores(tmp_path):
+    data = random_bytes(5 * 1024 * 1024)
+    write_tree(tmp_path / "source", {"a.bin": data, "b.bin": data})
+    store = ChunkStore(str(tmp_path / "backup"))
+    entry, written = store.store_file(str(tmp_path / "source" / "a.bin"))
+    assert written > 0
+    same, written = store.store_file(str(tmp_path / "source" / "b.bin"))
+    assert written == 0
+    assert same == entry
+    entry.update(mode=0o644, mtime_ns=0)
+    store.restore_file(entry, str(tmp_path / "restore" / "a.bin"))
+    assert read_tree(tmp_path / "restore") == {"a.bin": data}
+
+def test_chunked_snapshots_share_chunks(make_engine, tmp_path):
+    source = tmp_path / "source"
+    write_tree(source, {"big.bin": random_bytes(3 * 1024 * 1024), "small.txt": b"small"})
+    backup = make_engine(snapshot_mode="chunked")
+    assert backup.create_snapshot(), backup.messages
+    chunk_dir = tmp_path / "backup" / chunkstore.CHUNK_DIR
+    count = sum(len(files) for _, _, files in os.walk(chunk_dir))
+
+    write_tree(source, {"small.txt": b"small, changed"})
+    assert backup.create_snapshot(), backup.messages
+    # Only the changed small file adds a chunk; the big one is reused
+    assert sum(len(files) for _, _, files in os.walk(chunk_dir)) == count + 1
+
+    names = sorted(snapshot["name"] for snapshot in backup.list_snapshots())
+    target = tmp_path / "restore"
+    assert backup.perform_restore(os.path.join(backup.backup_dir, names[-1]), str(target)), backup.messages
+    assert read_tree(target) == read_tree(source)
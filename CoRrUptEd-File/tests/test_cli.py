@@ -0,0 +1,49 @@
+import os
+import json
+import pytest
+import engine
+import corrupt_cli
+from conftest import Clock, write_tree, read_tree
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(engine.datetime, "datetime", Clock)
+    with open(tmp_path / "settings.json", "w") as f:
+        json.dump({"compression_workers": 1}, f)
+
+    def run(*argv):
+        status = corrupt_cli.main(["--settings", str(tmp_path / "settings.json"), "--progress-interval", "60",
+                                   *argv])
+        return status, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    return run
+
+def test_snapshot_list_and_restore(cli, tmp_path):
+    tree = {"a.txt": b"alpha", "sub/b.txt": b"beta"}
+    write_tree(tmp_path / "source", tree)
+    (tmp_path / "backup").mkdir()
+    status, events = cli("snapshot", "--source", str(tmp_path / "source"), "--dest", str(tmp_path / "backup"))
+    assert status == 0
+    assert events[-1]["event"] == "done" and events[-1]["command"] == "snapshot" and events[-1]["status"] == 0
+    assert any(event["event"] == "log" and event["message"].startswith("Snapshot created") for event in events)
+
+    status, events = cli("list", "--dest", str(tmp_path / "backup"))
+    [listed] = [event for event in events if event["event"] == "snapshot"]
+    assert listed["source"] == "source" and listed["kind"] == "full"
+
+    target = tmp_path / "restored"
+    status, events = cli("restore", os.path.join(str(tmp_path / "backup"), listed["name"]), str(target))
+    assert status == 0
+    assert read_tree(target) == {os.path.join(*path.split("/")): data for path, data in tree.items()}
+
+def test_failures_exit_non_zero(cli, tmp_path):
+    status, events = cli("restore", str(tmp_path / "missing.tar.gz"), str(tmp_path / "target"))
+    assert status == 1
+    (tmp_path / "backup").mkdir()
+    status, events = cli("prune", "--dest", str(tmp_path / "backup"))
+    assert status == 1 and events[0] == {"event": "error",
+                                         "message": "no retention policy in settings or on the command line"}
+
+def test_unknown_command_is_rejected(cli):
+    with pytest.raises(SystemExit):
+        cli("frobnicate")
@@ -0,0 +1,41 @@
+import io
+import os
+import random
+import pytest
+import compression
+
+def compress(data, codec, workers, block_size=4096):
+    out = io.BytesIO()
+    rng = random.Random(len(data))
+    with compression.ParallelCompressor(out, codec, workers=workers, block_size=block_size) as compressor:
+        position = 0
+        # Uneven writes, so blocks are cut across write boundaries
+        while position < len(data):
+            size = rng.randint(1, 3 * block_size)
+            compressor.write(data[position:position + size])
+            position += size
+    return out.getvalue(), compressor.blocks
+
+@pytest.mark.parametrize("name", sorted(compression.CODECS))
+def test_members_come_back_in_order(name):
+    codec = compression.get_codec(name)
+    data = b"".join(os.urandom(300) + bytes(700) for _ in range(100))
+    stream, blocks = compress(data, codec, workers=4)
+    # One stream however many workers compressed it
+    assert codec.open_reader(io.BytesIO(stream)).read() == data
+    assert compress(data, codec, workers=1)[0] == stream
+    # Every block decompresses on its own at the recorded offsets
+    assert [offset for offset, start, size in blocks] == list(range(0, len(data), 4096))
+    for offset, start, size in blocks:
+        assert codec.decompress(stream[start:start + size]) == data[offset:offset + 4096]
+    assert blocks[-1][1] + blocks[-1][2] == len(stream)
+
+def test_empty_stream():
+    stream, blocks = compress(b"", compression.get_codec("gzip"), workers=2)
+    assert stream == b"" and blocks == []
+
+def test_archive_codec_from_name():
+    assert compression.archive_codec("src_2024-01-01T12-00-00.tar.gz").name == "gzip"
+    assert compression.archive_codec("src_2024-01-01T12-00-00.incr.tar.xz").name == "xz"
+    assert compression.archive_codec("src_2024-01-01T12-00-00.tar").name == "store"
+    assert compression.archive_codec("src.manifest.json") is None
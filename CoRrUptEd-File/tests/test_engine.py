@@ -0,0 +1,220 @@
+import os
+import pytest
+from conftest import write_tree, read_tree
+
+def restore(backup, tmp_path, name):
+    target = tmp_path / f"restore-{name}"
+    assert backup.perform_restore(os.path.join(backup.backup_dir, name), str(target)), backup.messages
+    return read_tree(target / "source") if (target / "source").exists() else read_tree(target)
+
+def snapshot(backup):
+    before = {snapshot["name"] for snapshot in backup.list_snapshots()}
+    assert backup.create_snapshot(), backup.messages
+    new = [snapshot for snapshot in backup.list_snapshots() if snapshot["name"] not in before]
+    assert len(new) == 1
+    return new[0]
+
+def test_full_snapshot_round_trip(make_engine, tmp_path):
+    tree = {"a.txt": b"alpha" * 1000, "sub/b.bin": os.urandom(50000), "empty": b""}
+    write_tree(tmp_path / "source", tree)
+    backup = make_engine()
+    first = snapshot(backup)
+    assert first["kind"] == "full"
+    assert restore(backup, tmp_path, first["name"]) == tree
+
+def test_unchanged_source_is_skipped(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha"})
+    backup = make_engine()
+    snapshot(backup)
+    assert backup.create_snapshot()
+    assert len(backup.list_snapshots()) == 1
+
+def test_incremental_chain_restores_each_point_in_time(make_engine, tmp_path):
+    source = tmp_path / "source"
+    states = []
+    write_tree(source, {"a.txt": b"one", "b.txt": b"two", "dir/c.txt": b"three"})
+    backup = make_engine(snapshot_mode="incremental", synthetic_full_every=0)
+    names = [snapshot(backup)["name"]]
+    states.append(read_tree(source))
+
+    write_tree(source, {"a.txt": b"one, changed", "d.txt": b"four"})
+    names.append(snapshot(backup)["name"])
+    states.append(read_tree(source))
+
+    os.remove(source / "b.txt")
+    write_tree(source, {"dir/c.txt": b"three, changed"})
+    last = snapshot(backup)
+    names.append(last["name"])
+    states.append(read_tree(source))
+
+    assert last["kind"] == "incremental"
+    assert ".incr." in last["name"]
+    for name, state in zip(names, states):
+        assert restore(backup, tmp_path, name) == state
+
+def test_synthetic_full_matches_the_chain(make_engine, tmp_path):
+    source = tmp_path / "source"
+    write_tree(source, {"a.txt": b"one", "b.txt": b"two"})
+    backup = make_engine(snapshot_mode="incremental", synthetic_full_every=2)
+    snapshot(backup)
+    write_tree(source, {"b.txt": b"two, changed"})
+    assert snapshot(backup)["kind"] == "incremental"
+    write_tree(source, {"c.txt": b"three"})
+    synthetic = snapshot(backup)
+    # Stands alone: full kind and no .incr. archive
+    assert synthetic["kind"] == "full"
+    assert ".incr." not in synthetic["name"]
+    assert restore(backup, tmp_path, synthetic["name"]) == read_tree(source)
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs FIFOs")
+def test_snapshot_skips_fifo_in_source(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha"})
+    os.mkfifo(tmp_path / "source" / "pipe")
+    backup = make_engine()
+    first = snapshot(backup)
+    assert any(message.startswith("Skipped 1 special files") for message in backup.messages)
+    assert restore(backup, tmp_path, first["name"]) == {"a.txt": b"alpha"}
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_restore_without_sidecar(make_engine, tmp_path, monkeypatch, stream):
+    import storage
+    import manifest
+    tree = {"a.txt": b"alpha", "dir/b.txt": b"beta", "dir/c.txt": b"gamma"}
+    write_tree(tmp_path / "source", tree)
+    backup = make_engine()
+    name = snapshot(backup)["name"]
+    os.remove(manifest.meta_path(os.path.join(backup.backup_dir, name)))
+    if stream:
+        # The stream-only reader zstd, lz4 and remote archives go through
+        monkeypatch.setattr(storage.LocalStorage, "open_archive", storage.Storage.open_archive)
+    assert restore(backup, tmp_path, name) == tree
+    target = tmp_path / "selected"
+    assert backup.perform_restore(os.path.join(backup.backup_dir, name), str(target), patterns=["dir/b.txt"]), \
+        backup.messages
+    assert read_tree(target) == {os.path.join("dir", "b.txt"): b"beta"}
+
+def stop_after_first_file(backup, monkeypatch):
+    import archive_index
+    add_path_indexed = archive_index.add_path_indexed
+
+    def add_then_stop(*args):
+        add_path_indexed(*args)
+        backup.running = False
+
+    monkeypatch.setattr(archive_index, "add_path_indexed", add_then_stop)
+
+def test_stopped_snapshot_leaves_no_archive(make_engine, tmp_path, monkeypatch):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha", "b.txt": b"beta"})
+    backup = make_engine()
+    stop_after_first_file(backup, monkeypatch)
+    assert not backup.create_snapshot()
+    assert any("Snapshot stopped" in message for message in backup.messages)
+    assert not [name for name in os.listdir(backup.backup_dir) if ".tar" in name]
+    assert backup.list_snapshots() == []
+
+def test_stopped_snapshot_aborts_multipart_upload(make_engine, tmp_path, monkeypatch):
+    import threading
+    import s3_server
+    server = s3_server.serve(str(tmp_path / "s3"), port=0)
+    (tmp_path / "s3" / "backups").mkdir(parents=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # Big enough that parts are uploaded before the stop
+        write_tree(tmp_path / "source", {"a.bin": os.urandom(6 * 1024 * 1024), "b.txt": b"beta"})
+        backup = make_engine(storage={"type": "s3", "endpoint": f"http://127.0.0.1:{server.server_port}",
+                                      "bucket": "backups"}, storage_part_mb=5, compression_level=1)
+        stop_after_first_file(backup, monkeypatch)
+        assert not backup.create_snapshot()
+        assert read_tree(tmp_path / "s3" / "backups") == {}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_first_snapshot_does_not_rebuild_the_catalog(make_engine, tmp_path, monkeypatch):
+    import catalog
+    hashed = []
+    hash_files = catalog.hashing.hash_files
+
+    def record_archives(items, *args, **kwargs):
+        items = list(items)
+        hashed.extend(os.path.basename(path) for path, st in items if ".tar" in path)
+        return hash_files(items, *args, **kwargs)
+
+    monkeypatch.setattr(catalog.hashing, "hash_files", record_archives)
+    write_tree(tmp_path / "source", {"a.txt": b"alpha"})
+    backup = make_engine()
+    # Not through snapshot(), whose listing would create the catalog first
+    assert backup.create_snapshot(), backup.messages
+    first = backup.list_snapshots()[0]
+    assert hashed == []
+    assert not any(message.startswith("Catalog rebuilt") for message in backup.messages)
+
+    # A lost catalog is rebuilt from the archives that are there, digests included
+    os.remove(os.path.join(backup.backup_dir, catalog.CATALOG_FILE))
+    write_tree(tmp_path / "source", {"b.txt": b"beta"})
+    second = snapshot(backup)
+    assert hashed == [first["name"]]
+    assert "Catalog rebuilt from 1 existing snapshots" in backup.messages
+    assert [snapshot["name"] for snapshot in backup.list_snapshots()] == [first["name"], second["name"]]
+
+def test_selective_restore_seeks_through_the_index(make_engine, tmp_path, monkeypatch):
+    import storage
+    # Incompressible files over several 1 MB compression blocks
+    tree = {f"dir{i % 3}/file{i:02}.bin": os.urandom(300 * 1024) for i in range(24)}
+    tree["notes.txt"] = b"small"
+    write_tree(tmp_path / "source", tree)
+    backup = make_engine(compression_level=1)
+    name = snapshot(backup)["name"]
+    blocks = len(backup.open_storage().load_meta(name)["index"]["blocks"])
+    seeks = set()
+    open_ranges = storage.LocalStorage.open_ranges
+
+    def recording_open_ranges(self, archive_name):
+        f = open_ranges(self, archive_name)
+        real_seek = f.seek
+        f.seek = lambda offset, *args: seeks.add(offset) or real_seek(offset, *args)
+        return f
+
+    monkeypatch.setattr(storage.LocalStorage, "open_ranges", recording_open_ranges)
+    # Decompressing the whole archive would go through here
+    monkeypatch.setattr(storage.LocalStorage, "open_archive", None)
+    target = tmp_path / "selected"
+    assert backup.perform_restore(os.path.join(backup.backup_dir, name), str(target),
+                                  patterns=["dir1/file10.bin", "notes.txt"]), backup.messages
+    assert read_tree(target) == {os.path.join("dir1", "file10.bin"): tree["dir1/file10.bin"],
+                                 "notes.txt": b"small"}
+    # At most two blocks for the large file and one for the small one
+    assert blocks >= 7 and len(seeks) <= 3
+
+def test_restore_plan(make_engine, tmp_path):
+    source = tmp_path / "source"
+    write_tree(source, {"same.txt": b"same", "edited.txt": b"original", "touched.txt": b"touched",
+                        "resized.txt": b"short", "gone.txt": b"gone", "sub/quick.txt": b"before"})
+    backup = make_engine()
+    backup_file = os.path.join(backup.backup_dir, snapshot(backup)["name"])
+    target = tmp_path / "target"
+    assert backup.perform_restore(backup_file, str(target))
+
+    write_tree(target, {"edited.txt": b"ORIGINAL", "resized.txt": b"much longer", "extra.txt": b"x"})
+    for name in ("edited.txt", "touched.txt"):
+        st = os.stat(source / name)
+        # Content and timestamp off, or only the timestamp
+        os.utime(target / name, ns=(st.st_atime_ns, st.st_mtime_ns + 3 * 10 ** 9))
+    os.remove(target / "gone.txt")
+    # Same size, same second as the snapshot: only a checksum run notices
+    st = os.stat(target / "sub" / "quick.txt")
+    write_tree(target, {"sub/quick.txt": b"after!"})
+    os.utime(target / "sub" / "quick.txt", ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    plan = backup.plan_restore(backup_file, str(target), delete_extras=True)
+    assert plan["write"] == ["edited.txt", "gone.txt", "resized.txt"]
+    assert [rel_path for rel_path, mtime_ns in plan["touch"]] == ["touched.txt"]
+    assert plan["delete"] == ["extra.txt"]
+    assert plan["unchanged"] == 2
+    plan = backup.plan_restore(backup_file, str(target), delete_extras=True, checksum=True)
+    assert plan["write"] == ["edited.txt", "gone.txt", "resized.txt", os.path.join("sub", "quick.txt")]
+
+    assert backup.apply_restore_plan(backup_file, str(target), plan), backup.messages
+    assert read_tree(target) == read_tree(source)
+    assert backup.plan_restore(backup_file, str(target), delete_extras=True, checksum=True) == \
+        {"write": [], "touch": [], "delete": [], "unchanged": 6}
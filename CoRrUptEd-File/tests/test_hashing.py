@@ -0,0 +1,63 @@
+import io
+import os
+import hashlib
+import tracemalloc
+import pytest
+import hashing
+
+class Counter:
+    def __init__(self):
+        self.total = 0
+
+    def consume(self, amount):
+        self.total += amount
+
+def test_hash_file_matches_hashlib(tmp_path):
+    data = os.urandom(3 * hashing.BUFFER_SIZE + 123)
+    (tmp_path / "big").write_bytes(data)
+    (tmp_path / "empty").write_bytes(b"")
+    os.symlink("big", tmp_path / "link")
+    counter = Counter()
+    assert hashing.hash_file(str(tmp_path / "big"), throttle=counter) == hashlib.sha256(data).hexdigest()
+    assert counter.total == len(data)
+    assert hashing.hash_file(str(tmp_path / "empty"), "blake2b") == hashlib.blake2b(b"").hexdigest()
+    # A symlink hashes as its target path, not the file behind it
+    assert hashing.hash_file(str(tmp_path / "link")) == hashlib.sha256(b"big").hexdigest()
+    with pytest.raises(ValueError):
+        hashing.new_hasher("md4")
+
+def test_memory_stays_flat_for_large_files(tmp_path):
+    path = tmp_path / "big"
+    with open(path, "wb") as f:
+        for _ in range(32):
+            f.write(os.urandom(hashing.BUFFER_SIZE))
+    hashing.hash_file(str(path))  # allocate this thread's buffer first
+    tracemalloc.start()
+    try:
+        hashing.hash_file(str(path))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < hashing.BUFFER_SIZE // 4
+
+def test_hash_files_keeps_order(tmp_path):
+    items = []
+    for i in range(20):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(bytes([i]) * (i * 1000))
+        items.append((str(path), None))
+    expected = [hashlib.sha256(bytes([i]) * (i * 1000)).hexdigest() for i in range(20)]
+    assert hashing.hash_files(items, workers=4) == expected
+    assert hashing.hash_files(items, workers=1) == expected
+    assert hashing.hash_files([]) == []
+
+def test_hashing_reader_and_writer():
+    reader = hashing.HashingReader(io.BytesIO(b"abc" * 1000))
+    while reader.read(7):
+        pass
+    assert reader.hexdigest() == hashlib.sha256(b"abc" * 1000).hexdigest()
+    out = io.BytesIO()
+    writer = hashing.HashingWriter(out, "blake2b")
+    writer.write(b"xyz")
+    writer.flush()
+    assert out.getvalue() == b"xyz" and writer.hexdigest() == hashlib.blake2b(b"xyz").hexdigest()
@@ -0,0 +1,63 @@
+import os
+import json
+import engine
+from jobs import JobScheduler
+from settings import DEFAULT_SETTINGS
+from conftest import write_tree
+
+def forget_fingerprint(backup_dir, source_dir):
+    # The next snapshot then archives the unchanged tree again, which is a duplicate
+    path = os.path.join(backup_dir, f"{os.path.basename(source_dir)}.manifest.json")
+    with open(path) as f:
+        state = json.load(f)
+    state["fingerprint"] = None
+    with open(path, "w") as f:
+        json.dump(state, f)
+
+def test_duplicate_snapshot_is_not_a_failure(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha"})
+    backup = make_engine()
+    assert backup.create_snapshot() is True
+    forget_fingerprint(backup.backup_dir, backup.source_dir)
+    assert backup.create_snapshot() == engine.DUPLICATE
+    assert len(backup.list_snapshots()) == 1
+
+def test_job_status_for_duplicate_run(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha"})
+    backup = make_engine()
+    scheduler = JobScheduler(dict(DEFAULT_SETTINGS, compression_workers=1), str(tmp_path / "jobs.json"), print)
+    job = scheduler.add_job("docs", backup.source_dir, backup.backup_dir)
+    scheduler.run(once=True)
+    assert job["state"]["status"] == "ok"
+
+    forget_fingerprint(backup.backup_dir, backup.source_dir)
+    job["state"]["next_run"] = 0
+    scheduler.run(once=True)
+    assert job["state"]["status"] == engine.DUPLICATE
+
+def test_throttled_job_does_not_slow_later_jobs(tmp_path, monkeypatch):
+    import threading
+    import throttle
+    seen = {}
+    start_throttle = engine.BackupEngine.start_throttle
+
+    def record_priority(backup):
+        result = start_throttle(backup)
+        seen[os.path.basename(backup.backup_dir)] = (threading.get_ident(), throttle.save_priority())
+        return result
+
+    monkeypatch.setattr(engine.BackupEngine, "start_throttle", record_priority)
+    for name in ("slow", "normal"):
+        write_tree(tmp_path / name, {"a.txt": name.encode()})
+        (tmp_path / f"{name}-backup").mkdir()
+    before = throttle.save_priority()
+    scheduler = JobScheduler(dict(DEFAULT_SETTINGS, compression_workers=1, job_workers=1),
+                             str(tmp_path / "jobs.json"), print)
+    scheduler.add_job("slow", str(tmp_path / "slow"), str(tmp_path / "slow-backup"), priority=1,
+                      settings={"throttle_nice": before[0] + 5, "throttle_ioprio": "idle"})
+    scheduler.add_job("normal", str(tmp_path / "normal"), str(tmp_path / "normal-backup"))
+    scheduler.run(once=True)
+    assert [job["state"]["status"] for job in scheduler.jobs] == ["ok", "ok"]
+    assert seen["slow-backup"][1][0] == before[0] + 5
+    # Same pool worker, original priorities
+    assert seen["normal-backup"][1] == before
@@ -0,0 +1,77 @@
+import os
+import socket
+import pytest
+import hashing
+import manifest
+from conftest import write_tree
+
+def test_scan_records_regular_files_and_symlinks(tmp_path):
+    write_tree(tmp_path, {"a.txt": b"alpha", "sub/b.txt": b"beta"})
+    os.symlink("a.txt", tmp_path / "link")
+    files = manifest.scan_tree(str(tmp_path), {})
+    assert sorted(files) == ["a.txt", "link", os.path.join("sub", "b.txt")]
+    assert files["a.txt"][manifest.DIGEST] == hashing.hash_file(str(tmp_path / "a.txt"))
+
+def test_scan_reuses_digest_of_unchanged_files(tmp_path):
+    write_tree(tmp_path, {"a.txt": b"alpha"})
+    first = manifest.scan_tree(str(tmp_path), {})
+    first["a.txt"][manifest.DIGEST] = "kept"
+    assert manifest.scan_tree(str(tmp_path), first)["a.txt"][manifest.DIGEST] == "kept"
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs FIFOs")
+def test_scan_skips_fifos_and_sockets(tmp_path):
+    write_tree(tmp_path, {"a.txt": b"alpha"})
+    os.mkfifo(tmp_path / "pipe")
+    server = socket.socket(socket.AF_UNIX)
+    server.bind(str(tmp_path / "sock"))
+    try:
+        skipped = []
+        # Would block forever opening the FIFO if it were hashed
+        files = manifest.scan_tree(str(tmp_path), {}, skipped=skipped)
+        assert sorted(files) == ["a.txt"]
+        assert sorted(skipped) == ["pipe", "sock"]
+
+        skipped = []
+        files = manifest.scan_tree(str(tmp_path), files, dirty=["pipe", "sock"], skipped=skipped)
+        assert sorted(files) == ["a.txt"]
+        assert sorted(skipped) == ["pipe", "sock"]
+    finally:
+        server.close()
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs FIFOs")
+def test_hash_file_refuses_special_files(tmp_path):
+    os.mkfifo(tmp_path / "pipe")
+    with pytest.raises(ValueError):
+        hashing.hash_file(str(tmp_path / "pipe"))
+
+def test_diff_files():
+    old = {"a": [1, 0, 0, "x"], "b": [1, 0, 0, "y"]}
+    new = {"a": [1, 0, 0, "x"], "b": [1, 0, 0, "z"], "c": [1, 0, 0, "w"]}
+    assert manifest.diff_files(old, new) == (["b", "c"], [])
+    assert manifest.diff_files(new, old) == (["b"], ["c"])
+
+def test_tree_fingerprint_follows_content_and_layout(tmp_path):
+    record = lambda digest: [1, 0, 0, digest]
+    files = {"a.txt": record("1"), os.path.join("dir", "b.txt"): record("2")}
+    fingerprint = manifest.tree_fingerprint(files)
+    # Insertion order and stat fields do not matter, only names and digests
+    assert manifest.tree_fingerprint({os.path.join("dir", "b.txt"): [9, 9, 9, "2"], "a.txt": record("1")}) == fingerprint
+    assert manifest.tree_fingerprint({**files, "a.txt": record("3")}) != fingerprint
+    assert manifest.tree_fingerprint({"a.txt": record("1"), os.path.join("dir2", "b.txt"): record("2")}) != fingerprint
+    # A file moved up out of its directory is a different tree
+    assert manifest.tree_fingerprint({"a.txt": record("1"), "b.txt": record("2")}) != fingerprint
+    assert manifest.tree_fingerprint({"a.txt": record("1")}) != fingerprint
+
+def test_touched_file_keeps_the_snapshot_skipped(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha", "dir/b.txt": b"beta"})
+    backup = make_engine()
+    assert backup.create_snapshot()
+    path = tmp_path / "source" / "a.txt"
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10 ** 9))
+    backup.messages.clear()
+    assert backup.create_snapshot()
+    assert backup.messages == ["Source unchanged since last snapshot, skipping"]
+    write_tree(tmp_path / "source", {"a.txt": b"alpha, changed"})
+    assert backup.create_snapshot()
+    assert len(backup.list_snapshots()) == 2
@@ -0,0 +1,30 @@
+from progress import ProgressChannel, format_progress
+
+def test_eta_from_bytes_then_files():
+    channel = ProgressChannel()
+    channel.reset(10, 1000, "Archiving")
+    channel.advance(5, 500)
+    state = channel.read()
+    assert state["files"] == 5 and state["bytes"] == 500
+    assert 0 <= state["eta"] <= state["elapsed"] * 1.01
+    channel.reset(10, phase="Scanning")
+    channel.set_count(4)
+    assert channel.read()["eta"] is not None
+    assert format_progress(channel.read()).startswith("Scanning: 4/10 files")
+
+def test_count_past_the_estimate_clamps():
+    # Files added since the last run push the scan past the previous total
+    channel = ProgressChannel()
+    channel.reset(10, phase="Scanning")
+    channel.set_count(15)
+    state = channel.read()
+    assert state["total_files"] == 10
+    assert state["eta"] == 0
+    assert format_progress(state) == "Scanning: 15/15 files, ETA 0:00:00"
+
+def test_no_phase_no_text():
+    channel = ProgressChannel()
+    assert format_progress(channel.read()) == ""
+    channel.log("hello")
+    [(kind, payload)] = list(channel.drain())
+    assert kind == "log" and payload["message"] == "hello"
@@ -0,0 +1,60 @@
+import os
+import pytest
+import manifest
+import rules
+from conftest import write_tree
+from settings import DEFAULT_SETTINGS
+
+def test_last_matching_rule_wins():
+    scan_rules = rules.ScanRules(["*.log", "!keep.log", "# comment", "", "debug/keep.log"])
+    assert scan_rules.file_rule("app.log") == "*.log"
+    assert scan_rules.file_rule("keep.log") is None
+    assert scan_rules.file_rule("sub/keep.log") is None
+    # A later rule excludes again what an earlier negation kept
+    assert scan_rules.file_rule("debug/keep.log") == "debug/keep.log"
+    assert scan_rules.file_rule("app.txt") is None
+    assert rules.ScanRules(["!keep.log", "*.log"]).file_rule("keep.log") == "*.log"
+
+def test_anchoring_and_globs():
+    scan_rules = rules.ScanRules(["/top.txt", "docs/*.md", "**/cache", "a/**/z", "file?.[!0-9]"])
+    assert scan_rules.file_rule("top.txt") == "/top.txt"
+    assert scan_rules.file_rule("sub/top.txt") is None
+    assert scan_rules.file_rule("docs/readme.md") == "docs/*.md"
+    # * stops at a slash
+    assert scan_rules.file_rule("docs/old/readme.md") is None
+    assert scan_rules.file_rule("x/y/cache") == "**/cache"
+    assert scan_rules.file_rule("a/z") == "a/**/z"
+    assert scan_rules.file_rule("a/b/c/z") == "a/**/z"
+    assert scan_rules.file_rule("file1.x") == "file?.[!0-9]"
+    assert scan_rules.file_rule("file1.5") is None
+
+def test_directory_rules():
+    scan_rules = rules.ScanRules(["build/", "node_modules", "!node_modules/keep"])
+    assert scan_rules.dir_rule("build") == "build/"
+    assert scan_rules.dir_rule("src/build") == "build/"
+    # A trailing slash only matches directories
+    assert scan_rules.file_rule("build") is None
+    assert scan_rules.dir_rule(os.path.join("src", "node_modules")) == "node_modules"
+    # Paths from a watcher: anything below an excluded directory is excluded with it, and as
+    # in git a negation cannot bring back a file whose directory is excluded
+    assert scan_rules.path_rule(os.path.join("build", "out", "a.o")) == "build/"
+    assert scan_rules.path_rule(os.path.join("node_modules", "keep")) == "node_modules"
+    assert scan_rules.path_rule(os.path.join("src", "main.c")) is None
+
+def test_size_and_type_rules(tmp_path):
+    write_tree(tmp_path, {"big.bin": bytes(2000), "small.bin": bytes(10), "photo.png": b"png"})
+    scan_rules = rules.ScanRules([], max_file_size=1000, exclude_types=["image"])
+    assert scan_rules.file_rule("big.bin", os.lstat(tmp_path / "big.bin")) == "larger than 1000 bytes"
+    assert scan_rules.file_rule("small.bin", os.lstat(tmp_path / "small.bin")) is None
+    assert scan_rules.file_rule("photo.png", os.lstat(tmp_path / "photo.png")) == "type image"
+    assert not rules.ScanRules([]) and rules.ScanRules(["*.tmp"])
+
+def test_source_ignore_file_overrides_settings(tmp_path):
+    write_tree(tmp_path, {"a.log": b"", "keep.log": b"", "build/out.o": b"", "src/main.c": b"",
+                          rules.IGNORE_FILE: b"!keep.log\nbuild/\n"})
+    scan_rules = rules.load_rules(str(tmp_path), dict(DEFAULT_SETTINGS, exclude_rules=["*.log"]))
+    files = manifest.scan_tree(str(tmp_path), {}, rules=scan_rules)
+    assert sorted(files) == [rules.IGNORE_FILE, "keep.log", os.path.join("src", "main.c")]
+    report, kept = rules.exclusion_report(str(tmp_path), scan_rules)
+    assert {entry["rule"]: entry["files"] for entry in report} == {"*.log": 1, "build/": 1}
+    assert kept["files"] == 3
@@ -0,0 +1,45 @@
+import os
+import tarfile
+import rules
+import scanner
+from conftest import write_tree
+
+def test_iter_files_walks_once_without_following_links(tmp_path, monkeypatch):
+    write_tree(tmp_path, {"a.txt": b"alpha", "sub/b.txt": b"beta", "sub/deep/c.txt": b"gamma",
+                          "skip/d.txt": b"delta"})
+    os.symlink("sub", tmp_path / "dirlink")
+    opened = []
+    scandir = os.scandir
+    monkeypatch.setattr(scanner.os, "scandir", lambda path: opened.append(path) or scandir(path))
+    found = {rel_path: st for rel_path, path, st in scanner.iter_files(str(tmp_path), rules=rules.ScanRules(["skip/"]))}
+    assert sorted(found) == ["a.txt", "dirlink", os.path.join("sub", "b.txt"), os.path.join("sub", "deep", "c.txt")]
+    # lstat results: the symlink is reported as itself, not as the directory behind it
+    assert os.path.islink(tmp_path / "dirlink") and found["dirlink"].st_ino == os.lstat(tmp_path / "dirlink").st_ino
+    # Each directory is opened once, and the excluded one never
+    assert sorted(opened) == sorted([str(tmp_path), str(tmp_path / "sub"), str(tmp_path / "sub" / "deep")])
+
+def test_iter_files_relative_to_base(tmp_path):
+    write_tree(tmp_path, {"sub/b.txt": b"beta"})
+    assert [rel_path for rel_path, path, st in scanner.iter_files(str(tmp_path / "sub"), str(tmp_path))] == \
+        [os.path.join("sub", "b.txt")]
+    assert scanner.count_files(str(tmp_path)) == 1
+
+def test_tarinfo_from_stat_matches_tarfile(tmp_path, monkeypatch):
+    write_tree(tmp_path, {"a.txt": b"alpha"})
+    os.symlink("a.txt", tmp_path / "link")
+    os.link(tmp_path / "a.txt", tmp_path / "hard")
+    with tarfile.open(tmp_path / "x.tar", "w") as tar:
+        for name in ("a.txt", "link"):
+            expected = tar.gettarinfo(str(tmp_path / name), name)
+            st = os.lstat(tmp_path / name)
+            actual = scanner.tarinfo_from_stat(str(tmp_path / name), name, st)
+            # tarfile only writes the permission bits of mode
+            assert actual.mode == expected.mode & 0o7777
+            for field in ("name", "uid", "gid", "uname", "gname", "mtime", "type", "size", "linkname"):
+                assert getattr(actual, field) == getattr(expected, field), (name, field)
+    # A second hard link is stored as a regular file, not a link to the first
+    assert scanner.tarinfo_from_stat(str(tmp_path / "hard"), "hard").type == tarfile.REGTYPE
+    # With a stat given nothing is looked up again
+    st = os.lstat(tmp_path / "a.txt")
+    monkeypatch.setattr(scanner.os, "lstat", None)
+    assert scanner.tarinfo_from_stat(str(tmp_path / "a.txt"), os.path.join("dir", "a.txt"), st).name == "dir/a.txt"
@@ -0,0 +1,20 @@
+import os
+from conftest import write_tree
+
+def test_corrupt_archive_is_reported_by_every_scrub(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.bin": os.urandom(200000)})
+    backup = make_engine(scrub_workers=1)
+    assert backup.create_snapshot(), backup.messages
+    assert backup.scrub_snapshots()["ok"] == 1
+
+    name = backup.list_snapshots()[0]["name"]
+    path = os.path.join(backup.backup_dir, name)
+    st = os.stat(path)
+    with open(path, "r+b") as f:
+        f.seek(st.st_size // 2)
+        f.write(b"\0" * 64)
+    # Same size and mtime, so only a forced scrub notices the damage the first time
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert backup.scrub_snapshots()["corrupt"] == 0
+    assert backup.scrub_snapshots(force=True)["corrupt"] == 1
+    assert backup.scrub_snapshots()["corrupt"] == 1
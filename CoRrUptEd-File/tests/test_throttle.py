@@ -0,0 +1,80 @@
+import os
+import threading
+import pytest
+import throttle
+from conftest import write_tree
+
+def in_thread(function):
+    # Priorities are per thread; a fresh one keeps the test runner's untouched
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+@pytest.mark.skipif(not hasattr(os, "setpriority"), reason="no nice values")
+def test_snapshot_restores_thread_priorities(make_engine, tmp_path):
+    write_tree(tmp_path / "source", {"a.txt": b"alpha"})
+    before = throttle.save_priority()
+    backup = make_engine(throttle_nice=before[0] + 5, throttle_ioprio="idle")
+
+    def snapshot_then_read_priority():
+        assert backup.create_snapshot(), backup.messages
+        return throttle.save_priority()
+
+    after = in_thread(snapshot_then_read_priority)
+    if any(message.startswith("Could not raise the nice value") for message in backup.messages):
+        # Unprivileged: ioprio is back, nice cannot be
+        assert after[1] == before[1]
+    else:
+        assert after == before
+    assert any("nice" in message for message in backup.messages if message.startswith("Throttle:"))
+
+class FakeTime:
+    # time.monotonic that only moves when something sleeps
+    def __init__(self, monkeypatch):
+        self.now = 100.0
+        self.sleeps = []
+        monkeypatch.setattr(throttle.time, "monotonic", lambda: self.now)
+        monkeypatch.setattr(throttle.time, "sleep", self.sleep)
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def test_token_bucket_allows_one_second_burst_then_paces(monkeypatch):
+    clock = FakeTime(monkeypatch)
+    bucket = throttle.TokenBucket(1000)
+    assert bucket.consume(1000) == 0
+    assert bucket.consume(500) == pytest.approx(0.5)
+    assert bucket.consume(500) == pytest.approx(0.5)
+    # Idle time refills the bucket, but never beyond one second's worth
+    clock.now += 10
+    assert bucket.consume(1000) == 0
+    assert bucket.consume(2000) == pytest.approx(2)
+    assert clock.sleeps == pytest.approx([0.5, 0.5, 2])
+    assert throttle.TokenBucket(None).consume(10 ** 9) == 0
+
+def test_back_off_waits_out_the_load_once_a_second(monkeypatch):
+    clock = FakeTime(monkeypatch)
+    loads = [1.0, 8.0, 6.0, 1.0]
+    monkeypatch.setattr(throttle.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(throttle.os, "getloadavg", lambda: (loads.pop(0), 0, 0), raising=False)
+    limiter = throttle.Throttle(read_rate=1000, max_load=1.0, backoff_seconds=5)
+    limiter.consume(1000)
+    clock.now += 0.5
+    limiter.consume(250)
+    assert loads == [8.0, 6.0, 1.0] and clock.sleeps == []
+    clock.now += 1
+    limiter.consume(250)
+    # 8 and 6 over 4 cores are above 1.0 per core; 1.0 is not
+    assert loads == [] and clock.sleeps == [5, 5]
+    assert (limiter.bytes, limiter.rate_wait, limiter.load_wait) == (1500, 0, 10)
+    assert limiter.summary() == ("read 0.0 MB at 0.0 MB/s, "
+                                 "waited 0.0s on the rate limit and 10.0s on load backoff")
+
+def test_back_off_gives_up_when_stopped(monkeypatch):
+    clock = FakeTime(monkeypatch)
+    monkeypatch.setattr(throttle.os, "getloadavg", lambda: (1000.0, 0, 0), raising=False)
+    limiter = throttle.Throttle(max_load=1.0, backoff_seconds=2, should_stop=lambda: len(clock.sleeps) == 3)
+    assert limiter.back_off() == 6
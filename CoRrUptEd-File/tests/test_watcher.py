@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import pytest
+import rules
+import watcher
+from conftest import write_tree
+
+def wait_for(watch, expected, timeout=5):
+    # Events can arrive over several reads
+    dirty = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not expected <= dirty:
+        dirty |= watch.read_events(0.2)
+    return dirty
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_inotify_reports_changes_and_watches_new_directories(tmp_path):
+    write_tree(tmp_path, {"a.txt": b"alpha", "skip/x.txt": b""})
+    watch = watcher.InotifyWatcher(str(tmp_path), rules.ScanRules(["skip/"]))
+    try:
+        assert watch.read_events(0) == set()
+        write_tree(tmp_path, {"a.txt": b"changed", "new/deep/b.txt": b"beta"})
+        dirty = wait_for(watch, {"a.txt", "new"})
+        assert {"a.txt", "new"} <= dirty
+        # The directory created after the watch started is watched too
+        write_tree(tmp_path, {"new/deep/c.txt": b"gamma"})
+        assert os.path.join("new", "deep", "c.txt") in wait_for(watch, {os.path.join("new", "deep", "c.txt")})
+        os.remove(tmp_path / "a.txt")
+        assert "a.txt" in wait_for(watch, {"a.txt"})
+        # Excluded directories get no watch
+        write_tree(tmp_path, {"skip/y.txt": b""})
+        assert not any(path.startswith("skip" + os.sep) for path in watch.read_events(0.3))
+    finally:
+        watch.close()
+
+def test_polling_watcher_compares_stats(tmp_path):
+    write_tree(tmp_path, {"a.txt": b"alpha", "b.txt": b"beta"})
+    watch = watcher.PollingWatcher(str(tmp_path), interval=0)
+    assert watch.read_events(0) == set()
+    write_tree(tmp_path, {"a.txt": b"alpha, longer", "sub/c.txt": b"gamma"})
+    os.remove(tmp_path / "b.txt")
+    assert watch.read_events(0) == {"a.txt", "b.txt", os.path.join("sub", "c.txt")}
+    assert watch.read_events(0) == set()
+
+class FakeWatcher:
+    def __init__(self, batches, overflow_at=None):
+        self.batches = list(batches)
+        self.overflowed = False
+        self.overflow_at = overflow_at
+
+    def read_events(self, timeout):
+        if len(self.batches) == self.overflow_at:
+            self.overflowed = True
+        return self.batches.pop(0) if self.batches else set()
+
+def test_collect_changes_debounces():
+    never = lambda: False
+    # Returns once max_changes paths piled up, without waiting for quiet
+    assert watcher.collect_changes(FakeWatcher([{"a"}, {"b"}, {"c"}]), 60, 2, never) == {"a", "b"}
+    # Quiet period of zero: the first batch is enough; pending paths are carried over
+    assert watcher.collect_changes(FakeWatcher([{"a"}]), 0, 100, never, pending={"p"}) == {"a", "p"}
+    # A kernel queue overflow asks for a full rescan
+    assert watcher.collect_changes(FakeWatcher([{"a"}, {"b"}], overflow_at=1), 60, 100, never) is None
+    assert watcher.collect_changes(FakeWatcher([]), 60, 100, lambda: True) == set()
+
+def test_create_watcher_falls_back_to_polling(tmp_path, monkeypatch):
+    monkeypatch.setattr(watcher, "InotifyWatcher", lambda *args: (_ for _ in ()).throw(OSError("no inotify")))
+    assert isinstance(watcher.create_watcher(str(tmp_path), 5), watcher.PollingWatcher)
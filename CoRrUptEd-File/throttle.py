@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import platform
+import threading
+
+# ioprio_set(2) and ioprio_get(2) are not wrapped by Python or libc
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314,
+                       "ppc64le": 273, "s390x": 282, "riscv64": 30}
+IOPRIO_GET_SYSCALLS = {"x86_64": 252, "i386": 290, "i686": 290, "aarch64": 31, "armv7l": 315,
+                       "ppc64le": 274, "s390x": 283, "riscv64": 31}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASSES = {"best-effort": 2, "idle": 3}
+
+class TokenBucket:
+    # Averages out to rate bytes per second, allowing bursts of up to one second's worth
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate or 0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        # Blocks until amount is allowed through; returns the seconds spent waiting
+        if not self.rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate) - amount
+            self.last = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class ThrottledReader:
+    # bucket is anything with consume(nbytes): a TokenBucket or a Throttle
+    def __init__(self, fileobj, bucket):
+        self.fileobj = fileobj
+        self.bucket = bucket
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bucket.consume(len(data))
+        return data
+
+class Throttle:
+    # Read rate limit plus load-average backoff for one snapshot, with counters for the log
+    def __init__(self, read_rate=None, max_load=None, backoff_seconds=5, should_stop=None):
+        self.bucket = TokenBucket(read_rate)
+        self.max_load = max_load
+        self.backoff_seconds = backoff_seconds
+        self.should_stop = should_stop or (lambda: False)
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.rate_wait = 0.0
+        self.load_wait = 0.0
+        self.next_load_check = 0.0
+        self.started = time.monotonic()
+
+    def consume(self, amount):
+        rate_wait = self.bucket.consume(amount)
+        load_wait = self.back_off()
+        with self.lock:
+            self.bytes += amount
+            self.rate_wait += rate_wait
+            self.load_wait += load_wait
+
+    def back_off(self):
+        # Checks the load at most once a second; sleeps while it stays above max_load per core
+        if not self.max_load or not hasattr(os, "getloadavg"):
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            if now < self.next_load_check:
+                return 0
+            self.next_load_check = now + 1
+        cores = os.cpu_count() or 1
+        waited = 0
+        while os.getloadavg()[0] / cores > self.max_load and not self.should_stop():
+            time.sleep(self.backoff_seconds)
+            waited += self.backoff_seconds
+        return waited
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (f"read {self.bytes / 1024 / 1024:.1f} MB at {self.bytes / 1024 / 1024 / elapsed:.1f} MB/s, "
+                f"waited {self.rate_wait:.1f}s on the rate limit and {self.load_wait:.1f}s on load backoff")
+
+def ioprio_syscall(syscalls, *args):
+    # None where the call does not exist
+    syscall_number = syscalls.get(platform.machine())
+    if not sys.platform.startswith("linux") or syscall_number is None:
+        return None
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    return libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, *args)
+
+def set_io_priority(io_class, level=4):
+    # Applies to the calling thread and the threads it starts afterwards
+    value = IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT | (level if io_class == "best-effort" else 0)
+    return ioprio_syscall(IOPRIO_SET_SYSCALLS, value) == 0
+
+def save_priority():
+    # The calling thread's (nice, raw ioprio), for restore_priority; None for what cannot be read
+    niceness = os.getpriority(os.PRIO_PROCESS, 0) if hasattr(os, "getpriority") else None
+    io_priority = ioprio_syscall(IOPRIO_GET_SYSCALLS)
+    return niceness, io_priority if io_priority is not None and io_priority >= 0 else None
+
+def restore_priority(saved):
+    # Undoes lower_priority. Raising the priority again needs CAP_SYS_NICE (or an RLIMIT_NICE
+    # allowance) for nice, so this returns False when the nice value could not be put back.
+    niceness, io_priority = saved
+    restored = True
+    if niceness is not None and os.getpriority(os.PRIO_PROCESS, 0) != niceness:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, niceness)
+        except OSError:
+            restored = False
+    if io_priority is not None and ioprio_syscall(IOPRIO_GET_SYSCALLS) != io_priority:
+        ioprio_syscall(IOPRIO_SET_SYSCALLS, io_priority)
+    return restored
+
+def lower_priority(niceness=None, io_priority=None):
+    # Linux keeps nice and ioprio per thread, so only the snapshot thread (and the pools it
+    # starts) slows down. Setting absolute values keeps repeated calls idempotent.
+    applied = []
+    if niceness is not None and hasattr(os, "setpriority"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, max(niceness, os.getpriority(os.PRIO_PROCESS, 0)))
+            applied.append(f"nice {os.getpriority(os.PRIO_PROCESS, 0)}")
+        except OSError:
+            pass
+    if io_priority:
+        io_class, _, level = io_priority.partition(":")
+        if set_io_priority(io_class, int(level or 4)):
+            applied.append(f"ioprio {io_priority}")
+    return applied
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import scanner
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE)
+EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    # Recursive inotify watch through libc; dirty paths are relative to the source directory.
+    # Directories excluded by the scan rules get no watch at all.
+    def __init__(self, source_dir, rules=None):
+        self.source_dir = source_dir
+        self.rules = rules
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        self.overflowed = False
+        try:
+            self.watch_tree(source_dir)
+        except OSError:
+            self.close()
+            raise
+
+    def watch_tree(self, top):
+        for root, dirs, files in os.walk(top):
+            if self.rules:
+                dirs[:] = [name for name in dirs
+                           if not self.rules.dir_rule(os.path.relpath(os.path.join(root, name), self.source_dir))]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOENT:
+                    continue
+                raise OSError(err, f"inotify_add_watch failed for {root}")
+            self.watches[wd] = os.path.relpath(root, self.source_dir)
+
+    def set_rules(self, rules):
+        # Re-walk so directories the new rules no longer exclude get watched
+        self.rules = rules
+        self.watch_tree(self.source_dir)
+
+    def read_events(self, timeout):
+        # Returns the set of dirty paths; a kernel queue overflow sets self.overflowed instead
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        dirty = set()
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return dirty
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            parent = self.watches.get(wd)
+            if parent is None or not name:
+                continue
+            rel_path = os.path.normpath(os.path.join(parent, os.fsdecode(name)))
+            dirty.add(rel_path)
+            if (mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+                    and not (self.rules and self.rules.dir_rule(rel_path))):
+                self.watch_tree(os.path.join(self.source_dir, rel_path))
+        return dirty
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    # Fallback for platforms without inotify: compares stat results between walks
+    def __init__(self, source_dir, interval=60, rules=None):
+        self.source_dir = source_dir
+        self.interval = interval
+        self.rules = rules
+        self.overflowed = False
+        self.last_poll = time.monotonic()
+        self.state = self.stat_tree()
+
+    def stat_tree(self):
+        return {rel_path: (st.st_size, st.st_mtime_ns, st.st_ino)
+                for rel_path, path, st in scanner.iter_files(self.source_dir, rules=self.rules)}
+
+    def set_rules(self, rules):
+        self.rules = rules
+
+    def read_events(self, timeout):
+        wait = self.last_poll + self.interval - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        self.last_poll = time.monotonic()
+        state = self.stat_tree()
+        dirty = {path for path, stat in state.items() if self.state.get(path) != stat}
+        dirty.update(path for path in self.state if path not in state)
+        self.state = state
+        return dirty
+
+    def close(self):
+        pass
+
+def create_watcher(source_dir, poll_interval=60, rules=None):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(source_dir, rules)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(source_dir, poll_interval, rules)
+
+def collect_changes(watcher, quiet_seconds, max_changes, should_stop, pending=None):
+    # Debounce: wait for a first change, then until writes go quiet or enough paths piled up.
+    # Returns the dirty set, or None when a full rescan is needed.
+    dirty = set(pending or ())
+    last_event = time.monotonic() if dirty else None
+    while not should_stop():
+        events = watcher.read_events(1.0)
+        if watcher.overflowed:
+            watcher.overflowed = False
+            return None
+        if events:
+            dirty |= events
+            last_event = time.monotonic()
+        if dirty and (len(dirty) >= max_changes or time.monotonic() - last_event >= quiet_seconds):
+            return dirty
+    return dirty
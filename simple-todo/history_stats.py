@@ -0,0 +1,79 @@
+import os
+import time
+import numpy as np
+from task_history import RECORD, RECORD_DTYPE, NONE
+
+# Time series over the status change log, each computed with whole-array NumPy operations
+# so a history of hundreds of thousands of changes takes milliseconds. Days are counted
+# from 1970-01-01 in local time, which is also how matplotlib numbers dates.
+DAY = 86400
+
+def read_events(path, events=None):
+    # events: what an earlier call returned; only the records written since are read
+    done = 0 if events is None else len(events)
+    try:
+        count = os.path.getsize(path) // RECORD.size - done
+    except OSError:
+        count = 0
+    if count > 0:
+        new = np.fromfile(path, dtype=RECORD_DTYPE, count=count, offset=done * RECORD.size)
+    else:
+        new = np.empty(0, dtype=RECORD_DTYPE)
+    return new if events is None else np.concatenate([events, new])
+
+def local_days(times):
+    return (times + time.localtime().tm_gmtoff) // DAY
+
+def throughput(events, finished, period=1):
+    # Tasks finished per period days; a 7 day period starts on Monday.
+    # Returns (period edges in days, counts), one more edge than counts.
+    days = local_days(events['time'][events['new'] == finished])
+    if not len(days):
+        return np.empty(0), np.empty(0)
+    # 1970-01-01 was a Thursday
+    shift = 3 if period == 7 else 0
+    bins = (days + shift) // period
+    first = bins.min()
+    counts = np.bincount(bins - first)
+    return (first + np.arange(len(counts) + 1)) * period - shift, counts
+
+def cumulative_flow(events, statuses):
+    # Tasks in each status at the end of each day: (days, counts[status, day]). One more day
+    # repeats the last counts, so a step plot shows the last day too.
+    if not len(events):
+        return np.empty(0), np.empty((statuses, 0))
+    days = local_days(events['time'])
+    first = days.min()
+    index = days - first
+    length = index.max() + 1
+    flow = np.empty((statuses, length + 1))
+    for status in range(statuses):
+        change = (events['new'] == status).astype(np.int64) - (events['old'] == status)
+        flow[status, :length] = np.cumsum(np.bincount(index, weights=change, minlength=length))
+    flow[:, length] = flow[:, length - 1]
+    return first + np.arange(length + 1), flow
+
+def lead_times(events, pending, finished):
+    # Days from a task's creation as Pending to the first time it was Finished after that
+    created = (events['old'] == NONE) & (events['new'] == pending)
+    keep = created | (events['new'] == finished)
+    tasks, times, created = events['task'][keep], events['time'][keep], created[keep]
+    if not len(tasks):
+        return np.empty(0)
+    order = np.lexsort((times, tasks))
+    tasks, times, created = tasks[order], times[order], created[order]
+    # For every change, the latest creation at or before it; ids can come back after deletes
+    latest = np.maximum.accumulate(np.where(created, np.arange(len(tasks)), -1))
+    finish = ~created & (latest >= 0)
+    finish[finish] = tasks[finish] == tasks[latest[finish]]
+    # Only the first finish after each creation counts
+    starts, first = np.unique(latest[finish], return_index=True)
+    ends = np.flatnonzero(finish)[first]
+    return (times[ends] - times[starts]) / DAY
+
+def lead_time_histogram(events, pending, finished, bins=50):
+    # (counts, edges in days)
+    times = lead_times(events, pending, finished)
+    if not len(times):
+        return np.empty(0), np.empty(0)
+    return np.histogram(times, bins=bins)
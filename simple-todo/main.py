@@ -1,95 +1,177 @@
 import sys
-import csv
+import time
+# Taken before the Qt imports so --startup-time covers them too
+START_TIME = time.perf_counter()
+import bisect
+import contextlib
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLineEdit, QListWidget, QListWidgetItem, QMessageBox, QTabWidget, 
-                             QLabel, QTextEdit, QSplitter, QInputDialog, QCheckBox, QScrollArea)
-from PyQt5.QtGui import QPalette, QColor, QFont
-from PyQt5.QtCore import Qt, pyqtSignal
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+                             QLineEdit, QListView, QStyledItemDelegate, QMessageBox, QTabWidget, 
+                             QLabel, QTextEdit, QSplitter, QInputDialog, QScrollArea, QFileDialog, QComboBox)
+from PyQt5.QtGui import QPalette, QColor, QFont, QFontMetrics, QPainter
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractListModel, QModelIndex, QSize, QRect, QEvent, QTimer
+from task_store import TaskStore, read_csv, write_csv
+from task_search import SearchIndex, tokens
+from task_history import TaskHistory
+
+STATUSES = ["Pending", "Finished", "Cancelled"]
+NEXT_STATUS = {"Pending": "Finished", "Finished": "Cancelled", "Cancelled": "Pending"}
+CHECKBOX_COLORS = {"Pending": "#3B4252", "Finished": "#A3BE8C", "Cancelled": "#BF616A"}
+TITLE_COLORS = {"Pending": "#ECEFF4", "Finished": "#A3BE8C", "Cancelled": "#BF616A"}
+BAR_COLORS = ['#EBCB8B', '#A3BE8C', '#BF616A']
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+# Tasks indexed per pass of the event loop while the search index is built after startup
+INDEX_CHUNK = 500
 
 class Task:
-    def __init__(self, title, description, status="Pending"):
+    __slots__ = ("id", "title", "description", "status")
+
+    def __init__(self, title, description, status="Pending", task_id=None):
+        self.id = task_id
         self.title = title
         self.description = description
         self.status = status
 
-class TaskItemWidget(QWidget):
-    status_changed = pyqtSignal(object)
-    task_clicked = pyqtSignal(object)
+class TaskListModel(QAbstractListModel):
+    # The tasks of one status, looked up in the app's id -> task dict. members holds the ids
+    # of every task with the status, ids the sorted ids of the rows shown: all members, or
+    # the ones the current search matched. Views only ask for the rows they show, so a list
+    # costs the same whether it holds ten tasks or a hundred thousand, and filtering is a
+    # set intersection and a sort of plain ints.
+    TaskRole = Qt.UserRole
 
-    def __init__(self, task, parent=None):
+    def __init__(self, status, tasks, parent=None):
         super().__init__(parent)
-        self.task = task
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
-        layout.setSpacing(10)
-
-        self.status_checkbox = QCheckBox()
-        self.status_checkbox.clicked.connect(self.update_status)
-        self.status_checkbox.setFixedSize(20, 20)
-
-        self.title_label = QLabel(self.task.title)
-        self.title_label.setStyleSheet("color: #ECEFF4; font-size: 14px;")
-        self.title_label.setWordWrap(True)
-        self.title_label.setMinimumWidth(200)  # Ensure minimum width for readability
-        self.title_label.mousePressEvent = self.on_title_click
-
-        layout.addWidget(self.status_checkbox)
-        layout.addWidget(self.title_label, 1)
-
-        self.update_status_style()
-
-    def update_status(self):
-        if self.task.status == "Pending":
-            self.task.status = "Finished"
-        elif self.task.status == "Finished":
-            self.task.status = "Cancelled"
+        self.status = status
+        self.tasks = tasks
+        self.members = set()
+        self.ids = []
+        self.matches = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[self.ids[index.row()]]
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return task.title
+        if role == self.TaskRole:
+            return task
+        return None
+
+    def set_members(self, ids):
+        self.members = set(ids)
+        self.show_matches(self.matches)
+
+    def show_matches(self, matches, narrower=False):
+        # matches: ids a search found, or None to show every member. narrower: matches is a
+        # subset of the current matches, so the rows shown can be filtered in place of
+        # intersecting and sorting all the members, when there are fewer of them.
+        self.beginResetModel()
+        if narrower and matches is not None and len(self.ids) < len(matches):
+            self.ids = list(filter(matches.__contains__, self.ids))
         else:
-            self.task.status = "Pending"
-        self.update_status_style()
-        self.status_changed.emit(self.task)
-
-    def update_status_style(self):
-        if self.task.status == "Pending":
-            self.status_checkbox.setStyleSheet("""
-                QCheckBox::indicator {
-                    background-color: #3B4252;
-                    border: 1px solid #D8DEE9;
-                    border-radius: 2px;
-                    width: 18px;
-                    height: 18px;
-                }
-            """)
-            self.title_label.setStyleSheet("color: #ECEFF4; font-size: 14px;")
-        elif self.task.status == "Finished":
-            self.status_checkbox.setStyleSheet("""
-                QCheckBox::indicator {
-                    background-color: #A3BE8C;
-                    border: 1px solid #D8DEE9;
-                    border-radius: 2px;
-                    width: 18px;
-                    height: 18px;
-                }
-            """)
-            self.title_label.setStyleSheet("color: #A3BE8C; font-size: 14px; text-decoration: line-through;")
-        else:  # Cancelled
-            self.status_checkbox.setStyleSheet("""
-                QCheckBox::indicator {
-                    background-color: #BF616A;
-                    border: 1px solid #D8DEE9;
-                    border-radius: 2px;
-                    width: 18px;
-                    height: 18px;
-                }
-            """)
-            self.title_label.setStyleSheet("color: #BF616A; font-size: 14px;")
-
-    def on_title_click(self, event):
-        self.task_clicked.emit(self.task)
+            self.ids = sorted(self.members if matches is None else self.members & matches)
+        self.matches = matches
+        self.endResetModel()
+
+    def is_shown(self, task_id):
+        return self.matches is None or task_id in self.matches
+
+    def row_of(self, task):
+        row = bisect.bisect_left(self.ids, task.id)
+        return row if row < len(self.ids) and self.ids[row] == task.id else None
+
+    def insert_task(self, task):
+        self.members.add(task.id)
+        if not self.is_shown(task.id):
+            return
+        row = bisect.bisect_left(self.ids, task.id)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.ids.insert(row, task.id)
+        self.endInsertRows()
+
+    def extend_tasks(self, tasks):
+        # New tasks only: their ids are above every id already here
+        ids = [task.id for task in tasks]
+        self.members.update(ids)
+        ids = [task_id for task_id in ids if self.is_shown(task_id)]
+        if not ids:
+            return
+        row = len(self.ids)
+        self.beginInsertRows(QModelIndex(), row, row + len(ids) - 1)
+        self.ids.extend(ids)
+        self.endInsertRows()
+
+    def remove_task(self, task):
+        self.members.discard(task.id)
+        row = self.row_of(task)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.ids[row]
+        self.endRemoveRows()
+
+    def take_all(self):
+        # Takes the tasks shown; with a search active the others stay
+        tasks = [self.tasks[task_id] for task_id in self.ids]
+        self.members.difference_update(self.ids)
+        self.show_matches(self.matches)
+        return tasks
+
+    def merge_tasks(self, tasks):
+        # One reset instead of a row insert per task
+        self.members.update(task.id for task in tasks)
+        self.show_matches(self.matches)
+
+class TaskItemDelegate(QStyledItemDelegate):
+    # Paints the status box and title of a row instead of building a widget for every task
+    status_clicked = pyqtSignal(object)
+    task_clicked = pyqtSignal(object)
+
+    ROW_HEIGHT = 30
+    BOX_SIZE = 18
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.title_font = QFont('Arial')
+        self.title_font.setPixelSize(14)
+        self.finished_font = QFont(self.title_font)
+        self.finished_font.setStrikeOut(True)
+        self.metrics = QFontMetrics(self.title_font)
+
+    def checkbox_rect(self, rect):
+        return QRect(rect.left() + 5, rect.top() + (rect.height() - self.BOX_SIZE) // 2, self.BOX_SIZE, self.BOX_SIZE)
+
+    def paint(self, painter, option, index):
+        task = index.data(TaskListModel.TaskRole)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QColor("#D8DEE9"))
+        painter.setBrush(QColor(CHECKBOX_COLORS[task.status]))
+        painter.drawRoundedRect(self.checkbox_rect(option.rect), 2, 2)
+
+        text_rect = option.rect.adjusted(5 + self.BOX_SIZE + 10, 0, -5, 0)
+        painter.setFont(self.finished_font if task.status == "Finished" else self.title_font)
+        painter.setPen(QColor(TITLE_COLORS[task.status]))
+        # Rows share one height, so long titles are elided; the tooltip has the full title
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft,
+                         self.metrics.elidedText(task.title, Qt.ElideRight, text_rect.width()))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            task = index.data(TaskListModel.TaskRole)
+            if self.checkbox_rect(option.rect).contains(event.pos()):
+                self.status_clicked.emit(task)
+            else:
+                self.task_clicked.emit(task)
+            return True
+        return False
 
 class TodoApp(QMainWindow):
     def __init__(self):
@@ -97,7 +179,25 @@ class TodoApp(QMainWindow):
         self.setWindowTitle("My Todolist")
         self.setGeometry(100, 100, 800, 600)
 
-        self.tasks = self.load_tasks()
+        self.store = TaskStore()
+        self.history = TaskHistory(STATUSES)
+        # The history as a NumPy array once the Statistics tab has read it
+        self.events = None
+        # Task id -> task; a task's list is its status and its row is found by TaskListModel.row_of
+        self.tasks = {}
+        self.search_index = SearchIndex()
+        self.search_active = False
+        # Tasks not in the search index yet; indexed a chunk at a time once the window is up
+        self.unindexed = []
+        # Words of the search shown and the index version it ran against
+        self.search_words = set()
+        self.search_version = None
+        self.index_timer = QTimer(self)
+        self.index_timer.timeout.connect(self.index_some_tasks)
+
+        file_menu = self.menuBar().addMenu("File")
+        file_menu.addAction("Import CSV...", self.import_csv)
+        file_menu.addAction("Export CSV...", self.export_csv)
 
         main_widget = QTabWidget()
         self.setCentralWidget(main_widget)
@@ -120,47 +220,88 @@ class TodoApp(QMainWindow):
         input_layout.addWidget(add_button)
         task_management_layout.addLayout(input_layout)
 
+        # Search box; filters the lists as you type
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search tasks...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet("padding: 8px; border-radius: 4px; background: #3B4252; color: #ECEFF4;")
+        self.search_input.textChanged.connect(self.search_tasks)
+        task_management_layout.addWidget(self.search_input)
+
         # Task lists
         lists_layout = QHBoxLayout()
-        self.pending_list = QListWidget()
-        self.finished_list = QListWidget()
-        self.cancelled_list = QListWidget()
-
-        for task_list in [self.pending_list, self.finished_list, self.cancelled_list]:
-            task_list.setStyleSheet("""
-                QListWidget {
-                    background-color: #3B4252;
-                    border: none;
-                    border-radius: 4px;
-                }
-                QListWidget::item {
-                    padding: 5px;
-                    margin: 2px 0;
-                }
-            """)
-            task_list.setSpacing(2)
-            task_list.setVerticalScrollMode(QListWidget.ScrollPerPixel)
+        self.models = {status: TaskListModel(status, self.tasks, self) for status in STATUSES}
+        self.delegate = TaskItemDelegate(self)
+        self.delegate.status_clicked.connect(self.cycle_task_status)
+        self.delegate.task_clicked.connect(self.show_task_description)
+        self.pending_list = self.create_task_view(self.models["Pending"])
+        self.finished_list = self.create_task_view(self.models["Finished"])
+        self.cancelled_list = self.create_task_view(self.models["Cancelled"])
 
         lists_layout.addWidget(self.create_list_with_label("Pending", self.pending_list))
         lists_layout.addWidget(self.create_list_with_label("Finished", self.finished_list))
         lists_layout.addWidget(self.create_list_with_label("Cancelled", self.cancelled_list))
         task_management_layout.addLayout(lists_layout)
 
-        # Statistics tab
-        statistics_widget = QWidget()
-        statistics_layout = QVBoxLayout()
-        statistics_widget.setLayout(statistics_layout)
-
-        self.figure, self.ax = plt.subplots(figsize=(5, 4))
-        self.canvas = FigureCanvas(self.figure)
-        statistics_layout.addWidget(self.canvas)
+        # Bulk actions
+        bulk_layout = QHBoxLayout()
+        finish_all_button = QPushButton("Mark All Finished")
+        finish_all_button.clicked.connect(self.mark_all_finished)
+        clear_cancelled_button = QPushButton("Clear Cancelled")
+        clear_cancelled_button.clicked.connect(self.clear_cancelled)
+        for button in [finish_all_button, clear_cancelled_button]:
+            button.setStyleSheet("padding: 8px 16px; background: #5E81AC; color: #ECEFF4; border: none; border-radius: 4px;")
+            bulk_layout.addWidget(button)
+        bulk_layout.addStretch()
+        task_management_layout.addLayout(bulk_layout)
+
+        # Statistics tab; matplotlib is only imported once the tab is first opened
+        self.statistics_widget = QWidget()
+        self.statistics_layout = QVBoxLayout()
+        self.statistics_widget.setLayout(self.statistics_layout)
+        self.period_box = QComboBox()
+        self.period_box.addItems(["Finished per day", "Finished per week"])
+        self.period_box.currentIndexChanged.connect(self.update_graph)
+        period_layout = QHBoxLayout()
+        period_layout.addStretch()
+        period_layout.addWidget(self.period_box)
+        self.statistics_layout.addLayout(period_layout)
+        self.canvas = None
+        # Changes within the interval share one redraw
+        self.graph_timer = QTimer(self)
+        self.graph_timer.setSingleShot(True)
+        self.graph_timer.setInterval(100)
+        self.graph_timer.timeout.connect(self.draw_graph)
 
         # Add tabs
         main_widget.addTab(task_management_widget, "Tasks")
-        main_widget.addTab(statistics_widget, "Statistics")
+        main_widget.addTab(self.statistics_widget, "Statistics")
+        main_widget.currentChanged.connect(self.on_tab_changed)
+        self.tab_widget = main_widget
 
         self.load_tasks_to_lists()
-        self.update_graph()
+
+    def create_task_view(self, model):
+        view = QListView()
+        view.setModel(model)
+        view.setItemDelegate(self.delegate)
+        # Every row has the same height, so scrolling never measures rows it does not show
+        view.setUniformItemSizes(True)
+        view.setSelectionMode(QListView.NoSelection)
+        view.setStyleSheet("""
+            QListView {
+                background-color: #3B4252;
+                border: none;
+                border-radius: 4px;
+            }
+        """)
+        view.setSpacing(2)
+        view.setVerticalScrollMode(QListView.ScrollPerPixel)
+        # Lay rows out a batch per pass of the event loop, so showing a new set of a hundred
+        # thousand rows (loading, each search keystroke) never holds up the next input event
+        view.setLayoutMode(QListView.Batched)
+        view.setBatchSize(200)
+        return view
 
     def create_list_with_label(self, label, list_widget):
         container = QWidget()
@@ -175,119 +316,247 @@ class TodoApp(QMainWindow):
         if title:
             description, ok = QInputDialog.getMultiLineText(self, "Task Description", "Enter task description:")
             if ok:
-                task = Task(title, description)
-                self.tasks.append(task)
-                self.add_task_to_list(task)
+                task = Task(title, description, task_id=self.store.new_id())
+                self.tasks[task.id] = task
+                self.search_index.add(task)
+                self.models[task.status].insert_task(task)
+                if self.search_active:
+                    # The new task shows up if it matches the search
+                    self.search_tasks(self.search_input.text())
+                self.store.insert(task.id, task.title, task.description, task.status)
+                self.history.record([task.id], None, task.status)
                 self.task_input.clear()
-                self.save_tasks()
                 self.update_graph()
 
-    def add_task_to_list(self, task):
-        item = QListWidgetItem(self.pending_list)
-        task_widget = TaskItemWidget(task)
-        task_widget.status_changed.connect(self.on_task_status_changed)
-        task_widget.task_clicked.connect(self.show_task_description)
-        item.setSizeHint(task_widget.sizeHint())
-        item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
-        self.pending_list.addItem(item)
-        self.pending_list.setItemWidget(item, task_widget)
-
-    def on_task_status_changed(self, task):
-        self.remove_task_from_all_lists(task)
-        if task.status == "Pending":
-            self.add_task_to_list(task)
-        elif task.status == "Finished":
-            self.add_task_to_finished_list(task)
-        else:  # Cancelled
-            self.add_task_to_cancelled_list(task)
-        self.save_tasks()
+    def cycle_task_status(self, task):
+        old_status = task.status
+        task.status = NEXT_STATUS[old_status]
+        self.on_task_status_changed(task, old_status)
+
+    def on_task_status_changed(self, task, old_status):
+        self.models[old_status].remove_task(task)
+        self.models[task.status].insert_task(task)
+        self.store.set_status(task.id, task.status)
+        self.history.record([task.id], old_status, task.status)
         self.update_graph()
 
-    def remove_task_from_all_lists(self, task):
-        for list_widget in [self.pending_list, self.finished_list, self.cancelled_list]:
-            for i in range(list_widget.count()):
-                item = list_widget.item(i)
-                widget = list_widget.itemWidget(item)
-                if widget.task == task:
-                    list_widget.takeItem(i)
-                    break
-
-    def add_task_to_finished_list(self, task):
-        item = QListWidgetItem(self.finished_list)
-        task_widget = TaskItemWidget(task)
-        task_widget.status_changed.connect(self.on_task_status_changed)
-        task_widget.task_clicked.connect(self.show_task_description)
-        item.setSizeHint(task_widget.sizeHint())
-        item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
-        self.finished_list.addItem(item)
-        self.finished_list.setItemWidget(item, task_widget)
-
-    def add_task_to_cancelled_list(self, task):
-        item = QListWidgetItem(self.cancelled_list)
-        task_widget = TaskItemWidget(task)
-        task_widget.status_changed.connect(self.on_task_status_changed)
-        task_widget.task_clicked.connect(self.show_task_description)
-        item.setSizeHint(task_widget.sizeHint())
-        item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
-        self.cancelled_list.addItem(item)
-        self.cancelled_list.setItemWidget(item, task_widget)
+    @contextlib.contextmanager
+    def batch_update(self):
+        # Views stay frozen while a bulk change goes through, then repaint once
+        views = [self.pending_list, self.finished_list, self.cancelled_list]
+        for view in views:
+            view.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            for view in views:
+                view.setUpdatesEnabled(True)
+            self.update_graph()
+
+    def mark_all_finished(self):
+        with self.batch_update():
+            tasks = self.models["Pending"].take_all()
+            for task in tasks:
+                task.status = "Finished"
+            self.models["Finished"].merge_tasks(tasks)
+            self.store.set_status_many([task.id for task in tasks], "Finished")
+            self.history.record([task.id for task in tasks], "Pending", "Finished")
+
+    def clear_cancelled(self):
+        count = self.models["Cancelled"].rowCount()
+        if not count or QMessageBox.question(self, "Clear Cancelled", f"Delete {count} cancelled tasks?") != QMessageBox.Yes:
+            return
+        with self.batch_update():
+            tasks = self.models["Cancelled"].take_all()
+            for task in tasks:
+                del self.tasks[task.id]
+                self.search_index.remove(task)
+            self.store.delete_many([task.id for task in tasks])
+            self.history.record([task.id for task in tasks], "Cancelled", None)
 
     def show_task_description(self, task):
         QMessageBox.information(self, "Task Description", f"Title: {task.title}\n\nDescription: {task.description}")
 
-    def update_graph(self):
-        status_counts = {
-            "Pending": self.pending_list.count(),
-            "Finished": self.finished_list.count(),
-            "Cancelled": self.cancelled_list.count()
-        }
-
-        self.ax.clear()
-        statuses = list(status_counts.keys())
-        counts = list(status_counts.values())
-        colors = ['#EBCB8B', '#A3BE8C', '#BF616A']
-        
-        self.ax.bar(statuses, counts, color=colors)
-        self.ax.set_title("Task Status Distribution", color='white')
-        self.ax.set_ylabel("Number of Tasks", color='white')
-        self.ax.tick_params(axis='x', colors='white')
-        self.ax.tick_params(axis='y', colors='white')
-        
-        for i, v in enumerate(counts):
-            self.ax.text(i, v, str(v), ha='center', va='bottom', color='white')
-        
+    def on_tab_changed(self, index):
+        if self.tab_widget.widget(index) is not self.statistics_widget:
+            return
+        if self.canvas is None:
+            self.create_graph()
+        self.draw_graph()
+
+    def create_graph(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
+        from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+
+        self.figure = Figure(figsize=(8, 6))
+        # Fixed margins; a layout engine would measure every tick label again on each redraw
+        self.figure.subplots_adjust(left=0.1, right=0.98, bottom=0.1, top=0.94, wspace=0.3, hspace=0.35)
+        (self.ax, self.throughput_ax), (self.flow_ax, self.lead_ax) = self.figure.subplots(2, 2)
+        self.canvas = FigureCanvas(self.figure)
+        self.statistics_layout.addWidget(self.canvas)
+
+        # The bars and labels are created once; draw_graph only moves them
+        self.bars = self.ax.bar(STATUSES, [0] * len(STATUSES), color=BAR_COLORS)
+        self.bar_labels = [self.ax.text(i, 0, "0", ha='center', va='bottom', color='white')
+                           for i in range(len(STATUSES))]
+        self.style_axes(self.ax, "Task Status Distribution", "Number of Tasks")
+
+        # The history charts keep their artists too; draw_history swaps in new data
+        self.throughput_steps = self.throughput_ax.stairs([], [0], fill=True, color=BAR_COLORS[1])
+        self.style_axes(self.throughput_ax, "Throughput", "Tasks Finished")
+        self.flow_polys = []
+        self.style_axes(self.flow_ax, "Cumulative Flow", "Number of Tasks")
+        self.lead_steps = self.lead_ax.stairs([], [0], fill=True, color=BAR_COLORS[0])
+        self.style_axes(self.lead_ax, "Lead Time, Pending to Finished", "Number of Tasks")
+        self.lead_ax.set_xlabel("Days", color='white')
+        for ax in (self.throughput_ax, self.flow_ax):
+            locator = AutoDateLocator(maxticks=7)
+            ax.xaxis.set_major_locator(locator)
+            ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+
         self.figure.patch.set_facecolor('#2E3440')
-        self.ax.set_facecolor('#3B4252')
-        
-        self.canvas.draw()
-
-    def save_tasks(self):
-        with open('tasks.csv', 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Title', 'Description', 'Status'])
-            for task in self.tasks:
-                writer.writerow([task.title, task.description, task.status])
-
-    def load_tasks(self):
-        tasks = []
+
+    def style_axes(self, ax, title, ylabel):
+        ax.set_title(title, color='white')
+        ax.set_ylabel(ylabel, color='white')
+        ax.tick_params(axis='x', colors='white')
+        ax.tick_params(axis='y', colors='white')
+        ax.set_facecolor('#3B4252')
+
+    def update_graph(self):
+        # Nothing to redraw while the Statistics tab is hidden; opening it draws fresh counts
+        if self.canvas is not None and self.tab_widget.currentWidget() is self.statistics_widget:
+            self.graph_timer.start()
+
+    def draw_graph(self):
+        # Every task counts, not only the ones a search shows
+        counts = [len(self.models[status].members) for status in STATUSES]
+        for bar, label, count in zip(self.bars, self.bar_labels, counts):
+            bar.set_height(count)
+            label.set_y(count)
+            label.set_text(str(count))
+        self.ax.set_ylim(0, max(max(counts), 1) * 1.1)
+        self.draw_history()
+        self.canvas.draw_idle()
+
+    def draw_history(self):
+        import history_stats
+        from matplotlib.dates import date2num
+
+        # Only the changes recorded since the last draw are read from disk
+        self.events = history_stats.read_events(self.history.path, self.events)
+        pending, finished = STATUS_CODES["Pending"], STATUS_CODES["Finished"]
+        week = self.period_box.currentIndex() == 1
+
+        edges, counts = history_stats.throughput(self.events, finished, 7 if week else 1)
+        if len(counts):
+            edges = date2num(edges.astype('datetime64[D]'))
+            self.throughput_steps.set_data(counts, edges)
+            self.throughput_ax.set_xlim(edges[0], edges[-1])
+            self.throughput_ax.set_ylim(0, counts.max() * 1.1)
+        self.throughput_ax.set_ylabel("Tasks Finished per Week" if week else "Tasks Finished per Day", color='white')
+
+        days, flow = history_stats.cumulative_flow(self.events, len(STATUSES))
+        for poly in self.flow_polys:
+            poly.remove()
+        self.flow_polys = []
+        if len(days):
+            days = date2num(days.astype('datetime64[D]'))
+            # Finished at the bottom, then Cancelled, with the Pending backlog on top
+            order = [finished, STATUS_CODES["Cancelled"], pending]
+            self.flow_polys = self.flow_ax.stackplot(days, flow[order], colors=[BAR_COLORS[code] for code in order],
+                                                     labels=[STATUSES[code] for code in order], step='post')
+            self.flow_ax.legend(loc='upper left', fontsize='small')
+            self.flow_ax.set_xlim(days[0], days[-1])
+            self.flow_ax.set_ylim(0, max(flow.sum(axis=0).max(), 1) * 1.1)
+
+        counts, edges = history_stats.lead_time_histogram(self.events, pending, finished)
+        if len(counts):
+            self.lead_steps.set_data(counts, edges)
+            self.lead_ax.set_xlim(edges[0], edges[-1])
+            self.lead_ax.set_ylim(0, counts.max() * 1.1)
+
+    def import_csv(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Tasks", "", "CSV files (*.csv)")
+        if not path:
+            return
+        rejected = []
         try:
-            with open('tasks.csv', 'r') as file:
-                reader = csv.reader(file)
-                next(reader)  # Skip header
-                for row in reader:
-                    tasks.append(Task(row[0], row[1], row[2]))
-        except FileNotFoundError:
-            pass
-        return tasks
+            rows = list(read_csv(path, rejected))
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.warning(self, "Import Tasks", f"Could not import {path}: {e}")
+            return
+        # Ids are taken only once the whole file has been read
+        tasks = [Task(title, description, status if status in STATUSES else "Cancelled", self.store.new_id())
+                 for title, description, status in rows]
+        self.tasks.update((task.id, task) for task in tasks)
+        self.search_index.add_many(tasks)
+        self.store.insert_many([(task.id, task.title, task.description, task.status) for task in tasks])
+        for status in STATUSES:
+            self.history.record([task.id for task in tasks if task.status == status], None, status)
+        for status in STATUSES:
+            self.models[status].extend_tasks([task for task in tasks if task.status == status])
+        if self.search_active:
+            self.search_tasks(self.search_input.text())
+        self.update_graph()
+        if rejected:
+            lines = ", ".join(map(str, rejected[:20])) + (", ..." if len(rejected) > 20 else "")
+            QMessageBox.warning(self, "Import Tasks", f"Imported {len(tasks)} tasks. Skipped {len(rejected)} rows "
+                                f"without exactly a title, description and status, on lines {lines}.")
+
+    def export_csv(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Tasks", "tasks.csv", "CSV files (*.csv)")
+        if path:
+            write_csv(path, ([task.title, task.description, task.status] for task in self.tasks.values()))
 
     def load_tasks_to_lists(self):
-        for task in self.tasks:
-            if task.status == "Pending":
-                self.add_task_to_list(task)
-            elif task.status == "Finished":
-                self.add_task_to_finished_list(task)
-            else:
-                self.add_task_to_cancelled_list(task)
+        # One pass over the rows as SQLite streams them
+        by_status = {status: [] for status in STATUSES}
+        for task_id, title, description, status in self.store.rows():
+            task = Task(title, description, status if status in by_status else "Cancelled", task_id)
+            self.tasks[task_id] = task
+            by_status[task.status].append(task_id)
+        for status, ids in by_status.items():
+            self.models[status].set_members(ids)
+            if self.history.created:
+                # First start with a history: the tasks already there count as created now
+                self.history.record(ids, None, status)
+        self.unindexed = list(self.tasks.values())
+        self.index_timer.start()
+
+    def index_some_tasks(self):
+        # Small chunks keep the window responsive while a large task list is indexed
+        chunk = self.unindexed[-INDEX_CHUNK:]
+        del self.unindexed[-INDEX_CHUNK:]
+        # Skip tasks deleted since loading
+        self.search_index.add_many([task for task in chunk if task.id in self.tasks])
+        if not self.unindexed:
+            self.index_timer.stop()
+            if self.search_active:
+                # Until now the search only covered the tasks indexed so far
+                self.search_tasks(self.search_input.text())
+
+    def search_tasks(self, query):
+        # While the index is still being built this matches the tasks indexed so far (the
+        # newest first) and index_some_tasks searches again once it is done
+        words = tokens(query)
+        matches = self.search_index.search(query)
+        # Typing on only narrows a search: every earlier word still starts one of the words
+        narrower = (self.search_active and self.search_version == self.search_index.version
+                    and all(any(word.startswith(old) for word in words) for old in self.search_words))
+        self.search_words = words
+        self.search_version = self.search_index.version
+        self.search_active = matches is not None
+        for model in self.models.values():
+            model.show_matches(matches, narrower)
+
+    def closeEvent(self, event):
+        # Commit whatever the writer thread still has queued
+        self.store.close()
+        self.history.close()
+        super().closeEvent(event)
 
 def set_dark_theme(app):
     app.setStyle("Fusion")
@@ -313,4 +582,7 @@ if __name__ == "__main__":
     set_dark_theme(app)
     window = TodoApp()
     window.show()
+    if "--startup-time" in sys.argv:
+        # Runs on the first pass of the event loop, once the window is up
+        QTimer.singleShot(0, lambda: print(f"Started in {time.perf_counter() - START_TIME:.3f}s"))
     sys.exit(app.exec_())
@@ -0,0 +1,32 @@
+import os
+import time
+import struct
+
+HISTORY_FILE = 'history.dat'
+# One fixed-size record per status change: time (unix seconds), task id, old and new status.
+# A status is its index in the app's STATUSES and NONE stands for "not there": the old
+# status of a new task, the new status of a deleted one. RECORD_DTYPE is the same layout,
+# so the whole file reads back as one NumPy structured array.
+RECORD = struct.Struct('<qqbb')
+RECORD_DTYPE = [('time', '<i8'), ('task', '<i8'), ('old', 'i1'), ('new', 'i1')]
+NONE = -1
+
+class TaskHistory:
+    # Append-only log of status changes. Only the statistics read it back, so writing needs
+    # neither NumPy nor the database.
+    def __init__(self, statuses, path=HISTORY_FILE):
+        self.path = path
+        self.codes = {status: code for code, status in enumerate(statuses)}
+        self.codes[None] = NONE
+        self.created = not os.path.exists(path)
+        self.file = open(path, 'ab')
+
+    def record(self, task_ids, old_status, new_status, when=None):
+        # The same change for every task in task_ids; None as a status means created or deleted
+        when = int(time.time() if when is None else when)
+        old, new = self.codes[old_status], self.codes[new_status]
+        self.file.write(b''.join(RECORD.pack(when, task_id, old, new) for task_id in task_ids))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
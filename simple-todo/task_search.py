@@ -0,0 +1,110 @@
+import re
+import bisect
+
+WORD = re.compile(r'\w+')
+# Sorts after every character a token can contain, so [prefix, prefix + LAST) spans a prefix
+LAST = '\U0010ffff'
+
+def tokens(text):
+    return set(WORD.findall(text.casefold()))
+
+class SearchIndex:
+    # Inverted index over task titles and descriptions: word -> ids of the tasks using it.
+    # The words are also kept sorted, so the words starting with a prefix are one slice of
+    # that list and a query never looks at tasks that cannot match.
+    def __init__(self):
+        self.postings = {}
+        self.words = []
+        # Task id -> its words, so a task can be taken out after its text has changed
+        self.task_words = {}
+        # First character -> ids. One-letter prefixes span a large part of the vocabulary
+        # and would be slow to collect on every keystroke, so they are kept up to date instead.
+        self.initials = {}
+        # Recent prefix lookups; cleared whenever the index changes
+        self.cache = {}
+        # Bumped on every change, so a caller can tell whether two searches saw the same index
+        self.version = 0
+
+    def add(self, task):
+        self.cache.clear()
+        self.version += 1
+        words = tokens(task.title + '\n' + task.description)
+        self.task_words[task.id] = words
+        for word in words:
+            ids = self.postings.get(word)
+            if ids is None:
+                self.postings[word] = {task.id}
+                bisect.insort(self.words, word)
+            else:
+                ids.add(task.id)
+            self.initials.setdefault(word[0], set()).add(task.id)
+
+    def add_many(self, tasks):
+        # One sort of the new words instead of an insort each
+        self.cache.clear()
+        self.version += 1
+        postings = self.postings
+        initials = self.initials
+        new_words = []
+        for task in tasks:
+            words = tokens(task.title + '\n' + task.description)
+            self.task_words[task.id] = words
+            for word in words:
+                ids = postings.get(word)
+                if ids is None:
+                    postings[word] = {task.id}
+                    new_words.append(word)
+                else:
+                    ids.add(task.id)
+            for initial in {word[0] for word in words}:
+                ids = initials.get(initial)
+                if ids is None:
+                    initials[initial] = {task.id}
+                else:
+                    ids.add(task.id)
+        if new_words:
+            # Two sorted runs, which list.sort merges in one linear pass
+            new_words.sort()
+            self.words += new_words
+            self.words.sort()
+
+    def remove(self, task):
+        # For an edit, remove the task and add it again with its new text
+        self.cache.clear()
+        self.version += 1
+        words = self.task_words.pop(task.id, ())
+        for word in words:
+            ids = self.postings[word]
+            ids.discard(task.id)
+            if not ids:
+                del self.postings[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+        for initial in {word[0] for word in words}:
+            self.initials[initial].discard(task.id)
+
+    def prefix_ids(self, prefix):
+        if len(prefix) == 1:
+            return self.initials.get(prefix, set())
+        ids = self.cache.get(prefix)
+        if ids is None:
+            start = bisect.bisect_left(self.words, prefix)
+            end = bisect.bisect_left(self.words, prefix + LAST, start)
+            ids = set().union(*(self.postings[word] for word in self.words[start:end]))
+            if len(self.cache) >= 32:
+                self.cache.clear()
+            self.cache[prefix] = ids
+        return ids
+
+    def search(self, query):
+        # Ids of the tasks with a word starting with each word of the query, or None for an
+        # empty query (everything matches). The set may be the index's own; do not change it.
+        words = sorted(tokens(query), key=len, reverse=True)
+        if not words:
+            return None
+        # Longest prefixes first: they match the fewest tasks and shrink the result fastest
+        result = self.prefix_ids(words[0])
+        for word in words[1:]:
+            if not result:
+                break
+            result = result & self.prefix_ids(word)
+        return result
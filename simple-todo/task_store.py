@@ -0,0 +1,143 @@
+import os
+import sys
+import csv
+import queue
+import sqlite3
+import threading
+import time
+
+DB_FILE = 'tasks.db'
+CSV_FILE = 'tasks.csv'
+CSV_HEADER = ['Title', 'Description', 'Status']
+
+def read_csv(path, rejected=None):
+    # Yields (title, description, status) rows of a tasks.csv style file. Rows without exactly
+    # those three fields, or that the csv module cannot parse, are skipped and their line
+    # numbers appended to rejected.
+    with open(path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                row = None
+            if row == []:
+                continue
+            if row is not None and len(row) == len(CSV_HEADER):
+                yield row[0], row[1], row[2]
+            elif rejected is not None:
+                rejected.append(reader.line_num)
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+
+class TaskStore:
+    # Tasks in SQLite (WAL mode). Each change is a single-row statement queued for a writer
+    # thread, which waits flush_delay for more to arrive and commits them together, so a
+    # click never waits on the disk or rewrites the whole task list.
+    def __init__(self, path=DB_FILE, flush_delay=0.25):
+        self.path = path
+        self.flush_delay = flush_delay
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    status TEXT NOT NULL
+                )
+            ''')
+        self.next_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM tasks').fetchone()[0]
+        empty = self.next_id == 1
+        conn.close()
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+        if empty and os.path.exists(CSV_FILE):
+            # First start after the CSV era: bring the old task list over. Going by the table
+            # rather than by whether the database existed retries an import that failed.
+            rejected = []
+            try:
+                rows = list(read_csv(CSV_FILE, rejected))
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error importing {CSV_FILE}: {e}", file=sys.stderr)
+            else:
+                if rejected:
+                    print(f"Skipped {len(rejected)} malformed rows of {CSV_FILE}, lines: "
+                          + ", ".join(map(str, rejected)), file=sys.stderr)
+                self.insert_many([(self.new_id(), title, description, status)
+                                  for title, description, status in rows])
+                self.flush()
+
+    def rows(self):
+        # Streams (id, title, description, status) in the order the tasks were added
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from conn.execute('SELECT id, title, description, status FROM tasks ORDER BY id')
+        finally:
+            conn.close()
+
+    def new_id(self):
+        # Ids are handed out here rather than by SQLite so the UI never waits for an insert
+        task_id = self.next_id
+        self.next_id += 1
+        return task_id
+
+    def insert(self, task_id, title, description, status):
+        self.queue.put(('INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)', [(task_id, title, description, status)]))
+
+    def insert_many(self, rows):
+        self.queue.put(('INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)', rows))
+
+    def set_status(self, task_id, status):
+        self.queue.put(('UPDATE tasks SET status = ? WHERE id = ?', [(status, task_id)]))
+
+    def set_status_many(self, task_ids, status):
+        self.queue.put(('UPDATE tasks SET status = ? WHERE id = ?', [(status, task_id) for task_id in task_ids]))
+
+    def delete_many(self, task_ids):
+        self.queue.put(('DELETE FROM tasks WHERE id = ?', [(task_id,) for task_id in task_ids]))
+
+    def write_loop(self):
+        conn = sqlite3.connect(self.path)
+        # WAL with synchronous=NORMAL syncs at checkpoints, not on every commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            if batch[0] is not None:
+                time.sleep(self.flush_delay)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [change for change in batch if change is not None]
+            try:
+                with conn:
+                    for statement, rows in batch:
+                        conn.executemany(statement, rows)
+            except sqlite3.Error as e:
+                print(f"Error saving tasks: {e}", file=sys.stderr)
+            for _ in batch:
+                self.queue.task_done()
+        self.queue.task_done()
+        conn.close()
+
+    def flush(self):
+        # Blocks until every queued change is committed
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
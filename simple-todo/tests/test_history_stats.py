@@ -0,0 +1,74 @@
+import time
+import numpy as np
+import history_stats
+from task_history import TaskHistory
+
+STATUSES = ["Pending", "Finished", "Cancelled"]
+PENDING, FINISHED = 0, 1
+DAY = history_stats.DAY
+
+def record_history(path):
+    # Noon local time, so every change lands on the day it is meant for
+    start = 1_700_000_000 - 1_700_000_000 % DAY + 12 * 3600 - time.localtime().tm_gmtoff
+    history = TaskHistory(STATUSES, str(path))
+    history.record([1, 2, 3], None, "Pending", start)
+    history.record([1], "Pending", "Finished", start + DAY)
+    history.record([2], "Pending", "Cancelled", start + 2 * DAY)
+    history.record([2], "Cancelled", "Pending", start + 3 * DAY)
+    history.record([2], "Pending", "Finished", start + 4 * DAY)
+    history.record([1], "Finished", "Cancelled", start + 5 * DAY)
+    history.record([1], "Cancelled", None, start + 5 * DAY)
+    # Id 1 comes back for a new task
+    history.record([1], None, "Pending", start + 6 * DAY)
+    history.record([1], "Pending", "Finished", start + 8 * DAY)
+    # Imported as finished, never pending
+    history.record([4], None, "Finished", start + 8 * DAY)
+    history.close()
+    return history_stats.local_days(start)
+
+def test_read_events_appends_new_records(tmp_path):
+    path = tmp_path / "history.dat"
+    record_history(path)
+    events = history_stats.read_events(str(path))
+    assert len(events) == 12
+    history = TaskHistory(STATUSES, str(path))
+    history.record([9], None, "Pending", 1_700_000_000)
+    history.close()
+    events = history_stats.read_events(str(path), events)
+    assert len(events) == 13
+    assert tuple(events[-1]) == (1_700_000_000, 9, -1, PENDING)
+
+def test_throughput(tmp_path):
+    first = record_history(tmp_path / "history.dat")
+    events = history_stats.read_events(str(tmp_path / "history.dat"))
+    edges, counts = history_stats.throughput(events, FINISHED)
+    assert counts.tolist() == [1, 0, 0, 1, 0, 0, 0, 2]
+    # From the day of the first finish, one edge past the last
+    assert edges.tolist() == list(range(first + 1, first + 10))
+    edges, counts = history_stats.throughput(events, FINISHED, 7)
+    assert counts.tolist() == [2, 2]
+    # Weeks start on Monday; day 0 was a Thursday
+    assert all((edge + 3) % 7 == 0 for edge in edges)
+    assert edges[0] <= first + 1 < edges[1]
+
+def test_cumulative_flow(tmp_path):
+    first = record_history(tmp_path / "history.dat")
+    events = history_stats.read_events(str(tmp_path / "history.dat"))
+    days, flow = history_stats.cumulative_flow(events, len(STATUSES))
+    assert days.tolist() == list(range(first, first + 10))
+    assert flow.tolist() == [[3, 2, 1, 2, 1, 1, 2, 2, 1, 1],
+                             [0, 1, 1, 1, 2, 1, 1, 1, 3, 3],
+                             [0, 0, 1, 0, 0, 0, 0, 0, 0, 0]]
+
+def test_lead_times(tmp_path):
+    record_history(tmp_path / "history.dat")
+    events = history_stats.read_events(str(tmp_path / "history.dat"))
+    # Task 2 counts to its first finish, the reused id 1 from its second creation
+    assert sorted(history_stats.lead_times(events, PENDING, FINISHED)) == [1, 2, 4]
+
+def test_empty_history(tmp_path):
+    events = history_stats.read_events(str(tmp_path / "missing.dat"))
+    assert not len(history_stats.throughput(events, FINISHED)[1])
+    assert history_stats.cumulative_flow(events, len(STATUSES))[1].shape == (len(STATUSES), 0)
+    assert not len(history_stats.lead_times(events, PENDING, FINISHED))
+    assert not len(history_stats.lead_time_histogram(events, PENDING, FINISHED)[0])
@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import subprocess
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+import main
+import task_store
+import task_history
+from task_store import TaskStore
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "INDEX_CHUNK", 10)
+    store = TaskStore(flush_delay=0)
+    store.insert_many([(task_id, f"Task {task_id} {'even' if task_id % 2 == 0 else 'odd'}", "",
+                        "Finished" if task_id % 3 == 0 else "Pending") for task_id in range(1, 101)])
+    store.close()
+    qt_app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    window = main.TodoApp()
+    yield window
+    window.close()
+
+def shown(window):
+    return sorted(task_id for model in window.models.values() for task_id in model.ids)
+
+def test_search_during_indexing_shows_partial_results(app):
+    assert app.unindexed
+    app.search_input.setText("even")
+    # Only the newest tasks are indexed so far; the search does not wait for the rest
+    assert app.unindexed
+    assert set(shown(app)) < set(range(2, 101, 2))
+    while app.unindexed:
+        app.index_some_tasks()
+    assert shown(app) == list(range(2, 101, 2))
+
+def test_narrowing_search_matches_full_search(app):
+    while app.unindexed:
+        app.index_some_tasks()
+    for query in ["t", "ta", "task", "task e", "task ev", "task e", "o", ""]:
+        app.search_input.setText(query)
+        matches = app.search_index.search(query)
+        for model in app.models.values():
+            assert model.ids == sorted(model.members if matches is None else model.members & matches), query
+
+def test_import_csv_skips_malformed_rows(app, tmp_path, monkeypatch):
+    path = tmp_path / "import.csv"
+    with open(path, "w", newline="") as f:
+        f.write("Title,Description,Status\r\nNew one,,Pending\r\nShort,row\r\nOld one,,Finished\r\n"
+                "Long,row,Pending,extra\r\nOdd status,,Someday\r\n")
+    warnings = []
+    monkeypatch.setattr(main.QFileDialog, "getOpenFileName", lambda *args: (str(path), ""))
+    monkeypatch.setattr(main.QMessageBox, "warning", lambda parent, title, text: warnings.append(text))
+    app.import_csv()
+    assert [(task.id, task.title, task.status) for task in app.tasks.values() if task.id > 100] == \
+        [(101, "New one", "Pending"), (102, "Old one", "Finished"), (103, "Odd status", "Cancelled")]
+    assert 101 in app.models["Pending"].ids and 102 in app.models["Finished"].ids
+    assert warnings == ["Imported 3 tasks. Skipped 2 rows without exactly a title, description and status, "
+                        "on lines 3, 5."]
+
+def test_import_csv_that_cannot_be_read_takes_no_ids(app, tmp_path, monkeypatch):
+    path = tmp_path / "import.csv"
+    with open(path, "wb") as f:
+        f.write(b"Title,Description,Status\nFine,,Pending\nBroken,\xff,Pending\n")
+    warnings = []
+    monkeypatch.setattr(main.QFileDialog, "getOpenFileName", lambda *args: (str(path), ""))
+    monkeypatch.setattr(main.QMessageBox, "warning", lambda parent, title, text: warnings.append(text))
+    app.import_csv()
+    assert len(warnings) == 1 and "Could not import" in warnings[0]
+    assert len(app.tasks) == 100
+    assert app.store.new_id() == 101
+
+def make_model(ids, status="Pending"):
+    tasks = {task_id: main.Task(f"Task {task_id}", "", status, task_id) for task_id in ids}
+    model = main.TaskListModel(status, tasks)
+    model.set_members(ids)
+    return model
+
+def test_model_rows_follow_inserts_and_removals():
+    model = make_model([1, 3, 5])
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.tasks[4] = main.Task("Task 4", "", task_id=4)
+    model.insert_task(model.tasks[4])
+    assert model.ids == [1, 3, 4, 5] and inserted == [(2, 2)]
+    assert model.data(model.index(2)) == "Task 4"
+    assert model.data(model.index(2), main.TaskListModel.TaskRole) is model.tasks[4]
+    model.remove_task(model.tasks[1])
+    assert model.ids == [3, 4, 5] and model.rowCount() == 3
+    new = [main.Task(f"Task {task_id}", "", task_id=task_id) for task_id in (6, 7)]
+    model.tasks.update((task.id, task) for task in new)
+    model.extend_tasks(new)
+    assert model.ids == [3, 4, 5, 6, 7] and inserted[-1] == (3, 4)
+
+def test_model_filtering_keeps_hidden_members():
+    model = make_model(range(1, 11))
+    model.show_matches({2, 4, 6, 8, 20})
+    assert model.ids == [2, 4, 6, 8]
+    # Narrower: filtered from the rows shown; the result is what a full intersection gives
+    model.show_matches({4, 8}, narrower=True)
+    assert model.ids == [4, 8]
+    model.show_matches({1, 4, 8}, narrower=True)
+    assert model.ids == [4, 8]
+    # Not shown, but still counted as a member
+    model.tasks[11] = main.Task("Task 11", "", task_id=11)
+    model.insert_task(model.tasks[11])
+    assert model.ids == [4, 8] and 11 in model.members
+    taken = model.take_all()
+    assert [task.id for task in taken] == [4, 8]
+    model.show_matches(None)
+    assert model.ids == [1, 2, 3, 5, 6, 7, 9, 10, 11]
+    model.merge_tasks(taken)
+    assert model.ids == list(range(1, 12))
+
+def test_cycling_status_moves_the_row(app):
+    task = app.tasks[4]
+    app.cycle_task_status(task)
+    assert task.status == "Finished"
+    assert 4 not in app.models["Pending"].ids and 4 in app.models["Finished"].ids
+    assert app.models["Finished"].ids == sorted(app.models["Finished"].ids)
+    app.cycle_task_status(task)
+    assert 4 in app.models["Cancelled"].ids and 4 not in app.models["Finished"].members
+    app.store.flush()
+    assert {task_id: status for task_id, title, description, status in app.store.rows()}[4] == "Cancelled"
+
+def test_delegate_rows_share_one_height(app):
+    delegate = main.TaskItemDelegate()
+    option = QtWidgets.QStyleOptionViewItem()
+    option.rect = main.QRect(0, 0, 240, 80)
+    index = app.models["Pending"].index(0)
+    assert delegate.sizeHint(option, index) == main.QSize(240, main.TaskItemDelegate.ROW_HEIGHT)
+
+def history_records(app):
+    with open(app.history.path, "rb") as f:
+        return [(task_id, old, new) for when, task_id, old, new in task_history.RECORD.iter_unpack(f.read())]
+
+def stored_statuses(app):
+    app.store.flush()
+    return {task_id: status for task_id, title, description, status in app.store.rows()}
+
+def test_bulk_finish_and_clear(app, monkeypatch):
+    while app.unindexed:
+        app.index_some_tasks()
+    # With a search active, only the tasks it shows are finished
+    app.search_input.setText("even")
+    # A new history file starts with a record for every task already there
+    seeded = len(history_records(app))
+    app.mark_all_finished()
+    finished = [task_id for task_id in range(2, 101, 2) if task_id % 3]
+    assert all(app.tasks[task_id].status == "Finished" for task_id in finished)
+    assert app.tasks[1].status == "Pending" and 1 in app.models["Pending"].members
+    assert set(finished) <= app.models["Finished"].members
+    statuses = stored_statuses(app)
+    assert [task_id for task_id in finished if statuses[task_id] != "Finished"] == []
+    assert statuses[1] == "Pending"
+    assert history_records(app)[seeded:] == [(task_id, 0, 1) for task_id in finished]
+
+    app.search_input.setText("")
+    for task_id in (3, 4, 5):
+        app.tasks[task_id].status = "Cancelled"
+        app.on_task_status_changed(app.tasks[task_id], "Finished" if task_id != 5 else "Pending")
+    questions = []
+    monkeypatch.setattr(main.QMessageBox, "question",
+                        lambda parent, title, text: questions.append(text) or main.QMessageBox.Yes)
+    app.clear_cancelled()
+    assert questions == ["Delete 3 cancelled tasks?"]
+    assert app.models["Cancelled"].ids == [] and not {3, 4, 5} & set(app.tasks)
+    assert not {3, 4, 5} & set(stored_statuses(app))
+    assert not {3, 4, 5} & app.search_index.search("task")
+    assert history_records(app)[-3:] == [(3, 2, -1), (4, 2, -1), (5, 2, -1)]
+    # Nothing cancelled left: no question asked
+    app.clear_cancelled()
+    assert len(questions) == 1
+
+def test_matplotlib_waits_for_the_statistics_tab(tmp_path):
+    # In a fresh interpreter, since any earlier test may have imported matplotlib already
+    store = TaskStore(str(tmp_path / task_store.DB_FILE), flush_delay=0)
+    store.insert_many([(1, "Task 1", "", "Pending")])
+    store.close()
+    script = ("import sys, main\n"
+              "app = main.QApplication([])\n"
+              "window = main.TodoApp()\n"
+              "window.cycle_task_status(window.tasks[1])\n"
+              "assert 'matplotlib' not in sys.modules\n"
+              "window.tab_widget.setCurrentWidget(window.statistics_widget)\n"
+              "assert 'matplotlib' in sys.modules and window.canvas is not None\n"
+              "window.close()\n")
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen",
+               PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           os.environ.get("PYTHONPATH", "")]))
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, check=True)
+
+def test_statistics_redraws_are_coalesced(app):
+    app.tab_widget.setCurrentWidget(app.statistics_widget)
+    draws = []
+    app.canvas.draw_idle = lambda: draws.append(dict(zip(main.STATUSES, (bar.get_height() for bar in app.bars))))
+    for task_id in (1, 2, 4, 5):
+        app.cycle_task_status(app.tasks[task_id])
+    assert draws == [] and app.graph_timer.isActive()
+    deadline = time.monotonic() + 5
+    while not draws and time.monotonic() < deadline:
+        QtWidgets.QApplication.processEvents()
+        time.sleep(0.01)
+    assert draws == [{"Pending": 63, "Finished": 37, "Cancelled": 0}]
+    # Hidden, the tab is not redrawn; opening it again draws the counts of that moment
+    app.tab_widget.setCurrentIndex(0)
+    app.mark_all_finished()
+    assert not app.graph_timer.isActive()
+    app.tab_widget.setCurrentWidget(app.statistics_widget)
+    assert draws[-1] == {"Pending": 0, "Finished": 100, "Cancelled": 0} and len(draws) == 2
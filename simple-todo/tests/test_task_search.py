@@ -0,0 +1,54 @@
+import random
+from main import Task
+from task_search import SearchIndex
+
+def make_tasks():
+    return [Task("Buy milk", "and bread", task_id=1),
+            Task("Book flights", "Berlin in May", task_id=2),
+            Task("Call Bob", "about the milkshake", task_id=3)]
+
+def test_prefix_search():
+    index = SearchIndex()
+    for task in make_tasks():
+        index.add(task)
+    assert index.search("") is None
+    assert index.search("b") == {1, 2, 3}
+    assert index.search("bo") == {2, 3}
+    assert index.search("milk") == {1, 3}
+    assert index.search("MILK bread") == {1}
+    assert index.search("milk berlin") == set()
+    assert index.search("x") == set()
+
+def test_remove_and_edit():
+    index = SearchIndex()
+    tasks = make_tasks()
+    index.add_many(tasks)
+    index.remove(tasks[0])
+    assert index.search("milk") == {3}
+    assert index.search("bread") == set()
+    assert "bread" not in index.words
+    tasks[2].title = "Email Bob"
+    index.remove(tasks[2])
+    index.add(tasks[2])
+    assert index.search("call") == set()
+    assert index.search("em") == {3}
+    assert index.words == sorted(index.postings)
+
+def test_add_many_in_chunks_matches_add():
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choice("abcde") for _ in range(rng.randint(1, 5))) for _ in range(300)]
+    tasks = [Task(" ".join(rng.sample(vocabulary, 3)), " ".join(rng.sample(vocabulary, 5)), task_id=task_id)
+             for task_id in range(1, 501)]
+    one_by_one = SearchIndex()
+    for task in tasks:
+        one_by_one.add(task)
+    chunked = SearchIndex()
+    for start in range(0, len(tasks), 64):
+        chunked.add_many(tasks[start:start + 64])
+    assert chunked.words == one_by_one.words == sorted(one_by_one.postings)
+    for query in ["a", "ab", "abc d", "e ea", "cab b a"]:
+        assert chunked.search(query) == one_by_one.search(query)
+        expected = {task.id for task in tasks
+                    if all(any(word.startswith(part) for word in (task.title + " " + task.description).split())
+                           for part in query.split())}
+        assert chunked.search(query) == expected
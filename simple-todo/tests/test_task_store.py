@@ -0,0 +1,37 @@
+from task_store import TaskStore, CSV_FILE, write_csv
+
+def open_store(path):
+    store = TaskStore(str(path), flush_delay=0)
+    rows = list(store.rows())
+    store.close()
+    return rows
+
+def test_csv_is_migrated_into_new_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_csv(CSV_FILE, [["Write", "the report", "Pending"], ["Send", "", "Finished"]])
+    assert open_store(tmp_path / "tasks.db") == [(1, "Write", "the report", "Pending"), (2, "Send", "", "Finished")]
+    # Only once: the table is no longer empty
+    assert len(open_store(tmp_path / "tasks.db")) == 2
+
+def test_malformed_rows_are_skipped_and_reported(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    with open(CSV_FILE, "w", newline="") as f:
+        f.write("Title,Description,Status\r\n"
+                "Write,the report,Pending\r\n"
+                "Short,row\r\n"
+                "Long,row,Pending,extra\r\n"
+                "Huge," + "x" * 200000 + ",Pending\r\n"
+                "\r\n"
+                "Send,,Finished\r\n")
+    assert open_store(tmp_path / "tasks.db") == [(1, "Write", "the report", "Pending"), (2, "Send", "", "Finished")]
+    assert "Skipped 3 malformed rows of tasks.csv, lines: 3, 4, 5" in capsys.readouterr().err
+
+def test_unreadable_csv_is_retried(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    with open(CSV_FILE, "wb") as f:
+        f.write(b"Title,Description,Status\nWrite,\xff,Pending\n")
+    assert open_store(tmp_path / "tasks.db") == []
+    assert "Error importing" in capsys.readouterr().err
+
+    write_csv(CSV_FILE, [["Write", "the report", "Pending"]])
+    assert open_store(tmp_path / "tasks.db") == [(1, "Write", "the report", "Pending")]